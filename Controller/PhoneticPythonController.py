@@ -1,9 +1,17 @@
 import os
 import re
+
+import numpy as np
 from flask import Blueprint, request, jsonify
 from sqlalchemy import text
 from config import db
-from rapidfuzz import fuzz
+from dedup_writeback import write_back_staged
+from response_cache import touch_table
+from dedup_runs import create_run, finish_run
+from scoring_engine import (
+    NAME_KERNEL, SEARCH_BEST_PROFILE, SEARCH_PHONETIC_PROFILE, SEARCH_QUERY_PROFILE, SEARCH_SEQUENTIAL_PROFILE,
+    SignatureColumns, with_masks
+)
 from metaphone import doublemetaphone
 from indic_transliteration import sanscript
 from indic_transliteration.sanscript import transliterate
@@ -111,51 +119,15 @@ def execute_sequential_search(table_name, query_text, voter_fields, father_field
     filtered_results = []
 
     # 🔥 Precompute second query skeleton
-    q_lat, q_skel, q_meta = get_universal_skeleton(second_query)
-    query_tokens = q_lat.split()
-
-    for row in rows:
-        best_score = 0
-
-        for field in father_fields:
-            val = row.get(field) or ""
-            t_lat, t_skel, t_meta = get_universal_skeleton(val)
-
-            target_tokens = t_lat.split()
-
-            # 🔥 Full skeleton match (highest priority)
-            full_name_match = (q_skel == t_skel and q_skel != "")
-
-            # 🔥 Token match ratio
-            matched_tokens = sum(1 for token in query_tokens if token in target_tokens)
-            token_ratio = matched_tokens / len(query_tokens) if query_tokens else 0
+    query_data = get_universal_skeleton(second_query)
 
-            ratio = fuzz.ratio(q_lat, t_lat)
-            partial = fuzz.partial_ratio(q_lat, t_lat)
-            phonetic = (q_meta == t_meta and q_meta != "")
-
-            score = 0
-
-            # 🔥 Strong boost for full name match
-            if full_name_match:
-                score += 60
-
-            # 🔥 Majority token match required
-            if token_ratio >= 0.7:
-                score += 30
-            elif token_ratio >= 0.4:
-                score += 15
-
-            # 🔥 Fuzzy scoring
-            score += partial * 0.3
-            score += ratio * 0.1
-
-            if phonetic:
-                score += 10
-
-            if score > best_score:
-                best_score = score
+    # 🔥 Full skeleton match, majority token match, fuzzy and phonetic (see scoring_engine),
+    # every father field of every row scored at once
+    targets = [get_universal_skeleton(row.get(field) or "") for row in rows for field in father_fields]
+    scores = SEARCH_SEQUENTIAL_PROFILE.raw_scores(query_data, targets).reshape(len(rows), len(father_fields))
+    best_scores = np.maximum(scores.max(axis=1), 0)
 
+    for row, best_score in zip(rows, best_scores.tolist()):
         if best_score >= 35:
             row["match_score"] = round(best_score, 2)
             filtered_results.append(row)
@@ -289,52 +261,18 @@ def search_voter_data():
 def calculate_best_score(row, q_lat, q_skel, q_meta):
     """Internal helper to score a row based on multiple fields."""
     fields_to_check = ["voter_name", "father_husband_mother_name"]
-    best_score = 0
-
-    for field in fields_to_check:
-        val = row.get(field) or ""
-        t_lat, t_skel, t_meta = get_universal_skeleton(val)
-
-        skel_score = 100 if (q_skel == t_skel and q_skel != "") else 0
-        ratio = fuzz.ratio(q_lat, t_lat)
-        partial = fuzz.partial_ratio(q_lat, t_lat)
-        phonetic = (q_meta == t_meta and q_meta != "")
+    targets = [get_universal_skeleton(row.get(field) or "") for field in fields_to_check]
+    scores = SEARCH_BEST_PROFILE.raw_scores((q_lat, q_skel, q_meta), targets)
 
-        current_score = (skel_score * 0.4) + (partial * 0.4) + (ratio * 0.1)
-        if phonetic: current_score += 10
-
-        if current_score > best_score:
-            best_score = current_score
-
-    return round(best_score, 2)
+    return round(max(0, float(scores.max())), 2)
 
 
 
 
 
 def calculate_phonetic_score(q_data, t_val):
-    q_lat, q_skel, q_meta = q_data
-    t_lat, t_skel, t_meta = get_universal_skeleton(t_val)
-
-    if not t_lat: return 0
-
-    # PHONETIC MATCH (Huge weight)
-    # If the sound-code matches exactly, it's likely the same name
-    phonetic_match = 100 if (q_meta == t_meta and q_meta != "") else 0
-
-    # CONSONANT MATCH (High weight)
-    # Matches 'vks' (Vikas) with 'bks' (Bikas) after normalization
-    skel_match = 100 if (q_skel == t_skel and q_skel != "") else 0
-
-    # FUZZY MATCH (Token based for name reversals)
-    # Use token_sort_ratio so "Anil Kumar" matches "Kumar Anil"
-    fuzzy_score = fuzz.token_sort_ratio(q_lat, t_lat)
-
-    # FINAL CALCULATION
-    # We prioritize the "Sound" (Phonetic + Skeleton) over the "Spelling" (Fuzzy)
-    score = (phonetic_match * 0.45) + (skel_match * 0.35) + (fuzzy_score * 0.20)
-
-    return round(score, 2)
+    # Sound (metaphone + skeleton) over spelling (token_sort ratio), see scoring_engine
+    return SEARCH_PHONETIC_PROFILE.score(q_data, get_universal_skeleton(t_val))
 
 
 def execute_phonetic_search(table_name, query_text, search_fields):
@@ -371,42 +309,31 @@ def execute_phonetic_search(table_name, query_text, search_fields):
     # 🔹 Precompute query skeletons
     query_data = [get_universal_skeleton(q) for q in query_list]
 
-    unique_matches = {}
-
+    # 🔹 Target skeletons: one per distinct field value, rows x fields
+    rows = [row for row in rows if row.get("id")]
+    if not rows:
+        return []
+    skeletons = {}
+    targets = []
     for row in rows:
-        row_id = row.get("id")
-        if not row_id:
-            continue
-
-        best_score = 0
-
         for field in search_fields:
             val = row.get(field) or ""
-            t_lat, t_skel, t_meta = get_universal_skeleton(val)
-
-            for q_lat, q_skel, q_meta in query_data:
+            if val not in skeletons:
+                skeletons[val] = get_universal_skeleton(val)
+            targets.append(skeletons[val])
 
-                token_match = any(token in t_lat for token in q_lat.split())
+    # 🔹 Each query scored against every target at once, best field and query per row
+    best_scores = np.zeros(len(rows))
+    for q in query_data:
+        scores = SEARCH_QUERY_PROFILE.raw_scores(q, targets).reshape(len(rows), len(search_fields))
+        best_scores = np.maximum(best_scores, scores.max(axis=1))
 
-                skel_score = 100 if (q_skel == t_skel and q_skel != "") else 0
-                ratio = fuzz.ratio(q_lat, t_lat)
-                partial = fuzz.partial_ratio(q_lat, t_lat)
-                phonetic = (q_meta == t_meta and q_meta != "")
-
-                score = (skel_score * 0.3) + (partial * 0.5) + (ratio * 0.1)
-
-                if phonetic:
-                    score += 10
-
-                if token_match:
-                    score += 20
-
-                if score > best_score:
-                    best_score = score
+    unique_matches = {}
 
+    for row, best_score in zip(rows, best_scores.tolist()):
         if best_score >= 35:  # 🔥 lower threshold
             row["match_score"] = round(best_score, 2)
-            unique_matches[row_id] = row
+            unique_matches[row["id"]] = row
 
     return sorted(unique_matches.values(), key=lambda x: x["match_score"], reverse=True)
 
@@ -516,9 +443,17 @@ def deduplicate_voters():
                         "combined_score": dup.get("match_score", 0)
                     })
 
-        # Execute updates (if not dry run)
+        # Execute updates (if not dry run), recorded as a run so it can be rolled back
+        run_id = None
         if not dry_run and records_to_deactivate:
-            deactivate_duplicate_records(table_name, pk_column, records_to_deactivate)
+            run_id = create_run('legacy', table_name, {
+                "table_name": table_name,
+                "voter_threshold": voter_threshold,
+                "father_threshold": father_threshold,
+                "dry_run": dry_run
+            }, dry_run)
+            deactivate_duplicate_records(table_name, pk_column, records_to_deactivate, run_id=run_id)
+            finish_run(run_id, 'completed', {"records_to_deactivate": len(records_to_deactivate)})
 
         return jsonify({
             "success": True,
@@ -528,6 +463,7 @@ def deduplicate_voters():
             "total_records_processed": len(rows),
             "duplicate_groups_found": len(duplicate_groups),
             "records_to_deactivate": len(records_to_deactivate),
+            "run_id": run_id,
             "details": records_to_deactivate[:100],
             "message": "Dry run completed" if dry_run else "Duplicates marked as INACTIVE"
         })
@@ -677,6 +613,8 @@ def cluster_by_similarity_separate_thresholds(records, voter_threshold, father_t
     """
     groups = []
     processed = set()
+    voter_columns = name_columns(records, "_v_")
+    father_columns = name_columns(records, "_f_")
 
     for i, rec1 in enumerate(records):
         if rec1["id"] in processed:
@@ -685,23 +623,17 @@ def cluster_by_similarity_separate_thresholds(records, voter_threshold, father_t
         current_group = [rec1]
         processed.add(rec1["id"])
 
-        for j, rec2 in enumerate(records):
-            if i == j or rec2["id"] in processed:
-                continue
-
-            # Calculate similarity scores
-            voter_score = calculate_name_similarity(
-                (rec1["_v_lat"], rec1["_v_skel"], rec1["_v_meta"]),
-                (rec2["_v_lat"], rec2["_v_skel"], rec2["_v_meta"])
-            )
+        # Voter names of all unprocessed records at once, father names of the voter matches
+        candidates = [j for j, rec2 in enumerate(records) if j != i and rec2["id"] not in processed]
+        voter_matches = names_reaching(voter_columns, i, candidates, voter_threshold)
+        father_matches = dict(names_reaching(father_columns, i, [j for j, _ in voter_matches], father_threshold))
 
-            father_score = calculate_name_similarity(
-                (rec1["_f_lat"], rec1["_f_skel"], rec1["_f_meta"]),
-                (rec2["_f_lat"], rec2["_f_skel"], rec2["_f_meta"])
-            )
+        for j, voter_score in voter_matches:
+            rec2 = records[j]
+            father_score = father_matches.get(j)
 
             # 🔥 SEPARATE THRESHOLDS: Each must pass its own threshold
-            if voter_score >= voter_threshold and father_score >= father_threshold:
+            if father_score is not None:
                 rec2["voter_score"] = voter_score
                 rec2["father_score"] = father_score
                 rec2["match_score"] = round((voter_score + father_score) / 2, 2)
@@ -784,101 +716,35 @@ def get_universal_skeleton(text_val):
     return lat, skel, meta_primary or ""
 
 
-def deactivate_duplicate_records(table_name, pk_column, records_to_deactivate):
+def deactivate_duplicate_records(table_name, pk_column, records_to_deactivate, run_id=None):
     """
-    Mark duplicate records as INACTIVE
+    Mark duplicate records as INACTIVE (staged bulk write-back, committed per chunk)
+    run_id: log previous values to the run's undo log
     """
-    if not records_to_deactivate:
-        return
-
-    ids_to_deactivate = [rec["id"] for rec in records_to_deactivate]
-    similar_mapping = {rec["id"]: rec["duplicate_of"] for rec in records_to_deactivate}
-
-    # Update in batches
-    batch_size = 1000
-    for i in range(0, len(ids_to_deactivate), batch_size):
-        batch = ids_to_deactivate[i:i + batch_size]
-
-        # Build CASE statement
-        case_statements = []
-        for rec_id in batch:
-            primary_id = similar_mapping[rec_id]
-            case_statements.append(f"WHEN {pk_column} = {rec_id} THEN {primary_id}")
-
-        case_sql = " ".join(case_statements)
-        placeholders = ','.join([str(id) for id in batch])
-
-        sql = f"""
-            UPDATE {DB_NAME}.{table_name}
-            SET status = 'INACTIVE',
-                similar_too = CASE {case_sql} END,
-                check_status = 'DUPLICATE_DETECTED'
-            WHERE {pk_column} IN ({placeholders})
-        """
-
-        db.session.execute(text(sql))
-
-    db.session.commit()
+    return write_back_staged(table_name, records_to_deactivate, pk_column, run_id=run_id)
 
 def calculate_name_similarity(q_data, t_data):
     """
     Calculate phonetic similarity between two names
     Returns: Score (0-100)
+
+    Metaphone, consonant skeleton (with partial credit), token sort ratio,
+    partial ratio and token overlap - the name_similarity profile of scoring_engine
     """
-    q_lat, q_skel, q_meta = q_data
-    t_lat, t_skel, t_meta = t_data
-
-    # Handle empty strings
-    if not q_lat and not t_lat:
-        return 100  # Both empty = match
-
-    if not q_lat or not t_lat:
-        return 0  # One empty, one not = no match
-
-    # 1. Phonetic match (metaphone) - exact sound match
-    phonetic_match = 100 if (q_meta == t_meta and q_meta != "") else 0
-
-    # 2. Skeleton match (consonants only) - handles vowel variations
-    skel_match = 100 if (q_skel == t_skel and q_skel != "") else 0
-
-    # 3. Partial skeleton match - for cases like "shn" vs "shng" or "sinh" vs "singh"
-    if not skel_match and q_skel and t_skel:
-        # Check if one skeleton is substring of another
-        if q_skel in t_skel or t_skel in q_skel:
-            skel_match = 80
-        else:
-            # Check character overlap percentage
-            common_chars = len(set(q_skel) & set(t_skel))
-            total_chars = max(len(q_skel), len(t_skel))
-            if total_chars > 0:
-                overlap_ratio = common_chars / total_chars
-                if overlap_ratio > 0.7:
-                    skel_match = 60
-
-    # 4. Fuzzy string matching - token sort handles word reordering
-    fuzzy_score = fuzz.token_sort_ratio(q_lat, t_lat)
-
-    # 5. Partial ratio - substring matching for partial names
-    partial_score = fuzz.partial_ratio(q_lat, t_lat)
-
-    # 6. Token overlap - handles name order changes
-    q_tokens = set(q_lat.split())
-    t_tokens = set(t_lat.split())
-    if q_tokens or t_tokens:
-        token_overlap = len(q_tokens & t_tokens) / max(len(q_tokens), len(t_tokens)) * 100
-    else:
-        token_overlap = 0
-
-    # 🔥 Enhanced weighted score with multiple signals
-    score = (
-            (phonetic_match * 0.25) +  # Metaphone code match
-            (skel_match * 0.25) +  # Consonant skeleton match
-            (fuzzy_score * 0.20) +  # Token sort ratio
-            (partial_score * 0.15) +  # Partial string match
-            (token_overlap * 0.15)  # Token overlap ratio
-    )
+    return NAME_KERNEL.score(q_data, t_data)
 
-    return round(score, 2)
+
+def name_columns(records, prefix):
+    """Column arrays of the records' name signatures (prefix "_v_" / "_f_") for batch scoring"""
+    return SignatureColumns([
+        with_masks((rec[f"{prefix}lat"], rec[f"{prefix}skel"], rec[f"{prefix}meta"])) for rec in records
+    ])
+
+
+def names_reaching(columns, anchor, candidates, threshold):
+    """(candidate, score) of the candidates whose calculate_name_similarity with the anchor reaches threshold"""
+    scores = NAME_KERNEL.score_window(columns, anchor, candidates, threshold, workers=1)
+    return [(j, score) for j, score in zip(candidates, scores) if score >= threshold]
 
 @phonetic_py_bp.route("/statistics", methods=["GET"])
 def get_statistics():
@@ -953,6 +819,7 @@ def reset_to_active():
         """
 
         db.session.execute(text(reset_sql))
+        touch_table(db.session, table_name)
         db.session.commit()
 
         return jsonify({
@@ -1076,28 +943,23 @@ def group_by_voter_name_only(rows, threshold=85):
     # Group by phonetic similarity
     groups = []
     processed = set()
+    rows = [row for row in rows if row.get('_v_lat')]
+    voter_columns = name_columns(rows, '_v_')
 
     for i, rec1 in enumerate(rows):
-        if rec1['id'] in processed or not rec1.get('_v_lat'):
+        if rec1['id'] in processed:
             continue
 
         current_group = [rec1]
         processed.add(rec1['id'])
 
-        for j, rec2 in enumerate(rows):
-            if i == j or rec2['id'] in processed or not rec2.get('_v_lat'):
-                continue
-
-            # Calculate voter name similarity
-            voter_score = calculate_name_similarity(
-                (rec1['_v_lat'], rec1['_v_skel'], rec1['_v_meta']),
-                (rec2['_v_lat'], rec2['_v_skel'], rec2['_v_meta'])
-            )
-
-            if voter_score >= threshold:
-                rec2['voter_score'] = voter_score
-                current_group.append(rec2)
-                processed.add(rec2['id'])
+        # Voter name similarity against all unprocessed records at once
+        candidates = [j for j, rec2 in enumerate(rows) if j != i and rec2['id'] not in processed]
+        for j, voter_score in names_reaching(voter_columns, i, candidates, threshold):
+            rec2 = rows[j]
+            rec2['voter_score'] = voter_score
+            current_group.append(rec2)
+            processed.add(rec2['id'])
 
         if len(current_group) > 1:
             groups.append(current_group)
@@ -1215,31 +1077,28 @@ def find_strict_duplicates(rows, min_voter_threshold, min_father_threshold):
     # Find duplicates
     groups = []
     processed = set()
+    rows = [row for row in rows if row.get('_v_lat')]
+    voter_columns = name_columns(rows, '_v_')
+    father_columns = name_columns(rows, '_f_')
 
     for i, rec1 in enumerate(rows):
-        if rec1['id'] in processed or not rec1.get('_v_lat'):
+        if rec1['id'] in processed:
             continue
 
         current_group = [rec1]
         processed.add(rec1['id'])
 
-        for j, rec2 in enumerate(rows):
-            if i == j or rec2['id'] in processed or not rec2.get('_v_lat'):
-                continue
-
-            # Calculate both scores
-            voter_score = calculate_name_similarity(
-                (rec1['_v_lat'], rec1['_v_skel'], rec1['_v_meta']),
-                (rec2['_v_lat'], rec2['_v_skel'], rec2['_v_meta'])
-            )
+        # Both scores, all unprocessed records at once
+        candidates = [j for j, rec2 in enumerate(rows) if j != i and rec2['id'] not in processed]
+        voter_matches = names_reaching(voter_columns, i, candidates, min_voter_threshold)
+        father_matches = dict(names_reaching(father_columns, i, [j for j, _ in voter_matches], min_father_threshold))
 
-            father_score = calculate_name_similarity(
-                (rec1['_f_lat'], rec1['_f_skel'], rec1['_f_meta']),
-                (rec2['_f_lat'], rec2['_f_skel'], rec2['_f_meta'])
-            )
+        for j, voter_score in voter_matches:
+            rec2 = rows[j]
+            father_score = father_matches.get(j)
 
             # STRICT: Both must pass threshold
-            if voter_score >= min_voter_threshold and father_score >= min_father_threshold:
+            if father_score is not None:
                 rec2['voter_score'] = voter_score
                 rec2['father_score'] = father_score
                 rec2['combined_score'] = round((voter_score + father_score) / 2, 2)
@@ -3,7 +3,6 @@ from dotenv import load_dotenv
 from flask_cors import CORS
 from config import Config
 from flask import Flask, render_template, request, jsonify
-import pymysql
 # from config import Config
 
 from config import create_app, db
@@ -19,8 +18,11 @@ load_dotenv()
 # Create Flask app
 app = create_app()
 
+from response_cache import cache, cached_response, bump_generation
+cache.init_app(app)
+
 # Enable CORS (optional)
-CORS(app, origins="*", supports_credentials=True)
+CORS(app, origins="*", supports_credentials=True, expose_headers=["ETag"])
 
 # Register Blueprints
 app.register_blueprint(page_bp, url_prefix='/')
@@ -31,17 +33,31 @@ app.register_blueprint(phonetic_v2_bp, url_prefix='/api/pysearch/v2')
 from phonetic_dedup_v3 import phonetic_v3_bp
 app.register_blueprint(phonetic_v3_bp, url_prefix='/api/pysearch/v3')
 
-def get_conn():
-    return pymysql.connect(
-        host=os.getenv("DB_HOST"),
-        port=int(os.getenv("DB_PORT")),
-        user=os.getenv("DB_USER"),
-        password=os.getenv("DB_PASS"),
-        database=os.getenv("DB_NAME"),
-        charset="utf8mb4",
-        cursorclass=pymysql.cursors.DictCursor,
-        autocommit=True,
-    )
+from dedup_jobs import dedup_jobs_bp
+app.register_blueprint(dedup_jobs_bp, url_prefix='/api/pysearch')
+
+from dedup_runs import dedup_runs_bp
+app.register_blueprint(dedup_runs_bp, url_prefix='/api/pysearch')
+
+from dedup_incremental import dedup_incremental_bp
+app.register_blueprint(dedup_incremental_bp, url_prefix='/api/pysearch')
+
+from dedup_cross_gp import dedup_cross_gp_bp
+app.register_blueprint(dedup_cross_gp_bp, url_prefix='/api/pysearch')
+
+from record_linkage import record_linkage_bp
+app.register_blueprint(record_linkage_bp, url_prefix='/api/pysearch')
+
+from dedup_blocking import dedup_blocking_bp
+app.register_blueprint(dedup_blocking_bp, url_prefix='/api/pysearch')
+
+from dedup_estimator import dedup_estimator_bp
+app.register_blueprint(dedup_estimator_bp, url_prefix='/api/pysearch')
+
+from dashboard_sql import fetch_dashboard_groups, fold_dashboard
+from dashboard_cube import cube_groups, refresh_cube, rebuild_cube, mark_stale
+from data_access import get_conn, db_metrics, metrics
+from voter_derived import cached_readiness, derived_columns_ready
 
 
 def normalize_gender_filter(g: str) -> str:
@@ -70,11 +86,41 @@ def mapping_filter_sql(mapping_filter: str) -> str:
     return ""
 
 
-def build_where_clause(args):
+def derived_filters_ready():
+    """True when the voter_derived generated columns exist (re-checked every READY_TTL)"""
+    ready = cached_readiness(Config.DB_TABLE)
+    if ready is not None:
+        return ready
+    conn = get_conn()
+    try:
+        with conn.cursor() as cur:
+            return derived_columns_ready(cur, Config.DB_TABLE)
+    except Exception as e:
+        app.logger.warning("Derived filter columns not checked, using source columns: %s", e)
+        return False
+    finally:
+        conn.close()
+
+
+AGE_BUCKET_BOUNDS = {
+    '18-25': "BETWEEN 18 AND 25",
+    '26-35': "BETWEEN 26 AND 35",
+    '36-45': "BETWEEN 36 AND 45",
+    '46-60': "BETWEEN 46 AND 60",
+    '60+': "> 60",
+}
+
+
+def build_where_clause(args, derived=None):
     """
     Build WHERE clause and params for filtering
+    derived: filter gender / caste / age on the indexed gender_norm, caste_norm and
+             age_num columns (voter_derived); None = whenever they are ready
     Returns: (where_clause, params_list)
     """
+    if derived is None:
+        derived = derived_filters_ready()
+
     where = " WHERE 1=1 "
     params = []
 
@@ -84,7 +130,13 @@ def build_where_clause(args):
 
     # Gender filter
     gender_filter = normalize_gender_filter(args.get("gender", "all"))
-    if gender_filter != "all":
+    if gender_filter != "all" and derived:
+        if gender_filter == "Unknown":
+            where += " AND gender_norm IN ('Unknown','Third Gender') "
+        else:
+            where += " AND gender_norm = %s "
+            params.append(gender_filter)
+    elif gender_filter != "all":
         if gender_filter == "Male":
             where += " AND (TRIM(sex) IN ('पुरुष','Male','M','m')) "
         elif gender_filter == "Female":
@@ -96,7 +148,10 @@ def build_where_clause(args):
 
     # Caste filter
     caste_filter = normalize_caste_filter(args.get("caste", "all"))
-    if caste_filter != "all":
+    if caste_filter != "all" and derived:
+        where += " AND caste_norm = %s "
+        params.append(caste_filter)
+    elif caste_filter != "all":
         where += " AND (CASE WHEN caste IS NULL OR TRIM(caste)='' THEN 'Unknown' "
         where += " WHEN UPPER(TRIM(caste)) IN ('GEN','GENERAL') THEN 'General' "
         where += " WHEN UPPER(TRIM(caste)) IN ('OBC','O.B.C.') THEN 'OBC' "
@@ -110,15 +165,28 @@ def build_where_clause(args):
     age_min = args.get("age_min", "").strip()
     age_max = args.get("age_max", "").strip()
     if age_min.isdigit():
-        where += " AND (age REGEXP '^[0-9]+$' AND CAST(age AS UNSIGNED) >= %s) "
+        if derived:
+            where += " AND age_num >= %s "
+        else:
+            where += " AND (age REGEXP '^[0-9]+$' AND CAST(age AS UNSIGNED) >= %s) "
         params.append(int(age_min))
     if age_max.isdigit():
-        where += " AND (age REGEXP '^[0-9]+$' AND CAST(age AS UNSIGNED) <= %s) "
+        if derived:
+            where += " AND age_num <= %s "
+        else:
+            where += " AND (age REGEXP '^[0-9]+$' AND CAST(age AS UNSIGNED) <= %s) "
         params.append(int(age_max))
 
     # Age bucket filter from chart drilldown
     age_bucket = args.get("age_bucket", "").strip()
-    if age_bucket:
+    if age_bucket and derived:
+        if age_bucket == 'Unknown':
+            where += " AND (age_num IS NULL AND age IS NOT NULL) "
+        elif age_bucket in AGE_BUCKET_BOUNDS:
+            where += f" AND age_num {AGE_BUCKET_BOUNDS[age_bucket]} "
+        else:
+            where += " AND age_num IS NOT NULL "
+    elif age_bucket:
         bucket_sql = ""
         if age_bucket == '18-25':
             bucket_sql = "CAST(age AS UNSIGNED) BETWEEN 18 AND 25"
@@ -171,223 +239,344 @@ def build_where_clause(args):
     return where, params
 
 
+def cached(kind, extra_args=()):
+    """Response cache (response_cache) keyed on the build_where_clause filters of the voter table"""
+    return cached_response(kind, lambda: Config.DB_TABLE, build_where_clause, extra_args)
+
+
+def charts_from_cube(args):
+    """
+    Every chart body (fold_dashboard) answered from the aggregate cube
+    Returns None when the filter has a search term or the cube is unavailable: scan instead
+    """
+    conn = get_conn()
+    try:
+        with conn.cursor() as cur:
+            groups = cube_groups(cur, Config.DB_TABLE, args, app)
+    except Exception as e:
+        mark_stale()
+        app.logger.warning("Dashboard cube unavailable, scanning %s: %s", Config.DB_TABLE, e)
+        return None
+    finally:
+        conn.close()
+    if groups is None:
+        return None
+    return fold_dashboard(groups, args.get("mapping", "all").lower())
+
+
 @app.route("/")
 def dashboard():
     return render_template("dashboard.html")
 
 
 @app.route("/api/summary")
+@cached("charts")
 def api_summary():
+    charts = charts_from_cube(request.args)
+    if charts is not None:
+        return jsonify(charts["summary"])
+
     where, params = build_where_clause(request.args)
 
     conn = get_conn()
-    with conn.cursor() as cur:
-        cur.execute(f"SELECT COUNT(*) AS total FROM {Config.DB_TABLE} {where}", params)
-        total = cur.fetchone()["total"]
-
-        # Gender distribution
-        cur.execute(f"""
-            SELECT
-              CASE
-                WHEN sex IS NULL OR TRIM(sex)='' THEN 'Unknown'
-                WHEN TRIM(sex) IN ('पुरुष','Male','M','m') THEN 'Male'
-                WHEN TRIM(sex) IN ('महिला','Female','F','f') THEN 'Female'
-                WHEN TRIM(sex) IN ('तृतीय लिंग','Third','Third Gender') THEN 'Other'
-                ELSE 'Unknown'
-              END AS gender,
-              COUNT(*) AS cnt
-            FROM {Config.DB_TABLE}
-            {where}
-            GROUP BY gender
-            ORDER BY cnt DESC;
-        """, params)
-        gender = cur.fetchall()
-
-        # Avg age (age is text; safe cast)
-        age_where = where + " AND age REGEXP '^[0-9]+$'"
-        cur.execute(f"""
-            SELECT AVG(NULLIF(CAST(age AS UNSIGNED),0)) AS avg_age
-            FROM {Config.DB_TABLE}
-            {age_where}
-        """, params)
-        avg_age = cur.fetchone()["avg_age"]
-
-        # Caste distribution (for summary cards)
-        cur.execute(f"""
-            SELECT
-              caste_bucket,
-              COUNT(*) AS cnt
-            FROM (
-              SELECT
-                CASE
-                  WHEN caste IS NULL OR TRIM(caste)='' THEN 'Unknown'
-                  WHEN UPPER(TRIM(caste)) IN ('GEN','GENERAL') THEN 'General'
-                  WHEN UPPER(TRIM(caste)) IN ('OBC','O.B.C.') THEN 'OBC'
-                  WHEN UPPER(TRIM(caste)) IN ('SC','S.C.','SCHEDULED CASTE','ST','S.T.','SCHEDULED TRIBE','SC / ST') THEN 'SC / ST'
-                  WHEN LOWER(TRIM(caste)) = 'muslim' THEN 'Muslim'
-                  WHEN UPPER(TRIM(caste)) = 'YADAV' THEN 'Yadav'
-                  ELSE 'Others'
-                END AS caste_bucket
-              FROM {Config.DB_TABLE}
-              {where}
-            ) x
-            GROUP BY caste_bucket
-            ORDER BY FIELD(caste_bucket, 'General', 'OBC', 'SC / ST', 'Muslim', 'Yadav', 'Others', 'Unknown');
-        """, params)
-        caste = cur.fetchall()
-
-    conn.close()
+    try:
+        with conn.cursor() as cur:
+            cur.execute(f"SELECT COUNT(*) AS total FROM {Config.DB_TABLE} {where}", params)
+            total = cur.fetchone()["total"]
+
+            # Gender distribution
+            cur.execute(f"""
+                SELECT
+                  CASE
+                    WHEN sex IS NULL OR TRIM(sex)='' THEN 'Unknown'
+                    WHEN TRIM(sex) IN ('पुरुष','Male','M','m') THEN 'Male'
+                    WHEN TRIM(sex) IN ('महिला','Female','F','f') THEN 'Female'
+                    WHEN TRIM(sex) IN ('तृतीय लिंग','Third','Third Gender') THEN 'Other'
+                    ELSE 'Unknown'
+                  END AS gender,
+                  COUNT(*) AS cnt
+                FROM {Config.DB_TABLE}
+                {where}
+                GROUP BY gender
+                ORDER BY cnt DESC;
+            """, params)
+            gender = cur.fetchall()
+
+            # Avg age (age is text; safe cast)
+            age_where = where + " AND age REGEXP '^[0-9]+$'"
+            cur.execute(f"""
+                SELECT AVG(NULLIF(CAST(age AS UNSIGNED),0)) AS avg_age
+                FROM {Config.DB_TABLE}
+                {age_where}
+            """, params)
+            avg_age = cur.fetchone()["avg_age"]
+
+            # Caste distribution (for summary cards)
+            cur.execute(f"""
+                SELECT
+                  caste_bucket,
+                  COUNT(*) AS cnt
+                FROM (
+                  SELECT
+                    CASE
+                      WHEN caste IS NULL OR TRIM(caste)='' THEN 'Unknown'
+                      WHEN UPPER(TRIM(caste)) IN ('GEN','GENERAL') THEN 'General'
+                      WHEN UPPER(TRIM(caste)) IN ('OBC','O.B.C.') THEN 'OBC'
+                      WHEN UPPER(TRIM(caste)) IN ('SC','S.C.','SCHEDULED CASTE','ST','S.T.','SCHEDULED TRIBE','SC / ST') THEN 'SC / ST'
+                      WHEN LOWER(TRIM(caste)) = 'muslim' THEN 'Muslim'
+                      WHEN UPPER(TRIM(caste)) = 'YADAV' THEN 'Yadav'
+                      ELSE 'Others'
+                    END AS caste_bucket
+                  FROM {Config.DB_TABLE}
+                  {where}
+                ) x
+                GROUP BY caste_bucket
+                ORDER BY FIELD(caste_bucket, 'General', 'OBC', 'SC / ST', 'Muslim', 'Yadav', 'Others', 'Unknown');
+            """, params)
+            caste = cur.fetchall()
+    finally:
+        conn.close()
     return jsonify({"total": total, "gender": gender, "avg_age": avg_age, "caste": caste})
 
 
 @app.route("/api/age_gender")
+@cached("charts")
 def api_age_gender():
+    charts = charts_from_cube(request.args)
+    if charts is not None:
+        return jsonify(charts["age_gender"])
+
     where, params = build_where_clause(request.args)
 
     conn = get_conn()
-    with conn.cursor() as cur:
-        cur.execute(f"""
-            SELECT
-              age_bucket,
-              SUM(CASE WHEN gender='Male' THEN cnt ELSE 0 END) AS male,
-              SUM(CASE WHEN gender='Female' THEN cnt ELSE 0 END) AS female,
-              SUM(CASE WHEN gender NOT IN ('Male','Female') THEN cnt ELSE 0 END) AS other
-            FROM (
-              SELECT
-                CASE
-                  WHEN age REGEXP '^[0-9]+$' THEN
+    try:
+        with conn.cursor() as cur:
+            cur.execute(f"""
+                SELECT
+                  age_bucket,
+                  SUM(CASE WHEN gender='Male' THEN cnt ELSE 0 END) AS male,
+                  SUM(CASE WHEN gender='Female' THEN cnt ELSE 0 END) AS female,
+                  SUM(CASE WHEN gender NOT IN ('Male','Female') THEN cnt ELSE 0 END) AS other
+                FROM (
+                  SELECT
                     CASE
-                      WHEN CAST(age AS UNSIGNED) BETWEEN 18 AND 25 THEN '18-25'
-                      WHEN CAST(age AS UNSIGNED) BETWEEN 26 AND 35 THEN '26-35'
-                      WHEN CAST(age AS UNSIGNED) BETWEEN 36 AND 45 THEN '36-45'
-                      WHEN CAST(age AS UNSIGNED) BETWEEN 46 AND 60 THEN '46-60'
-                      WHEN CAST(age AS UNSIGNED) > 60 THEN '60+'
+                      WHEN age REGEXP '^[0-9]+$' THEN
+                        CASE
+                          WHEN CAST(age AS UNSIGNED) BETWEEN 18 AND 25 THEN '18-25'
+                          WHEN CAST(age AS UNSIGNED) BETWEEN 26 AND 35 THEN '26-35'
+                          WHEN CAST(age AS UNSIGNED) BETWEEN 36 AND 45 THEN '36-45'
+                          WHEN CAST(age AS UNSIGNED) BETWEEN 46 AND 60 THEN '46-60'
+                          WHEN CAST(age AS UNSIGNED) > 60 THEN '60+'
+                          ELSE 'Unknown'
+                        END
                       ELSE 'Unknown'
-                    END
-                  ELSE 'Unknown'
-                END AS age_bucket,
-                CASE
-                  WHEN TRIM(sex) IN ('पुरुष','Male','M','m') THEN 'Male'
-                  WHEN TRIM(sex) IN ('महिला','Female','F','f') THEN 'Female'
-                  ELSE 'Other'
-                END AS gender,
-                COUNT(*) AS cnt
-              FROM {Config.DB_TABLE}
-              {where}
-              GROUP BY age_bucket, gender
-            ) x
-            GROUP BY age_bucket
-            ORDER BY FIELD(age_bucket, '18-25', '26-35', '36-45', '46-60', '60+', 'Unknown');
-        """, params)
-        rows = cur.fetchall()
-
-    conn.close()
+                    END AS age_bucket,
+                    CASE
+                      WHEN TRIM(sex) IN ('पुरुष','Male','M','m') THEN 'Male'
+                      WHEN TRIM(sex) IN ('महिला','Female','F','f') THEN 'Female'
+                      ELSE 'Other'
+                    END AS gender,
+                    COUNT(*) AS cnt
+                  FROM {Config.DB_TABLE}
+                  {where}
+                  GROUP BY age_bucket, gender
+                ) x
+                GROUP BY age_bucket
+                ORDER BY FIELD(age_bucket, '18-25', '26-35', '36-45', '46-60', '60+', 'Unknown');
+            """, params)
+            rows = cur.fetchall()
+    finally:
+        conn.close()
     return jsonify(rows)
 
 
 @app.route("/api/caste")
+@cached("charts")
 def api_caste():
+    charts = charts_from_cube(request.args)
+    if charts is not None:
+        return jsonify(charts["caste"])
+
     where, params = build_where_clause(request.args)
 
     conn = get_conn()
-    with conn.cursor() as cur:
-        cur.execute(f"""
-            SELECT
-              caste_bucket,
-              COUNT(*) AS cnt
-            FROM (
-              SELECT
-                CASE
-                  WHEN caste IS NULL OR TRIM(caste)='' THEN 'Unknown'
-                  WHEN UPPER(TRIM(caste)) IN ('GEN','GENERAL') THEN 'General'
-                  WHEN UPPER(TRIM(caste)) IN ('OBC','O.B.C.') THEN 'OBC'
-                  WHEN UPPER(TRIM(caste)) IN ('SC','S.C.','SCHEDULED CASTE','ST','S.T.','SCHEDULED TRIBE','SC / ST') THEN 'SC / ST'
-                  WHEN LOWER(TRIM(caste)) = 'muslim' THEN 'Muslim'
-                  WHEN UPPER(TRIM(caste)) = 'YADAV' THEN 'Yadav'
-                  ELSE 'Others'
-                END AS caste_bucket
-              FROM {Config.DB_TABLE}
-              {where}
-            ) x
-            GROUP BY caste_bucket
-            ORDER BY FIELD(caste_bucket, 'General', 'OBC', 'SC / ST', 'Muslim', 'Yadav', 'Others', 'Unknown');
-        """, params)
-        rows = cur.fetchall()
-
-    conn.close()
+    try:
+        with conn.cursor() as cur:
+            cur.execute(f"""
+                SELECT
+                  caste_bucket,
+                  COUNT(*) AS cnt
+                FROM (
+                  SELECT
+                    CASE
+                      WHEN caste IS NULL OR TRIM(caste)='' THEN 'Unknown'
+                      WHEN UPPER(TRIM(caste)) IN ('GEN','GENERAL') THEN 'General'
+                      WHEN UPPER(TRIM(caste)) IN ('OBC','O.B.C.') THEN 'OBC'
+                      WHEN UPPER(TRIM(caste)) IN ('SC','S.C.','SCHEDULED CASTE','ST','S.T.','SCHEDULED TRIBE','SC / ST') THEN 'SC / ST'
+                      WHEN LOWER(TRIM(caste)) = 'muslim' THEN 'Muslim'
+                      WHEN UPPER(TRIM(caste)) = 'YADAV' THEN 'Yadav'
+                      ELSE 'Others'
+                    END AS caste_bucket
+                  FROM {Config.DB_TABLE}
+                  {where}
+                ) x
+                GROUP BY caste_bucket
+                ORDER BY FIELD(caste_bucket, 'General', 'OBC', 'SC / ST', 'Muslim', 'Yadav', 'Others', 'Unknown');
+            """, params)
+            rows = cur.fetchall()
+    finally:
+        conn.close()
     return jsonify(rows)
 
 
 @app.route("/api/sections_top")
+@cached("charts")
 def api_sections_top():
+    charts = charts_from_cube(request.args)
+    if charts is not None:
+        return jsonify(charts["sections_top"])
+
     where, params = build_where_clause(request.args)
 
     conn = get_conn()
-    with conn.cursor() as cur:
-        cur.execute(f"""
-            SELECT
-              COALESCE(NULLIF(TRIM(section),''),'Unknown') AS section,
-              COUNT(*) AS cnt
-            FROM {Config.DB_TABLE}
-            {where}
-            GROUP BY section
-            ORDER BY cnt DESC
-            LIMIT 10;
-        """, params)
-        rows = cur.fetchall()
-
-    conn.close()
+    try:
+        with conn.cursor() as cur:
+            cur.execute(f"""
+                SELECT
+                  COALESCE(NULLIF(TRIM(section),''),'Unknown') AS section,
+                  COUNT(*) AS cnt
+                FROM {Config.DB_TABLE}
+                {where}
+                GROUP BY section
+                ORDER BY cnt DESC
+                LIMIT 10;
+            """, params)
+            rows = cur.fetchall()
+    finally:
+        conn.close()
     return jsonify(rows)
 
 
 @app.route("/api/mapping_distribution")
+@cached("charts")
 def api_mapping_distribution():
     """Get mapping status distribution"""
+    charts = charts_from_cube(request.args)
+    if charts is not None:
+        mapping_filter = request.args.get("mapping", "all").lower()
+        return jsonify({"data": [row for row in charts["mapping_distribution"]["data"]
+                                 if mapping_filter not in ("mapped", "unmapped")
+                                 or row["mapping_status"] == mapping_filter]})
+
     where, params = build_where_clause(request.args)
 
     conn = get_conn()
-    with conn.cursor() as cur:
-        cur.execute(f"""
-            SELECT
-              CASE
-                WHEN mapping_status IS NULL OR TRIM(mapping_status) = '' THEN 'mapped'
-                WHEN LOWER(TRIM(mapping_status)) = 'unmapped' THEN 'unmapped'
-                ELSE 'mapped'
-              END AS mapping_status,
-              COUNT(*) AS cnt
-            FROM {Config.DB_TABLE}
-            {where}
-            GROUP BY mapping_status
-        """, params)
-        rows = cur.fetchall()
-
-    conn.close()
+    try:
+        with conn.cursor() as cur:
+            cur.execute(f"""
+                SELECT
+                  CASE
+                    WHEN mapping_status IS NULL OR TRIM(mapping_status) = '' THEN 'mapped'
+                    WHEN LOWER(TRIM(mapping_status)) = 'unmapped' THEN 'unmapped'
+                    ELSE 'mapped'
+                  END AS mapping_status,
+                  COUNT(*) AS cnt
+                FROM {Config.DB_TABLE}
+                {where}
+                GROUP BY mapping_status
+            """, params)
+            rows = cur.fetchall()
+    finally:
+        conn.close()
     return jsonify({"data": rows})
 
 
 @app.route("/api/sections_all")
+@cached("charts")
 def api_sections_all():
     """Get all sections/booths sorted by count"""
+    charts = charts_from_cube(request.args)
+    if charts is not None:
+        return jsonify(charts["sections_all"])
+
     where, params = build_where_clause(request.args)
 
     conn = get_conn()
-    with conn.cursor() as cur:
-        cur.execute(f"""
-            SELECT
-              COALESCE(NULLIF(TRIM(section),''),'Unknown') AS section,
-              COUNT(*) AS cnt
-            FROM {Config.DB_TABLE}
-            {where}
-            GROUP BY section
-            ORDER BY cnt DESC;
-        """, params)
-        rows = cur.fetchall()
-
-    conn.close()
+    try:
+        with conn.cursor() as cur:
+            cur.execute(f"""
+                SELECT
+                  COALESCE(NULLIF(TRIM(section),''),'Unknown') AS section,
+                  COUNT(*) AS cnt
+                FROM {Config.DB_TABLE}
+                {where}
+                GROUP BY section
+                ORDER BY cnt DESC;
+            """, params)
+            rows = cur.fetchall()
+    finally:
+        conn.close()
     return jsonify(rows)
 
 
+@app.route("/api/dashboard")
+@cached("charts")
+def api_dashboard():
+    """
+    Every chart of the dashboard from the aggregate cube, or from one grouped scan
+    (see dashboard_sql) when the filter has a search term
+    Same filters as the per-chart endpoints; mapping_distribution ignores the mapping filter
+    """
+    charts = charts_from_cube(request.args)
+    if charts is not None:
+        return jsonify(charts)
+
+    mapping_filter = request.args.get("mapping", "all").lower()
+    where, params = build_where_clause({**request.args.to_dict(), "mapping": "all"})
+
+    conn = get_conn()
+    try:
+        with conn.cursor() as cur:
+            groups = fetch_dashboard_groups(cur, Config.DB_TABLE, where, params)
+    finally:
+        conn.close()
+    return jsonify(fold_dashboard(groups, mapping_filter))
+
+
+@app.route("/api/dashboard_cube/refresh", methods=["POST"])
+def api_dashboard_cube_refresh():
+    """
+    Refresh the dashboard cube now (after bulk changes made outside the app)
+    Body: {"rebuild": false} - true recomputes it from scratch instead of moving changed rows
+    """
+    payload = request.get_json(force=True, silent=True) or {}
+    conn = get_conn()
+    try:
+        with conn.cursor() as cur:
+            if payload.get("rebuild"):
+                rebuild_cube(cur, Config.DB_TABLE)
+                return jsonify({"ok": True, "rebuilt": True})
+            return jsonify({"ok": True, "rows_moved": refresh_cube(cur, Config.DB_TABLE)})
+    except Exception as e:
+        return jsonify({"ok": False, "error": str(e)}), 500
+    finally:
+        conn.close()
+
+
+@app.route("/api/db_metrics", methods=["GET", "POST"])
+def api_db_metrics():
+    """
+    Connection pool saturation and per-statement timings (data_access)
+    Query: top=20 statements by total time; POST resets the counters
+    """
+    if request.method == "POST":
+        metrics.reset()
+    top = request.args.get("top", "20")
+    return jsonify(db_metrics(int(top) if top.isdigit() else 20))
+
+
 @app.route("/api/table")
+@cached("table", extra_args=("page", "page_size", "sort_column", "sort_direction"))
 def api_table():
     # 1. Get raw page_size from request
     raw_page_size = request.args.get("page_size", "10")
@@ -479,17 +668,18 @@ def api_export_data():
         sort_direction = "DESC"
 
     conn = get_conn()
-    with conn.cursor() as cur:
-        sql = f"""
-            SELECT {",".join(columns)}
-            FROM {Config.DB_TABLE}
-            {where}
-            ORDER BY {sort_column} {sort_direction}
-        """
-        cur.execute(sql, params)
-        data = cur.fetchall()
-
-    conn.close()
+    try:
+        with conn.cursor() as cur:
+            sql = f"""
+                SELECT {",".join(columns)}
+                FROM {Config.DB_TABLE}
+                {where}
+                ORDER BY {sort_column} {sort_direction}
+            """
+            cur.execute(sql, params)
+            data = cur.fetchall()
+    finally:
+        conn.close()
 
     return jsonify({
         "data": data,
@@ -524,6 +714,13 @@ def api_update_row():
         with conn.cursor() as cur:
             sql = f"UPDATE {Config.DB_TABLE} SET " + ", ".join(updates) + " WHERE id=%s"
             cur.execute(sql, params)
+            try:
+                refresh_cube(cur, Config.DB_TABLE, ids=[row_id])
+            except Exception:
+                mark_stale()  # The next cube read diff-refreshes
+            # Only now: a response cached under the new generation must see the
+            # refreshed (or stale-marked) cube
+            bump_generation(Config.DB_TABLE)
         return jsonify({"ok": True})
     except Exception as e:
         return jsonify({"ok": False, "error": str(e)}), 500
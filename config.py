@@ -46,6 +46,13 @@ def create_app():
         "pool_pre_ping": True
     }
 
+    # Response cache (response_cache.py) from ENV
+    app.config["CACHE_TYPE"] = os.getenv("CACHE_TYPE", "SimpleCache")
+    app.config["CACHE_DEFAULT_TIMEOUT"] = int(os.getenv("CACHE_DEFAULT_TIMEOUT", 300))
+    app.config["CACHE_THRESHOLD"] = int(os.getenv("CACHE_THRESHOLD", 2000))
+    if os.getenv("CACHE_REDIS_URL"):
+        app.config["CACHE_REDIS_URL"] = os.getenv("CACHE_REDIS_URL")
+
     # # Twitter API
     # TW_BEARER_TOKEN = os.getenv("TW_BEARER_TOKEN")
     # if not TW_BEARER_TOKEN:
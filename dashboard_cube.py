@@ -0,0 +1,375 @@
+"""
+Materialized aggregate cube behind the dashboard charts
+- dashboard_cube holds one row per (mapping bucket, gender key, caste bucket, age,
+  section) with its voter count; every chart filter except the free-text search maps
+  onto these columns, so the chart endpoints read a few thousand cube rows instead
+  of bucketing every voter_data row
+- Ages are kept exactly (age_key: the numeric age, -1 non-numeric text, -2 NULL):
+  the age range filters need the value, buckets are derived, and age sums are
+  age_key * cnt
+- The gender key keeps 'Third' and 'Third Gender' apart: the Third filter matches only
+  the former, the charts show both as 'Other'
+- dashboard_cube_rows remembers the cube cell and a checksum of the bucketed
+  columns of every voter row; a refresh moves only rows whose checksum changed
+  (or that were added / deleted) from their old cell to their new one
+- api_update_row refreshes the edited row at once; changes made outside the app are
+  picked up by the diff refresh that runs when the cube is older than CUBE_MAX_AGE:
+  on a background thread (one at a time) while readers keep getting the current
+  cube, in the request only when the cube was never built or was marked stale
+"""
+
+import os
+import threading
+import time
+
+from dashboard_sql import MAPPING_BUCKET_SQL, CASTE_BUCKET_SQL
+from data_access import get_conn
+
+CUBE_TABLE = "dashboard_cube"
+ROWS_TABLE = "dashboard_cube_rows"
+CHANGED_TABLE = "dashboard_cube_changed"  # Temporary, per connection
+CUBE_MAX_AGE = int(os.getenv("DASHBOARD_CUBE_MAX_AGE", 300))  # Seconds before a diff refresh
+
+CUBE_KEYS = ["mapping_bucket", "gender_key", "caste_bucket", "age_key", "section_key"]
+
+GENDER_KEY_SQL = """
+    CASE
+      WHEN sex IS NULL OR TRIM(sex)='' THEN 'Unknown'
+      WHEN TRIM(sex) IN ('पुरुष','Male','M','m') THEN 'Male'
+      WHEN TRIM(sex) IN ('महिला','Female','F','f') THEN 'Female'
+      WHEN TRIM(sex) IN ('तृतीय लिंग','Third') THEN 'Third'
+      WHEN TRIM(sex) = 'Third Gender' THEN 'Third Gender'
+      ELSE 'Unknown'
+    END"""
+
+AGE_KEY_SQL = """
+    CASE
+      WHEN age REGEXP '^[0-9]+$' THEN CAST(age AS UNSIGNED)
+      WHEN age IS NULL THEN -2
+      ELSE -1
+    END"""
+
+SECTION_KEY_SQL = "COALESCE(TRIM(section), '')"
+
+# Checksum of the columns the cube keys depend on (CONCAT_WS skips NULLs, so they are
+# blanked; only a NULL age lands in another cell than an empty one)
+ROW_CRC_SQL = ("CRC32(CONCAT_WS('|', IFNULL(sex, ''), IFNULL(caste, ''), IFNULL(age, ''), "
+               "IFNULL(section, ''), IFNULL(mapping_status, ''), age IS NULL))")
+
+# Cube cell columns of a voter row, in CUBE_KEYS order
+KEY_SELECT_SQL = ",\n".join([
+    f"{MAPPING_BUCKET_SQL} AS mapping_bucket",
+    f"{GENDER_KEY_SQL} AS gender_key",
+    f"{CASTE_BUCKET_SQL} AS caste_bucket",
+    f"{AGE_KEY_SQL} AS age_key",
+    f"{SECTION_KEY_SQL} AS section_key",
+])
+
+AGE_BUCKET_RANGES = {
+    '18-25': "age_key BETWEEN 18 AND 25",
+    '26-35': "age_key BETWEEN 26 AND 35",
+    '36-45': "age_key BETWEEN 36 AND 45",
+    '46-60': "age_key BETWEEN 46 AND 60",
+    '60+': "age_key > 60",
+}
+
+_lock = threading.RLock()  # Serializes refreshes; reentrant for ensure_fresh's re-check
+_ready = False
+_refreshed_at = None  # time.monotonic() the last full refresh started, None: never / stale
+_stale_marks = 0  # mark_stale calls; a refresh running across one does not count as fresh
+_refreshing = False  # A background refresh is running
+_refreshing_lock = threading.Lock()  # Guards _refreshing without waiting on a refresh
+
+
+def ensure_cube_tables(cur):
+    """Create the cube and its row map on first use"""
+    global _ready
+    if _ready:
+        return
+
+    cur.execute(f"""
+        CREATE TABLE IF NOT EXISTS {CUBE_TABLE} (
+            mapping_bucket VARCHAR(16) NOT NULL,
+            gender_key VARCHAR(16) NOT NULL,
+            caste_bucket VARCHAR(16) NOT NULL,
+            age_key BIGINT NOT NULL,
+            section_key VARCHAR(255) NOT NULL,
+            cnt BIGINT NOT NULL,
+            PRIMARY KEY (mapping_bucket, gender_key, caste_bucket, age_key, section_key)
+        )
+    """)
+    cur.execute(f"""
+        CREATE TABLE IF NOT EXISTS {ROWS_TABLE} (
+            id BIGINT NOT NULL PRIMARY KEY,
+            row_crc BIGINT NOT NULL,
+            mapping_bucket VARCHAR(16) NOT NULL,
+            gender_key VARCHAR(16) NOT NULL,
+            caste_bucket VARCHAR(16) NOT NULL,
+            age_key BIGINT NOT NULL,
+            section_key VARCHAR(255) NOT NULL
+        )
+    """)
+    _ready = True
+
+
+def is_fresh():
+    return _refreshed_at is not None and time.monotonic() - _refreshed_at < CUBE_MAX_AGE
+
+
+def mark_fresh(started, marks):
+    """A full refresh that started at started (with marks stale marks) committed"""
+    global _refreshed_at
+    if marks == _stale_marks:  # Not marked stale while it ran
+        _refreshed_at = started
+
+
+def mark_stale():
+    """Force a diff refresh before the next cube read"""
+    global _refreshed_at, _stale_marks
+    _stale_marks += 1
+    _refreshed_at = None
+
+
+def rebuild_cube(cur, table):
+    """Recompute the cube and its row map from the whole table"""
+    ensure_cube_tables(cur)
+    with _lock:
+        started, marks = time.monotonic(), _stale_marks
+        cur.execute("START TRANSACTION")
+        try:
+            cur.execute(f"DELETE FROM {ROWS_TABLE}")
+            cur.execute(f"DELETE FROM {CUBE_TABLE}")
+            cur.execute(f"""
+                INSERT INTO {ROWS_TABLE} (id, row_crc, {', '.join(CUBE_KEYS)})
+                SELECT id, {ROW_CRC_SQL}, {KEY_SELECT_SQL}
+                FROM {table}
+            """)
+            cur.execute(f"""
+                INSERT INTO {CUBE_TABLE} ({', '.join(CUBE_KEYS)}, cnt)
+                SELECT {', '.join(CUBE_KEYS)}, COUNT(*)
+                FROM {ROWS_TABLE}
+                GROUP BY {', '.join(CUBE_KEYS)}
+            """)
+            cur.execute("COMMIT")
+        except Exception:
+            cur.execute("ROLLBACK")
+            raise
+        mark_fresh(started, marks)
+
+
+def refresh_cube(cur, table, ids=None):
+    """
+    Move the rows changed since they were cubed to their new cells
+
+    ids: only look at these voter ids (an edit); None compares every row's checksum
+    Returns: number of rows moved
+    """
+    ensure_cube_tables(cur)
+    keys = ', '.join(CUBE_KEYS)
+    id_filter_t, id_filter_r, params = "", "", []
+    if ids is not None:
+        if not ids:
+            return 0
+        placeholders = ', '.join(['%s'] * len(ids))
+        id_filter_t = f" AND t.id IN ({placeholders})"
+        id_filter_r = f" AND r.id IN ({placeholders})"
+        params = list(ids)
+
+    with _lock:
+        started, marks = time.monotonic(), _stale_marks
+        cur.execute(f"CREATE TEMPORARY TABLE IF NOT EXISTS {CHANGED_TABLE} (id BIGINT NOT NULL PRIMARY KEY)")
+        cur.execute("START TRANSACTION")
+        try:
+            cur.execute(f"DELETE FROM {CHANGED_TABLE}")
+            # New rows and rows whose bucketed columns changed
+            cur.execute(f"""
+                INSERT INTO {CHANGED_TABLE} (id)
+                SELECT t.id
+                FROM {table} t
+                LEFT JOIN {ROWS_TABLE} r ON r.id = t.id
+                WHERE (r.id IS NULL OR r.row_crc != {ROW_CRC_SQL}){id_filter_t}
+            """, params)
+            # Deleted rows
+            cur.execute(f"""
+                INSERT INTO {CHANGED_TABLE} (id)
+                SELECT r.id
+                FROM {ROWS_TABLE} r
+                LEFT JOIN {table} t ON t.id = r.id
+                WHERE t.id IS NULL{id_filter_r}
+            """, params)
+            cur.execute(f"SELECT COUNT(*) AS cnt FROM {CHANGED_TABLE}")
+            moved = cur.fetchone()["cnt"]
+
+            if moved:
+                # Out of the old cells
+                cur.execute(f"""
+                    UPDATE {CUBE_TABLE} c
+                    JOIN (
+                        SELECT {keys}, COUNT(*) AS n
+                        FROM {ROWS_TABLE} r
+                        JOIN {CHANGED_TABLE} x ON x.id = r.id
+                        GROUP BY {keys}
+                    ) d ON {' AND '.join(f'c.{key} = d.{key}' for key in CUBE_KEYS)}
+                    SET c.cnt = c.cnt - d.n
+                """)
+                cur.execute(f"DELETE r FROM {ROWS_TABLE} r JOIN {CHANGED_TABLE} x ON x.id = r.id")
+
+                # Into the new cells
+                cur.execute(f"""
+                    INSERT INTO {ROWS_TABLE} (id, row_crc, {keys})
+                    SELECT t.id, {ROW_CRC_SQL}, {KEY_SELECT_SQL}
+                    FROM {table} t
+                    JOIN {CHANGED_TABLE} x ON x.id = t.id
+                """)
+                cur.execute(f"""
+                    INSERT INTO {CUBE_TABLE} ({keys}, cnt)
+                    SELECT {keys}, COUNT(*)
+                    FROM {ROWS_TABLE} r
+                    JOIN {CHANGED_TABLE} x ON x.id = r.id
+                    GROUP BY {keys}
+                    ON DUPLICATE KEY UPDATE cnt = cnt + VALUES(cnt)
+                """)
+                cur.execute(f"DELETE FROM {CUBE_TABLE} WHERE cnt <= 0")
+            cur.execute("COMMIT")
+        except Exception:
+            cur.execute("ROLLBACK")
+            raise
+        if ids is None:
+            mark_fresh(started, marks)
+    return moved
+
+
+def refresh_in_background(app, table):
+    """Diff-refresh the cube on a thread of its own; a no-op while one is running"""
+    global _refreshing
+    with _refreshing_lock:
+        if _refreshing:
+            return
+        _refreshing = True
+
+    def run():
+        global _refreshing
+        try:
+            with app.app_context():
+                conn = get_conn()
+                try:
+                    with conn.cursor() as cur:
+                        refresh_cube(cur, table)
+                finally:
+                    conn.close()
+        except Exception as e:
+            app.logger.warning("Background dashboard cube refresh of %s failed: %s", table, e)
+        finally:
+            _refreshing = False
+
+    threading.Thread(target=run, name="dashboard-cube-refresh", daemon=True).start()
+
+
+def ensure_fresh(cur, table, app=None):
+    """
+    Build the cube on first use, diff-refresh it when older than CUBE_MAX_AGE
+
+    app: refresh a cube that merely aged in the background (the current one is read
+    meanwhile); a cube never built or marked stale is refreshed here either way
+    """
+    if is_fresh():
+        return
+    if app is not None and _refreshed_at is not None:
+        refresh_in_background(app, table)
+        return
+    with _lock:
+        if is_fresh():  # Refreshed by the request this one queued behind
+            return
+        ensure_cube_tables(cur)
+        cur.execute(f"SELECT COUNT(*) AS cnt FROM {ROWS_TABLE}")
+        if cur.fetchone()["cnt"] == 0:
+            rebuild_cube(cur, table)
+        else:
+            refresh_cube(cur, table)
+
+
+def cube_where_clause(args):
+    """
+    build_where_clause over the cube columns (mapping filter left out, see fold_dashboard)
+
+    Returns: (where_clause, params), or None when a search term needs the table scan
+    """
+    if args.get("search", "").strip():
+        return None
+
+    where = " WHERE 1=1 "
+    params = []
+
+    gender = (args.get("gender", "all") or "all").strip().lower()
+    if gender in ("male", "पुरुष", "m"):
+        where += " AND gender_key = 'Male' "
+    elif gender in ("female", "महिला", "f"):
+        where += " AND gender_key = 'Female' "
+    elif gender in ("third", "तृतीय", "third gender"):
+        where += " AND gender_key = 'Third' "
+    elif gender in ("unknown", "other"):
+        where += " AND gender_key IN ('Unknown', 'Third Gender') "
+
+    caste = (args.get("caste", "all") or "all").strip()
+    if caste and caste != "all":
+        where += " AND caste_bucket = %s "
+        params.append(caste)
+
+    age_min = args.get("age_min", "").strip()
+    age_max = args.get("age_max", "").strip()
+    if age_min.isdigit():
+        where += " AND age_key >= 0 AND age_key >= %s "
+        params.append(int(age_min))
+    if age_max.isdigit():
+        where += " AND age_key >= 0 AND age_key <= %s "
+        params.append(int(age_max))
+
+    age_bucket = args.get("age_bucket", "").strip()
+    if age_bucket == 'Unknown':
+        where += " AND age_key = -1 "  # Non-numeric text (NOT REGEXP is NULL for NULL ages)
+    elif age_bucket:
+        where += f" AND age_key >= 0 AND {AGE_BUCKET_RANGES.get(age_bucket, '1=1')} "
+
+    booth = args.get("booth", "").strip()
+    if booth:
+        if booth.lower() == 'unknown':
+            where += " AND section_key = '' "
+        else:
+            where += " AND section_key = %s "
+            params.append(booth)
+
+    return where, params
+
+
+def fetch_cube_groups(cur, where, params):
+    """Cube cells in the shape of dashboard_sql.fetch_dashboard_groups"""
+    cur.execute(f"""
+        SELECT
+          mapping_bucket,
+          CASE WHEN gender_key IN ('Third', 'Third Gender') THEN 'Other' ELSE gender_key END AS gender,
+          caste_bucket,
+          CASE
+            WHEN age_key BETWEEN 18 AND 25 THEN '18-25'
+            WHEN age_key BETWEEN 26 AND 35 THEN '26-35'
+            WHEN age_key BETWEEN 36 AND 45 THEN '36-45'
+            WHEN age_key BETWEEN 46 AND 60 THEN '46-60'
+            WHEN age_key > 60 THEN '60+'
+            ELSE 'Unknown'
+          END AS age_bucket,
+          CASE WHEN section_key = '' THEN 'Unknown' ELSE section_key END AS section_key,
+          cnt,
+          CASE WHEN age_key > 0 THEN age_key * cnt END AS age_sum,
+          CASE WHEN age_key > 0 THEN cnt ELSE 0 END AS age_n
+        FROM {CUBE_TABLE}
+        {where}
+    """, params)
+    return cur.fetchall()
+
+
+def cube_groups(cur, table, args, app=None):
+    """Dashboard groups from the cube (refreshed if due, see ensure_fresh), or None when the filter needs a scan"""
+    clause = cube_where_clause(args)
+    if clause is None:
+        return None
+    ensure_fresh(cur, table, app)
+    return fetch_cube_groups(cur, *clause)
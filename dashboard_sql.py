@@ -0,0 +1,141 @@
+"""
+All dashboard chart aggregates from one grouped scan
+- The dashboard used to call /api/summary (four scans), /api/age_gender, /api/caste,
+  /api/sections_all and /api/mapping_distribution on every filter change, each a
+  separate scan of the voter table with the same build_where_clause predicates
+- fetch_dashboard_groups runs a single GROUP BY over the bucket expressions of
+  every chart (mapping, gender, caste, age bucket, section) with per-group age
+  sums; the groups are few (buckets x sections), so every chart is a fold in Python
+- The mapping filter is applied to the groups instead of the scan, so the same
+  scan also yields the mapping distribution over all mapping statuses
+"""
+
+from decimal import Decimal, ROUND_HALF_UP
+
+# Bucket expressions, as in the per-chart endpoints of app.py
+MAPPING_BUCKET_SQL = """
+    CASE
+      WHEN mapping_status IS NULL OR TRIM(mapping_status) = '' THEN 'mapped'
+      WHEN LOWER(TRIM(mapping_status)) = 'unmapped' THEN 'unmapped'
+      ELSE 'mapped'
+    END"""
+
+GENDER_BUCKET_SQL = """
+    CASE
+      WHEN sex IS NULL OR TRIM(sex)='' THEN 'Unknown'
+      WHEN TRIM(sex) IN ('पुरुष','Male','M','m') THEN 'Male'
+      WHEN TRIM(sex) IN ('महिला','Female','F','f') THEN 'Female'
+      WHEN TRIM(sex) IN ('तृतीय लिंग','Third','Third Gender') THEN 'Other'
+      ELSE 'Unknown'
+    END"""
+
+CASTE_BUCKET_SQL = """
+    CASE
+      WHEN caste IS NULL OR TRIM(caste)='' THEN 'Unknown'
+      WHEN UPPER(TRIM(caste)) IN ('GEN','GENERAL') THEN 'General'
+      WHEN UPPER(TRIM(caste)) IN ('OBC','O.B.C.') THEN 'OBC'
+      WHEN UPPER(TRIM(caste)) IN ('SC','S.C.','SCHEDULED CASTE','ST','S.T.','SCHEDULED TRIBE','SC / ST') THEN 'SC / ST'
+      WHEN LOWER(TRIM(caste)) = 'muslim' THEN 'Muslim'
+      WHEN UPPER(TRIM(caste)) = 'YADAV' THEN 'Yadav'
+      ELSE 'Others'
+    END"""
+
+AGE_BUCKET_SQL = """
+    CASE
+      WHEN age REGEXP '^[0-9]+$' THEN
+        CASE
+          WHEN CAST(age AS UNSIGNED) BETWEEN 18 AND 25 THEN '18-25'
+          WHEN CAST(age AS UNSIGNED) BETWEEN 26 AND 35 THEN '26-35'
+          WHEN CAST(age AS UNSIGNED) BETWEEN 36 AND 45 THEN '36-45'
+          WHEN CAST(age AS UNSIGNED) BETWEEN 46 AND 60 THEN '46-60'
+          WHEN CAST(age AS UNSIGNED) > 60 THEN '60+'
+          ELSE 'Unknown'
+        END
+      ELSE 'Unknown'
+    END"""
+
+SECTION_SQL = "COALESCE(NULLIF(TRIM(section),''),'Unknown')"
+
+# Numeric, non-zero age (NULL otherwise): what the summary's AVG averaged
+AGE_VALUE_SQL = "CASE WHEN age REGEXP '^[0-9]+$' THEN NULLIF(CAST(age AS UNSIGNED),0) END"
+
+CASTE_ORDER = ['General', 'OBC', 'SC / ST', 'Muslim', 'Yadav', 'Others', 'Unknown']
+AGE_BUCKET_ORDER = ['18-25', '26-35', '36-45', '46-60', '60+', 'Unknown']
+TOP_SECTIONS = 10
+AVG_SCALE = Decimal('0.0001')  # MySQL AVG of an integer column: 4 decimals (div_precision_increment)
+
+
+def fetch_dashboard_groups(cur, table, where, params):
+    """
+    One grouped scan of the filtered table (build_where_clause without the mapping filter)
+
+    Returns: list of dicts (mapping_bucket, gender, caste_bucket, age_bucket, section_key, cnt, age_sum, age_n)
+    """
+    cur.execute(f"""
+        SELECT
+          {MAPPING_BUCKET_SQL} AS mapping_bucket,
+          {GENDER_BUCKET_SQL} AS gender,
+          {CASTE_BUCKET_SQL} AS caste_bucket,
+          {AGE_BUCKET_SQL} AS age_bucket,
+          {SECTION_SQL} AS section_key,
+          COUNT(*) AS cnt,
+          SUM({AGE_VALUE_SQL}) AS age_sum,
+          COUNT({AGE_VALUE_SQL}) AS age_n
+        FROM {table}
+        {where}
+        GROUP BY mapping_bucket, gender, caste_bucket, age_bucket, section_key
+    """, params)
+    return cur.fetchall()
+
+
+def count_by(groups, key):
+    counts = {}
+    for group in groups:
+        counts[group[key]] = counts.get(group[key], 0) + int(group["cnt"])
+    return counts
+
+
+def fold_dashboard(groups, mapping_filter="all"):
+    """
+    Every chart payload of the dashboard from the grouped scan
+
+    mapping_filter: 'all' | 'mapped' | 'unmapped' - the charts see only these groups,
+                    the mapping distribution always covers both statuses
+    Returns: dict with the bodies of /api/summary, /api/age_gender, /api/caste,
+             /api/sections_top, /api/sections_all and /api/mapping_distribution
+    """
+    selected = [group for group in groups
+                if mapping_filter not in ("mapped", "unmapped") or group["mapping_bucket"] == mapping_filter]
+
+    total = sum(int(group["cnt"]) for group in selected)
+    age_n = sum(int(group["age_n"] or 0) for group in selected)
+    age_sum = sum(Decimal(group["age_sum"] or 0) for group in selected)
+    avg_age = (age_sum / age_n).quantize(AVG_SCALE, rounding=ROUND_HALF_UP) if age_n else None
+
+    gender = sorted(({"gender": name, "cnt": cnt} for name, cnt in count_by(selected, "gender").items()),
+                    key=lambda row: -row["cnt"])
+    castes = count_by(selected, "caste_bucket")
+    caste = [{"caste_bucket": name, "cnt": castes[name]} for name in CASTE_ORDER if name in castes]
+
+    age_gender = {}
+    for group in selected:
+        row = age_gender.setdefault(group["age_bucket"], {"male": 0, "female": 0, "other": 0})
+        column = {"Male": "male", "Female": "female"}.get(group["gender"], "other")
+        row[column] += int(group["cnt"])
+    age_gender_rows = [{"age_bucket": bucket, **age_gender[bucket]}
+                       for bucket in AGE_BUCKET_ORDER if bucket in age_gender]
+
+    sections_all = sorted(({"section": name, "cnt": cnt} for name, cnt in count_by(selected, "section_key").items()),
+                          key=lambda row: (-row["cnt"], row["section"]))
+
+    mapping = count_by(groups, "mapping_bucket")
+
+    return {
+        "summary": {"total": total, "gender": gender, "avg_age": avg_age, "caste": caste},
+        "age_gender": age_gender_rows,
+        "caste": caste,
+        "sections_top": sections_all[:TOP_SECTIONS],
+        "sections_all": sections_all,
+        "mapping_distribution": {"data": [{"mapping_status": name, "cnt": cnt} for name, cnt in mapping.items()]},
+        "total_all_mappings": sum(mapping.values())
+    }
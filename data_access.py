@@ -0,0 +1,194 @@
+"""
+Pooled data access for the raw-SQL code (app.py routes, scripts)
+- get_conn() checks a connection out of the Flask-SQLAlchemy engine pool configured
+  in create_app (DB_POOL_SIZE, DB_MAX_OVERFLOW, ...) instead of opening a new pymysql
+  connection per request; close() hands it back
+- Connections behave like the ones they replace: DictCursor rows, autocommit on
+  (restored to off on close, as the pool's db.session users expect)
+- Every statement is timed per statement shape (literals and IN lists folded):
+  raw cursors here and, through engine events, the db.session queries of the
+  controllers and blueprints
+- Checkout waits, timeouts and peak checked-out connections show pool saturation
+- db_metrics() is served by /api/db_metrics
+"""
+
+import os
+import re
+import threading
+import time
+
+import pymysql
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+
+from config import db
+
+SLOW_QUERY_MS = float(os.getenv("DB_SLOW_QUERY_MS", 500))
+MAX_STATEMENTS = 500  # Distinct statement shapes tracked, the rest fold into OTHER_SHAPE
+OTHER_SHAPE = "<other statements>"
+
+_LITERALS = re.compile(r"'(?:[^'\\]|\\.|'')*'|%\(\w+\)s|%s|\?|\b\d+(?:\.\d+)?\b")
+_LISTS = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+
+
+def statement_shape(sql):
+    """SQL with literals and parameters as ?, IN lists as (?+), whitespace collapsed"""
+    shape = _LISTS.sub("(?+)", _LITERALS.sub("?", sql))
+    return " ".join(shape.split())[:300]
+
+
+class DbMetrics:
+    """Thread-safe statement timings and pool checkout counters"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.statements = {}
+            self.slow = 0
+            self.checkouts = 0
+            self.checkout_wait = 0.0
+            self.checkout_wait_max = 0.0
+            self.checkout_timeouts = 0
+            self.peak_checked_out = 0
+            self.since = time.time()
+
+    def record_statement(self, sql, seconds):
+        shape = statement_shape(sql)
+        with self._lock:
+            if shape not in self.statements and len(self.statements) >= MAX_STATEMENTS:
+                shape = OTHER_SHAPE
+            stats = self.statements.setdefault(shape, [0, 0.0, 0.0])
+            stats[0] += 1
+            stats[1] += seconds
+            stats[2] = max(stats[2], seconds)
+            if seconds * 1000 >= SLOW_QUERY_MS:
+                self.slow += 1
+
+    def record_checkout(self, seconds, checked_out):
+        with self._lock:
+            self.checkouts += 1
+            self.checkout_wait += seconds
+            self.checkout_wait_max = max(self.checkout_wait_max, seconds)
+            self.peak_checked_out = max(self.peak_checked_out, checked_out)
+
+    def record_timeout(self):
+        with self._lock:
+            self.checkout_timeouts += 1
+
+    def snapshot(self, top=20):
+        with self._lock:
+            statements = sorted(self.statements.items(), key=lambda item: -item[1][1])
+            return {
+                "since": self.since,
+                "statements": len(self.statements),
+                "executions": sum(stats[0] for _, stats in statements),
+                "slow_executions": self.slow,
+                "slow_query_ms": SLOW_QUERY_MS,
+                "top_statements": [
+                    {"sql": shape, "count": count, "total_ms": round(total * 1000, 2),
+                     "avg_ms": round(total * 1000 / count, 2), "max_ms": round(longest * 1000, 2)}
+                    for shape, (count, total, longest) in statements[:top]
+                ],
+                "checkouts": self.checkouts,
+                "checkout_wait_avg_ms": round(self.checkout_wait * 1000 / self.checkouts, 2) if self.checkouts else 0,
+                "checkout_wait_max_ms": round(self.checkout_wait_max * 1000, 2),
+                "checkout_timeouts": self.checkout_timeouts,
+                "peak_checked_out": self.peak_checked_out,
+            }
+
+
+metrics = DbMetrics()
+
+
+# The start time lives on the statement's execution context: a statement that raises
+# never reaches after_cursor_execute, and its start must not pair with the next one
+@event.listens_for(Engine, "before_cursor_execute")
+def _start_timer(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._query_start = time.perf_counter()
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _stop_timer(conn, cursor, statement, parameters, context, executemany):
+    start = getattr(context, "_query_start", None)
+    if start is not None:
+        metrics.record_statement(statement, time.perf_counter() - start)
+
+
+class TimedCursor(pymysql.cursors.DictCursor):
+    """DictCursor recording every execute (executemany runs through execute)"""
+
+    def execute(self, query, args=None):
+        start = time.perf_counter()
+        try:
+            return super().execute(query, args)
+        finally:
+            metrics.record_statement(query, time.perf_counter() - start)
+
+
+class PooledConnection:
+    """A pool checkout with the pymysql connection methods app.py uses"""
+
+    def __init__(self, proxy, autocommit):
+        self._proxy = proxy
+        self._raw = proxy.driver_connection
+        self._raw.autocommit(autocommit)
+
+    def cursor(self):
+        return self._raw.cursor(TimedCursor)
+
+    def commit(self):
+        self._raw.commit()
+
+    def rollback(self):
+        self._raw.rollback()
+
+    def close(self):
+        if self._proxy is None:
+            return
+        try:
+            self._raw.autocommit(False)
+        finally:
+            self._proxy.close()
+            self._proxy = None
+
+
+def get_conn(autocommit=True):
+    """Connection from the engine pool (needs an app context); close() returns it"""
+    engine = db.engine
+    start = time.perf_counter()
+    try:
+        proxy = engine.raw_connection()
+    except PoolTimeoutError:
+        metrics.record_timeout()
+        raise
+    checked_out = engine.pool.checkedout() if hasattr(engine.pool, "checkedout") else 1
+    metrics.record_checkout(time.perf_counter() - start, checked_out)
+    return PooledConnection(proxy, autocommit)
+
+
+def pool_status(engine):
+    pool = engine.pool
+    if not hasattr(pool, "checkedout"):
+        return {"pool": type(pool).__name__}
+    size = pool.size()
+    max_overflow = getattr(pool, "_max_overflow", 0)
+    capacity = size + max(max_overflow, 0)
+    return {
+        "pool": type(pool).__name__,
+        "size": size,
+        "max_overflow": max_overflow,
+        "checked_out": pool.checkedout(),
+        "checked_in": pool.checkedin(),
+        "overflow": pool.overflow(),
+        "saturation": round(pool.checkedout() / capacity, 3) if capacity > 0 else None,
+    }
+
+
+def db_metrics(top=20):
+    """Pool state and statement timings since the last reset (needs an app context)"""
+    return {"pool": pool_status(db.engine), **metrics.snapshot(top)}
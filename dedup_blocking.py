@@ -0,0 +1,282 @@
+"""
+Block statistics for the sorted-window dedup engines
+- A block is the set of records sharing the first BLOCK_KEY_LENGTH characters of
+  their normalized sort key: the window scan never compares across blocks
+- The window scans count, per block, its records, the pairs compared and the time
+  spent on its anchors (BlockStats)
+- Runs store a block-size histogram and the hottest blocks of every GP in their
+  summary; /hot-blocks reports them with their share of the run time
+- Blocks larger than max_block_size are split by secondary keys (father skeleton,
+  gender, age band, longer father skeleton) until every part fits; each part is
+  then compared all-pairs, so a large block is fully covered instead of being cut
+  off by the max_window look-ahead. Records without a value for a key (UNKNOWN
+  gender, no age) join every part of that split.
+"""
+
+from flask import Blueprint, request, jsonify
+from sqlalchemy import text
+
+from config import db
+from dedup_runs import RUNS_TABLE, ensure_run_tables, get_run
+
+BLOCK_KEY_LENGTH = 3
+HOT_BLOCKS_PER_GP = 5  # Hottest blocks of every GP kept in a run summary
+DEFAULT_MAX_BLOCK_SIZE = 500  # Larger blocks are sub-blocked (parts are compared all-pairs)
+AGE_BAND_YEARS = 10
+
+# Histogram buckets of block sizes (records): (label, min, max)
+SIZE_BUCKETS = [
+    ("1", 1, 1),
+    ("2-10", 2, 10),
+    ("11-50", 11, 50),
+    ("51-200", 51, 200),
+    ("201-1000", 201, 1000),
+    ("1001-5000", 1001, 5000),
+    ("5001+", 5001, None),
+]
+
+dedup_blocking_bp = Blueprint('dedup_blocking', __name__)
+
+
+def block_key_of(sort_key):
+    """Blocking key: the prefix the sorted window never crosses"""
+    return (sort_key or '')[:BLOCK_KEY_LENGTH]
+
+
+class BlockStats:
+    """Per-block counters of one window scan: {block: [records, comparisons, seconds]}"""
+
+    def __init__(self):
+        self.blocks = {}
+        self.sub_blocked = {}  # Oversized block -> number of sub-blocks it was split into
+
+    def _entry(self, key):
+        entry = self.blocks.get(key)
+        if entry is None:
+            entry = self.blocks[key] = [0, 0, 0.0]
+        return entry
+
+    def add_record(self, sort_key):
+        self._entry(block_key_of(sort_key))[0] += 1
+
+    def add_work(self, sort_key, comparisons, seconds):
+        entry = self._entry(block_key_of(sort_key))
+        entry[1] += comparisons
+        entry[2] += seconds
+
+    def add_split(self, sort_key, parts):
+        key = block_key_of(sort_key)
+        self.sub_blocked[key] = self.sub_blocked.get(key, 0) + parts
+
+    def total_seconds(self):
+        return sum(entry[2] for entry in self.blocks.values())
+
+    def histogram(self):
+        """Blocks, records, comparisons and seconds per block-size bucket"""
+        buckets = [{"size": label, "blocks": 0, "records": 0, "comparisons": 0, "seconds": 0.0}
+                   for label, _, _ in SIZE_BUCKETS]
+        for records, comparisons, seconds in self.blocks.values():
+            for bucket, (_, low, high) in zip(buckets, SIZE_BUCKETS):
+                if records >= low and (high is None or records <= high):
+                    bucket["blocks"] += 1
+                    bucket["records"] += records
+                    bucket["comparisons"] += comparisons
+                    bucket["seconds"] += seconds
+                    break
+        for bucket in buckets:
+            bucket["seconds"] = round(bucket["seconds"], 3)
+        return buckets
+
+    def hottest(self, top=HOT_BLOCKS_PER_GP):
+        """Blocks taking the most time, with their share of the scan time"""
+        total = self.total_seconds()
+        ranked = sorted(self.blocks.items(), key=lambda item: (-item[1][2], -item[1][1], item[0]))
+        return [{
+            "block": key,
+            "records": records,
+            "comparisons": comparisons,
+            "seconds": round(seconds, 3),
+            "time_share": round(seconds / total * 100, 2) if total else 0,
+            "sub_blocks": self.sub_blocked.get(key, 0)
+        } for key, (records, comparisons, seconds) in ranked[:top]]
+
+
+def father_skeleton_key(length):
+    """Secondary key: first consonants of the father name skeleton"""
+    def key(record):
+        return record['_f_sig'][1][:length] or None
+    return key
+
+
+def gender_key(record):
+    """Secondary key: normalized gender (UNKNOWN matches every gender)"""
+    gender = record.get('_gender')
+    return None if gender in (None, 'UNKNOWN') else gender
+
+
+def age_band_key(record):
+    """Secondary key: age band, when the records carry an age"""
+    age = record.get('_age')
+    if age is None:
+        age = str(record.get('age') or '').strip()
+        age = int(age) if age.isdecimal() else None
+    return age // AGE_BAND_YEARS if age is not None else None
+
+
+SECONDARY_KEYS = [
+    ('father_skeleton', father_skeleton_key(2)),
+    ('gender', gender_key),
+    ('age_band', age_band_key),
+    ('father_skeleton_long', father_skeleton_key(4)),
+]
+
+
+def partition_blocks(records_sorted, max_block_size):
+    """
+    Separate the records of oversized blocks from the rest (sort order kept)
+
+    Returns: (records of regular blocks, [records of one oversized block])
+    """
+    sizes = {}
+    for record in records_sorted:
+        key = block_key_of(record.get('_sort_key', ''))
+        sizes[key] = sizes.get(key, 0) + 1
+
+    regular = []
+    oversized = {}
+    for record in records_sorted:
+        key = block_key_of(record.get('_sort_key', ''))
+        if sizes[key] > max_block_size:
+            oversized.setdefault(key, []).append(record)
+        else:
+            regular.append(record)
+    return regular, list(oversized.values())
+
+
+def split_block(records, key_fn):
+    """
+    Parts of a block by one secondary key; records without a value join every part
+
+    Returns: list of parts (each in the block's order), or None if the key doesn't split
+    """
+    parts = {}
+    wildcards = []
+    for record in records:
+        value = key_fn(record)
+        if value is None:
+            wildcards.append(record)
+        else:
+            parts.setdefault(value, []).append(record)
+
+    if len(parts) < 2:
+        return None
+
+    position = {id(record): n for n, record in enumerate(records)}
+    return [sorted(members + wildcards, key=lambda record: position[id(record)])
+            for _, members in sorted(parts.items())]
+
+
+def sub_blocks(records, max_block_size, keys=SECONDARY_KEYS):
+    """Split a block recursively until every part fits or the secondary keys run out"""
+    if len(records) <= max_block_size or not keys:
+        return [records]
+
+    parts = split_block(records, keys[0][1])
+    if parts is None:
+        return sub_blocks(records, max_block_size, keys[1:])
+
+    result = []
+    for part in parts:
+        result.extend(sub_blocks(part, max_block_size, keys[1:]))
+    return result
+
+
+def summarize_blocks(stats_by_gp, top_per_gp=HOT_BLOCKS_PER_GP):
+    """
+    Run-summary payload of per-GP BlockStats: overall histogram + hottest blocks per GP
+
+    stats_by_gp: {gp_name: BlockStats}; v2 (no GPs) passes {table_name: BlockStats}
+    """
+    merged = BlockStats()
+    for stats in stats_by_gp.values():
+        for key, (records, comparisons, seconds) in stats.blocks.items():
+            entry = merged._entry(key)
+            entry[0] += records
+            entry[1] += comparisons
+            entry[2] += seconds
+
+    return {
+        "block_key_length": BLOCK_KEY_LENGTH,
+        "blocks": len(merged.blocks),
+        "largest_block": max((entry[0] for entry in merged.blocks.values()), default=0),
+        "comparisons": sum(entry[1] for entry in merged.blocks.values()),
+        "scan_seconds": round(merged.total_seconds(), 3),
+        "histogram": merged.histogram(),
+        "sub_blocked_blocks": sum(len(stats.sub_blocked) for stats in stats_by_gp.values()),
+        "hot_blocks": {gp_name: {
+            "scan_seconds": round(stats.total_seconds(), 3),
+            "blocks": stats.hottest(top_per_gp)
+        } for gp_name, stats in stats_by_gp.items()}
+    }
+
+
+def hot_block_report(blocks_summary, top=20, gp_name=None):
+    """Hottest blocks across the GPs of a run summary, share of GP and run scan time"""
+    run_seconds = blocks_summary.get("scan_seconds") or 0
+    rows = []
+    for gp, gp_stats in blocks_summary.get("hot_blocks", {}).items():
+        if gp_name is not None and gp != gp_name:
+            continue
+        for block in gp_stats["blocks"]:
+            rows.append({
+                "partition": gp,
+                **block,
+                "run_time_share": round(block["seconds"] / run_seconds * 100, 2) if run_seconds else 0
+            })
+    rows.sort(key=lambda row: (-row["seconds"], -row["comparisons"]))
+    return rows[:top]
+
+
+def latest_run_with_blocks():
+    """Newest completed v2/v3 run (its summary carries block statistics)"""
+    ensure_run_tables()
+    row = db.session.execute(text(f"""
+        SELECT run_id FROM {RUNS_TABLE}
+        WHERE engine IN ('v2', 'v3') AND status = 'completed'
+        ORDER BY created_at DESC
+        LIMIT 1
+    """)).fetchone()
+    return get_run(row.run_id) if row else None
+
+
+@dedup_blocking_bp.route("/hot-blocks", methods=["GET"])
+def hot_blocks():
+    """
+    Hottest sort-key blocks of a run (default: latest completed v2/v3 run)
+    Query: run_id, gp (one GP only), top (rows, default 20)
+    """
+    run_id = request.args.get("run_id")
+    gp_name = request.args.get("gp")
+    top = min(int(request.args.get("top", 20)), 500)
+
+    try:
+        run = get_run(run_id) if run_id else latest_run_with_blocks()
+        if run is None:
+            return jsonify({"success": False, "error": "Run not found"}), 404
+
+        blocks_summary = (run.get("summary") or {}).get("blocks")
+        if not blocks_summary:
+            return jsonify({"success": False, "error": "Run has no block statistics"}), 404
+
+        return jsonify({
+            "success": True,
+            "run_id": run["run_id"],
+            "engine": run["engine"],
+            "table_name": run["table_name"],
+            "scan_seconds": blocks_summary["scan_seconds"],
+            "comparisons": blocks_summary["comparisons"],
+            "histogram": blocks_summary["histogram"],
+            "hot_blocks": hot_block_report(blocks_summary, top, gp_name)
+        })
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
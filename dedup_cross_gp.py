@@ -0,0 +1,315 @@
+"""
+Cross-Gram-Panchayat duplicate detection on the block index
+- v3 only compares records inside one GP; a voter enrolled in two neighbouring
+  GPs is never compared
+- This pass groups the block index on strong keys
+  (voter+father metaphone, gender) and (voter+father skeleton, gender)
+  and keeps only keys that occur in more than one GP
+- Records sharing such a key are scored pairwise across GPs, so the cost follows
+  the number of colliding keys, not the table size
+- Decisions follow direct matches only: in id order, a record not yet taken becomes
+  a primary and takes every record it matched itself (always in another GP), with
+  that pair's scores; a record matched only through a third one is left alone
+"""
+
+import time
+
+from flask import Blueprint, request
+from sqlalchemy import text, bindparam
+
+from config import db, Config
+from dedup_pipeline import DedupCancelled, check_cancelled
+from dedup_jobs import submit_job_response
+from dedup_runs import create_run, finish_run, checkpoint_gp
+from dedup_writeback import write_back_staged
+from dedup_incremental import (
+    INDEX_TABLE, active_record_sql, count_stale_index_rows, ensure_index_table, index_size, prune_block_index
+)
+from scoring_engine import V3_KERNEL, PairScoreCache, with_masks
+from phonetic_dedup_v3 import (
+    calculate_enhanced_similarity, genders_compatible, update_progress, new_progress_tracker
+)
+
+DB_NAME = Config.DB_NAME
+
+dedup_cross_gp_bp = Blueprint('dedup_cross_gp', __name__)
+
+CROSS_GP_NAME = '__cross_gp__'  # Checkpoint name for the decisions of a cross-GP run
+
+# Strong keys: (name, columns); empty metaphones/skeletons never form a key
+STRONG_KEYS = [
+    ('metaphone', ('v_meta', 'f_meta', 'gender')),
+    ('skeleton', ('v_skel', 'f_skel', 'gender')),
+]
+
+
+def ensure_key_indexes():
+    """Composite indexes so the key GROUP BYs are index scans"""
+    ensure_index_table()
+    for name, columns in STRONG_KEYS:
+        try:
+            db.session.execute(text(f"""
+                CREATE INDEX idx_dedup_{name} ON {INDEX_TABLE} (table_name, {', '.join(columns)})
+            """))
+            db.session.commit()
+        except Exception:
+            db.session.rollback()  # Index already exists
+
+
+def fetch_colliding_keys(table_name, columns, max_key_size, active_only=False):
+    """
+    Members of every key shared by more than one GP
+    active_only: skip index rows of deleted / deactivated records (an unpruned index)
+
+    Returns: (list of member lists, number of oversized keys skipped)
+    """
+    key_cols = ', '.join(columns)
+    non_empty = ' AND '.join(f"{col} != ''" for col in columns[:2])
+    join_on = ' AND '.join(f"i.{col} = k.{col}" for col in columns)
+    key_filter = f"AND {active_record_sql(table_name)}" if active_only else ""
+    member_filter = f"AND {active_record_sql(table_name, 'i')}" if active_only else ""
+
+    oversized = db.session.execute(text(f"""
+        SELECT COUNT(*) FROM (
+            SELECT {key_cols}
+            FROM {INDEX_TABLE}
+            WHERE table_name = :table_name AND {non_empty}
+              {key_filter}
+            GROUP BY {key_cols}
+            HAVING COUNT(DISTINCT gp_name) > 1 AND COUNT(*) > :max_key_size
+        ) hot
+    """), {"table_name": table_name, "max_key_size": max_key_size}).scalar() or 0
+
+    result = db.session.execute(text(f"""
+        SELECT i.record_id, i.gp_name, i.gender, {', '.join(f'i.{col} AS key_{n}' for n, col in enumerate(columns))},
+               i.v_lat, i.v_skel, i.v_meta, i.v_norm, i.f_lat, i.f_skel, i.f_meta, i.f_norm
+        FROM {INDEX_TABLE} i
+        JOIN (
+            SELECT {key_cols}
+            FROM {INDEX_TABLE}
+            WHERE table_name = :table_name AND {non_empty}
+              {key_filter}
+            GROUP BY {key_cols}
+            HAVING COUNT(DISTINCT gp_name) > 1 AND COUNT(*) <= :max_key_size
+        ) k ON {join_on}
+        WHERE i.table_name = :table_name
+          {member_filter}
+        ORDER BY {', '.join(f'i.{col}' for col in columns)}, i.record_id
+    """), {"table_name": table_name, "max_key_size": max_key_size})
+
+    groups = []
+    current_key = None
+    for row in result:
+        key = tuple(getattr(row, f"key_{n}") for n in range(len(columns)))
+        if key != current_key:
+            groups.append([])
+            current_key = key
+        groups[-1].append({
+            "id": row.record_id,
+            "gp_name": row.gp_name,
+            "_gender": row.gender,
+            "_v_sig": with_masks((row.v_lat or '', row.v_skel or '', row.v_meta or '', row.v_norm or '')),
+            "_f_sig": with_masks((row.f_lat or '', row.f_skel or '', row.f_meta or '', row.f_norm or ''))
+        })
+    return groups, oversized
+
+
+def score_key_group(members, voter_threshold, father_threshold, use_gender, seen_pairs, score_cache=None):
+    """Matching cross-GP pairs inside one key group: [(id_a, id_b, voter, father, combined)]"""
+    matches = []
+    for i in range(len(members)):
+        a = members[i]
+        for j in range(i + 1, len(members)):
+            b = members[j]
+            if a["gp_name"] == b["gp_name"]:
+                continue
+            pair = (min(a["id"], b["id"]), max(a["id"], b["id"]))
+            if pair in seen_pairs:
+                continue
+            seen_pairs.add(pair)
+
+            if use_gender and not genders_compatible(a['_gender'], b['_gender']):
+                continue
+            voter_score = calculate_enhanced_similarity(a['_v_sig'], b['_v_sig'], voter_threshold, score_cache)
+            if voter_score < voter_threshold:
+                continue
+            father_score = calculate_enhanced_similarity(a['_f_sig'], b['_f_sig'], father_threshold, score_cache)
+            if father_score < father_threshold:
+                continue
+
+            matches.append((a["id"], b["id"], voter_score, father_score,
+                            round((voter_score + father_score) / 2, 2)))
+    return matches
+
+
+def build_cross_gp_decisions(table_name, matches, gp_of):
+    """
+    Duplicates of primaries from the direct matches (see the module docstring)
+    Every decision carries the scores of the record against its own primary
+    """
+    edges = {}
+    for id_a, id_b, voter_score, father_score, combined_score in matches:
+        if gp_of.get(id_a) == gp_of.get(id_b):
+            continue  # This pass never decides within one GP
+        scores = (voter_score, father_score, combined_score)
+        edges.setdefault(id_a, {})[id_b] = scores
+        edges.setdefault(id_b, {})[id_a] = scores
+
+    duplicate_of = {}
+    primaries = set()
+    for rec_id in sorted(edges):
+        if rec_id in duplicate_of:
+            continue
+        primaries.add(rec_id)
+        for other in sorted(edges[rec_id]):
+            if other not in duplicate_of and other not in primaries:
+                duplicate_of[other] = rec_id
+
+    members = sorted(duplicate_of)
+    names = {}
+    for start in range(0, len(members), 1000):
+        chunk = members[start:start + 1000]
+        result = db.session.execute(text(f"""
+            SELECT id, voter_name, father_husband_mother_name, gender
+            FROM {DB_NAME}.{table_name}
+            WHERE id IN :ids
+        """).bindparams(bindparam("ids", expanding=True)), {"ids": chunk})
+        for row in result:
+            names[row.id] = row
+
+    decisions = []
+    for rec_id in members:
+        root = duplicate_of[rec_id]
+        row = names.get(rec_id)
+        voter_score, father_score, combined_score = edges[rec_id][root]
+        decisions.append({
+            "id": rec_id,
+            "voter_name": (row.voter_name if row else None) or "(empty)",
+            "father_name": (row.father_husband_mother_name if row else None) or "(empty)",
+            "gender": row.gender if row else None,
+            "gram_panchayat": gp_of.get(rec_id),
+            "duplicate_of": root,
+            "duplicate_of_gp": gp_of.get(root),
+            "voter_score": voter_score,
+            "father_score": father_score,
+            "combined_score": combined_score
+        })
+    return decisions
+
+
+def run_cross_gp_dedup(table_name, voter_threshold=85, father_threshold=80, use_gender=True,
+                       dry_run=True, max_key_size=500, tracker=None, cancel_event=None):
+    """
+    Find voters enrolled in more than one GP (block index must be built/synced)
+
+    max_key_size: keys with more members than this are skipped (reported as hot keys);
+                  very common name pairs would otherwise dominate the pairwise cost
+    """
+    if index_size(table_name) == 0:
+        raise ValueError(f"Block index for {table_name} is empty; rebuild it first")
+
+    ensure_key_indexes()
+    if dry_run:
+        # A dry run writes nothing: stale index rows are left out of the key queries instead
+        stale = count_stale_index_rows(table_name)
+    else:
+        update_progress('processing', 'Pruning block index...', 0, 0, 0, tracker=tracker)
+        stale = prune_block_index(table_name)
+
+    run_id = create_run('cross_gp', table_name, {
+        "table_name": table_name,
+        "voter_threshold": voter_threshold,
+        "father_threshold": father_threshold,
+        "use_gender": use_gender,
+        "dry_run": dry_run,
+        "max_key_size": max_key_size
+    }, dry_run)
+
+    start = time.time()
+    try:
+        matches = []
+        seen_pairs = set()
+        gp_of = {}
+        key_stats = {}
+        score_cache = PairScoreCache(V3_KERNEL)  # The same name pairs recur under every key
+        for step, (key_name, columns) in enumerate(STRONG_KEYS, 1):
+            check_cancelled(cancel_event)
+            update_progress('processing', f'Collecting colliding {key_name} keys...',
+                            step - 1, len(STRONG_KEYS), len(matches), tracker=tracker)
+
+            groups, oversized = fetch_colliding_keys(table_name, columns, max_key_size, active_only=dry_run)
+            comparisons_before = len(seen_pairs)
+            for n, members in enumerate(groups):
+                if n % 1000 == 0:
+                    check_cancelled(cancel_event)
+                for rec in members:
+                    gp_of[rec["id"]] = rec["gp_name"]
+                score_cache.intern_records(members)
+                matches.extend(score_key_group(members, voter_threshold, father_threshold, use_gender,
+                                               seen_pairs, score_cache))
+
+            key_stats[key_name] = {
+                "colliding_keys": len(groups),
+                "records": sum(len(members) for members in groups),
+                "comparisons": len(seen_pairs) - comparisons_before,
+                "hot_keys_skipped": oversized
+            }
+
+        decisions = build_cross_gp_decisions(table_name, matches, gp_of)
+
+        if not dry_run and decisions:
+            update_progress('processing', 'Marking cross-GP duplicates as INACTIVE...',
+                            len(STRONG_KEYS), len(STRONG_KEYS), len(decisions), tracker=tracker)
+            write_back_staged(table_name, decisions, commit=False, run_id=run_id)
+        checkpoint_gp(run_id, CROSS_GP_NAME, len(gp_of), decisions)
+        db.session.commit()
+    except DedupCancelled as e:
+        finish_run(run_id, 'cancelled', error=str(e))
+        raise
+    except Exception as e:
+        finish_run(run_id, 'failed', error=str(e))
+        raise
+
+    update_progress('completed', 'Cross-GP deduplication completed',
+                    len(STRONG_KEYS), len(STRONG_KEYS), len(decisions), tracker=tracker)
+
+    summary = {
+        "success": True,
+        "run_id": run_id,
+        "mode": "cross_gp",
+        "dry_run": dry_run,
+        "voter_threshold": voter_threshold,
+        "father_threshold": father_threshold,
+        "use_gender_validation": use_gender,
+        "keys": key_stats,
+        "index_rows_pruned": 0 if dry_run else stale,
+        "index_rows_stale": stale,
+        "records_compared": len(gp_of),
+        "pairs_matched": len(matches),
+        "score_cache": score_cache.stats(),
+        "duplicate_groups_found": len({rec["duplicate_of"] for rec in decisions}),
+        "records_to_deactivate": len(decisions),
+        "duration_seconds": round(time.time() - start, 2),
+        "message": "Dry run completed" if dry_run else "Cross-GP duplicates marked as INACTIVE"
+    }
+    finish_run(run_id, 'completed', summary)
+
+    return {**summary, "details": decisions[:100]}
+
+
+@dedup_cross_gp_bp.route("/deduplicate-cross-gp", methods=["POST"])
+def deduplicate_cross_gp():
+    """
+    Optional cross-GP pass over the block index (run after a v3 pass + index rebuild)
+    Runs as a background job: returns 202 with a job id, poll /api/pysearch/jobs/<job_id>
+    """
+    table_name = request.json.get("table_name", "gram_panchayat_voters")
+    params = {
+        "table_name": table_name,
+        "voter_threshold": request.json.get("voter_threshold", 85),
+        "father_threshold": request.json.get("father_threshold", 80),
+        "use_gender": request.json.get("use_gender", True),
+        "dry_run": request.json.get("dry_run", True),
+        "max_key_size": request.json.get("max_key_size", 500)
+    }
+    return submit_job_response('cross_gp', table_name, run_cross_gp_dedup, params, new_progress_tracker())
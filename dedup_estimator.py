@@ -0,0 +1,341 @@
+"""
+Cost estimate for a dedup run before starting it
+- Samples active rows on a hash of the id (clustered ids do not skew it), builds
+  the sort-key blocks the chosen engine would build (v3: per GP, oversized blocks
+  sub-blocked; v2: whole table) and extrapolates the window comparisons block by block
+- Up to MAX_SCORED_PAIRS of the sample pairs that share a block are scored at the
+  chosen thresholds, spread over the blocks in proportion to their pair counts (a
+  hot block gets its share, not the whole budget); a matching pair survives
+  sampling with probability fraction^2, so the sample's matches / fraction^2
+  estimate the matching pairs of the whole table
+- Wall time: the per-comparison and per-record costs are measured on the sample,
+  then corrected by the median ratio of actual to modelled duration over recorded
+  completed runs (their comparisons come from the block statistics); without
+  history the uncorrected model is returned
+- Records are prepared and scored with the chosen engine's own signatures and
+  kernel (v2: prepare_records / V2_KERNEL, v3: prepare_gp_records / V3_KERNEL)
+- Memory is the measured size of a prepared record times what the engine holds
+  at once (v2 in memory: the whole table; v2 spilling: the fetch chunks in flight,
+  or the merge window if larger; v3: the largest GPs in flight)
+"""
+
+import json
+import math
+import random
+import statistics
+import sys
+import time
+from datetime import datetime
+
+from flask import Blueprint, request, jsonify
+from sqlalchemy import text
+
+import phonetic_dedup_v2
+import phonetic_dedup_v3
+from config import db, Config
+from dedup_runs import RUNS_TABLE, ensure_run_tables
+from dedup_blocking import DEFAULT_MAX_BLOCK_SIZE, block_key_of, sub_blocks
+from scoring_engine import V2_KERNEL, V3_KERNEL
+
+DB_NAME = Config.DB_NAME
+
+dedup_estimator_bp = Blueprint('dedup_estimator', __name__)
+
+DEFAULT_SAMPLE_SIZE = 20000
+MAX_SCORED_PAIRS = 20000  # Sample pairs scored for the match rate
+SAMPLE_BUCKETS = 1000000  # Hash buckets of the row sample (CRC32(id) % SAMPLE_BUCKETS)
+PAIR_SAMPLE_SEED = 39  # Pair sample of a given row sample is reproducible
+CALIBRATION_RUNS = 20  # Recent completed runs used for calibration
+
+# engine -> (record preparation, similarity kernel, gender compatibility)
+ENGINES = {
+    'v2': (phonetic_dedup_v2.prepare_records, V2_KERNEL, phonetic_dedup_v2.genders_compatible),
+    'v3': (phonetic_dedup_v3.prepare_gp_records, V3_KERNEL, phonetic_dedup_v3.genders_compatible),
+}
+
+
+def window_comparisons(block_size, max_window):
+    """Pairs the sorted window compares inside one block (no records grouped away)"""
+    if block_size <= max_window:
+        return block_size * (block_size - 1) // 2
+    return max_window * (block_size - max_window) + max_window * (max_window - 1) // 2
+
+
+def sample_records(table_name, gp_column, sample_size):
+    """
+    About sample_size active rows, chosen on a hash of the id
+
+    Returns: (records, active row count, sampling fraction)
+    """
+    total = db.session.execute(text(f"""
+        SELECT COUNT(*) FROM {DB_NAME}.{table_name}
+        WHERE status IS NULL OR status != 'INACTIVE'
+    """)).scalar() or 0
+    keep = min(SAMPLE_BUCKETS, math.ceil(SAMPLE_BUCKETS * sample_size / max(1, total)))
+
+    gp_select = f"{gp_column} AS gp_name" if gp_column else "NULL AS gp_name"
+    result = db.session.execute(text(f"""
+        SELECT id, voter_name, father_husband_mother_name, gender, {gp_select}
+        FROM {DB_NAME}.{table_name}
+        WHERE (status IS NULL OR status != 'INACTIVE') AND CRC32(id) % {SAMPLE_BUCKETS} < :keep
+    """), {"keep": keep})
+    records = [dict(row._mapping) for row in result]
+    fraction = len(records) / total if total else 1
+    return records, total, fraction
+
+
+def record_bytes(records):
+    """Average in-memory size of a prepared record (dict, values and signature tuples)"""
+    if not records:
+        return 0
+
+    def size_of(value):
+        if isinstance(value, (tuple, list)):
+            return sys.getsizeof(value) + sum(size_of(item) for item in value)
+        return sys.getsizeof(value)
+
+    sample = records[:1000]
+    return int(sum(sys.getsizeof(rec) + sum(size_of(value) for value in rec.values()) for rec in sample)
+               / len(sample))
+
+
+def sample_blocks(records, engine, max_block_size, fraction):
+    """
+    Blocks of the sample as the engine would build them, with their scaled size
+
+    Returns: list of (sample records of the block or part, estimated full size, is a sub-block part)
+    """
+    blocks = {}
+    for record in sorted(records, key=lambda rec: rec.get('_sort_key', '')):
+        scope = record['gp_name'] if engine == 'v3' else None
+        blocks.setdefault((scope, block_key_of(record.get('_sort_key', ''))), []).append(record)
+
+    result = []
+    for members in blocks.values():
+        full_size = len(members) / fraction
+        if engine == 'v3' and max_block_size and full_size > max_block_size:
+            # Split the sample with the threshold scaled down to the sample
+            for part in sub_blocks(members, max(2, max_block_size * fraction)):
+                result.append((part, len(part) / fraction, True))
+        else:
+            result.append((members, full_size, False))
+    return result
+
+
+def estimate_comparisons(blocks, max_window, max_block_size):
+    """Extrapolated comparisons and the largest (full-size) block"""
+    comparisons = 0
+    for _, full_size, is_part in blocks:
+        size = int(round(full_size))
+        if is_part and size <= max_block_size:
+            comparisons += size * (size - 1) // 2  # Parts are compared all-pairs
+        else:
+            comparisons += window_comparisons(size, max_window)
+    largest = max((int(round(full_size)) for _, full_size, _ in blocks), default=0)
+    return comparisons, largest
+
+
+def block_pairs(size, quota, rng):
+    """quota distinct (i, j) pairs of a block of size records, all of them if quota covers them"""
+    total = size * (size - 1) // 2
+    if quota >= total:
+        return [(i, j) for i in range(size) for j in range(i + 1, size)]
+    if quota * 2 > total:
+        return rng.sample([(i, j) for i in range(size) for j in range(i + 1, size)], quota)
+    pairs = set()
+    while len(pairs) < quota:
+        i, j = rng.sample(range(size), 2)
+        pairs.add((min(i, j), max(i, j)))
+    return list(pairs)
+
+
+def sample_pairs_of(blocks, max_pairs, rng):
+    """
+    Sample pairs that share a block, at most about max_pairs of them
+
+    Each block's quota is proportional to its pair count (rounded at random, so
+    the expected quota stays proportional); pairs inside a block are drawn uniformly
+    """
+    counts = [len(members) * (len(members) - 1) // 2 for members, _, _ in blocks]
+    total = sum(counts)
+    pairs = []
+    for (members, _, _), count in zip(blocks, counts):
+        if not count:
+            continue
+        share = count * max_pairs / total if total > max_pairs else count
+        quota = int(share) + (rng.random() < share - int(share))
+        pairs.extend((members[i], members[j]) for i, j in block_pairs(len(members), quota, rng))
+    return pairs
+
+
+def score_sample_pairs(blocks, engine, voter_threshold, father_threshold, use_gender):
+    """
+    Score sample pairs that share a block with the engine's kernel (see sample_pairs_of)
+
+    Returns: (pairs scored, pairs matched, seconds per comparison)
+    """
+    pairs = sample_pairs_of(blocks, MAX_SCORED_PAIRS, random.Random(PAIR_SAMPLE_SEED))
+
+    _, kernel, genders_compatible = ENGINES[engine]
+    scored = 0
+    matched = 0
+    start = time.perf_counter()
+    for a, b in pairs:
+        scored += 1
+        if kernel.score(a['_v_sig'], b['_v_sig'], voter_threshold) < voter_threshold:
+            continue
+        if kernel.score(a['_f_sig'], b['_f_sig'], father_threshold) < father_threshold:
+            continue
+        if use_gender and not genders_compatible(a['_gender'], b['_gender']):
+            continue
+        matched += 1
+    elapsed = time.perf_counter() - start
+    return scored, matched, (elapsed / scored if scored else None)
+
+
+def parse_timestamp(value):
+    if value is None or isinstance(value, datetime):
+        return value
+    return datetime.fromisoformat(str(value))
+
+
+def calibration_from_runs(engine, table_name, seconds_per_comparison, seconds_per_record):
+    """
+    Correction factor of the cost model: median of actual / modelled wall time over
+    recent completed runs with block statistics (same engine, same table first)
+
+    Returns: dict with the factor and the run count, or None without usable history
+    """
+    ensure_run_tables()
+    result = db.session.execute(text(f"""
+        SELECT run_id, table_name, summary, created_at, finished_at
+        FROM {RUNS_TABLE}
+        WHERE engine = :engine AND status = 'completed' AND summary IS NOT NULL
+        ORDER BY CASE WHEN table_name = :table_name THEN 0 ELSE 1 END, created_at DESC
+        LIMIT {CALIBRATION_RUNS}
+    """), {"engine": engine, "table_name": table_name})
+
+    ratios = []
+    for row in result:
+        summary = json.loads(row.summary)
+        comparisons = (summary.get("blocks") or {}).get("comparisons")
+        records = summary.get("total_records_processed") or 0
+        if summary.get("resumed") or not comparisons or not records:
+            continue
+
+        created, finished = parse_timestamp(row.created_at), parse_timestamp(row.finished_at)
+        if not created or not finished:
+            continue
+        modelled = comparisons * seconds_per_comparison + records * seconds_per_record
+        if modelled > 0:
+            ratios.append((finished - created).total_seconds() / modelled)
+
+    if not ratios:
+        return None
+    return {"runs": len(ratios), "factor": round(statistics.median(ratios), 3)}
+
+
+def estimate_dedup_cost(table_name, engine="v3", gp_column="gram_panchayat", voter_threshold=85,
+                        father_threshold=80, use_gender=True, max_window=200,
+                        max_block_size=DEFAULT_MAX_BLOCK_SIZE, spill_to_disk=False, workers=2,
+                        queue_size=4, batch_size=50000, sample_size=DEFAULT_SAMPLE_SIZE):
+    """Predicted comparisons, duplicates, memory and wall time of a v2/v3 run"""
+    if engine not in ENGINES:
+        raise ValueError("engine must be 'v2' or 'v3'")
+    prepare, _, _ = ENGINES[engine]
+
+    records, total, fraction = sample_records(table_name, gp_column if engine == 'v3' else None, sample_size)
+    if engine == 'v3':
+        records = [rec for rec in records if rec['gp_name'] is not None]
+    if not records:
+        return {"success": True, "table_name": table_name, "engine": engine, "total_records": total,
+                "message": "No active records to sample"}
+
+    prepare_start = time.perf_counter()
+    prepare(records)
+    sample_seconds_per_record = (time.perf_counter() - prepare_start) / len(records)
+
+    blocks = sample_blocks(records, engine, max_block_size, fraction)
+    comparisons, largest_block = estimate_comparisons(blocks, max_window, max_block_size)
+    scored, matched, sample_seconds_per_comparison = score_sample_pairs(
+        blocks, engine, voter_threshold, father_threshold, use_gender
+    )
+    sample_pairs = sum(len(members) * (len(members) - 1) // 2 for members, _, _ in blocks)
+    sample_matches = matched * sample_pairs / scored if scored else 0
+    matching_pairs = int(sample_matches / (fraction * fraction))
+
+    seconds_per_comparison = sample_seconds_per_comparison or 0
+    seconds_per_record = sample_seconds_per_record
+    calibration = calibration_from_runs(engine, table_name, seconds_per_comparison, seconds_per_record)
+    factor = calibration["factor"] if calibration else 1.0
+
+    # Records held at once
+    bytes_per_record = record_bytes(records)
+    if engine == 'v2' and spill_to_disk:
+        # Fetch phase: both pipeline queues full, one chunk per signature worker, the
+        # one being fetched and the one being spilled; merge phase: the scan window
+        chunks_in_flight = 2 * queue_size + workers + 2
+        held = min(total, max(batch_size * chunks_in_flight, max_window * 4))
+    elif engine == 'v2':
+        held = total
+    else:
+        gp_sizes = {}
+        for rec in records:
+            gp_sizes[rec['gp_name']] = gp_sizes.get(rec['gp_name'], 0) + 1
+        in_flight = 2 * workers + 2 * queue_size + 1  # Stage workers + bounded queues + writer
+        held = sum(sorted(gp_sizes.values(), reverse=True)[:in_flight]) / fraction
+
+    return {
+        "success": True,
+        "table_name": table_name,
+        "engine": engine,
+        "total_records": total,
+        "sample_size": len(records),
+        "sample_fraction": round(fraction, 6),
+        "blocks": len(blocks),
+        "largest_block": largest_block,
+        "sub_blocked": any(is_part for _, _, is_part in blocks),
+        "predicted_comparisons": comparisons,
+        "sample_pairs_scored": scored,
+        "sample_pairs_matched": matched,
+        "predicted_matching_pairs": matching_pairs,
+        "predicted_duplicates": min(matching_pairs, total),
+        "predicted_memory_mb": round(held * bytes_per_record / (1024 * 1024), 1),
+        "predicted_seconds": int(factor * (comparisons * seconds_per_comparison + total * seconds_per_record)),
+        "calibration": {
+            "runs": calibration["runs"] if calibration else 0,
+            "factor": factor,
+            "seconds_per_comparison": seconds_per_comparison,
+            "seconds_per_record": seconds_per_record
+        }
+    }
+
+
+@dedup_estimator_bp.route("/estimate", methods=["GET"])
+def estimate_route():
+    """
+    Estimate a dedup run before starting it
+    Query: table, engine (v2|v3), gp_column, voter_threshold, father_threshold, use_gender,
+           max_window, max_block_size, spill_to_disk, workers, queue_size, batch_size (v2), sample_size
+    """
+    args = request.args
+    try:
+        return jsonify(estimate_dedup_cost(
+            table_name=args.get("table", "gram_panchayat_voters"),
+            engine=args.get("engine", "v3"),
+            gp_column=args.get("gp_column", "gram_panchayat"),
+            voter_threshold=int(args.get("voter_threshold", 85)),
+            father_threshold=int(args.get("father_threshold", 80)),
+            use_gender=args.get("use_gender", "true").lower() != "false",
+            max_window=int(args.get("max_window", 200)),
+            max_block_size=int(args.get("max_block_size", DEFAULT_MAX_BLOCK_SIZE)),
+            spill_to_disk=args.get("spill_to_disk", "false").lower() == "true",
+            workers=int(args.get("workers", 2)),
+            queue_size=int(args.get("queue_size", 4)),
+            batch_size=int(args.get("batch_size", 50000)),
+            sample_size=min(int(args.get("sample_size", DEFAULT_SAMPLE_SIZE)), 200000)
+        ))
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
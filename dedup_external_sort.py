@@ -0,0 +1,139 @@
+"""
+External-memory sort for the sorted-window dedup engines
+- Prepared records are reduced to compact tuples
+  (sort_key, id, voter sig, father sig, gender, gender code, voter name, father name)
+- Each fetched chunk is sorted and spilled to its own temporary file as pickled
+  blocks (a sorted run); merge() k-way merges the runs with heapq.merge and
+  streams the records back in global (sort_key, id) order
+- (sort_key, id) is exactly the order of the in-memory engine's stable sort over
+  id-ordered rows, so both modes see the same sequence
+- More runs than max_fan_in are first merged into larger runs, so the merge
+  holds at most max_fan_in blocks in memory whatever the table size
+- The run's PairScoreCache is bounded the same way when spilling: at most batch_size
+  scores and 2 * batch_size interned signatures, dropped and rebuilt as the scan
+  moves on (the windows only revisit nearby records), so neither the cache nor the
+  intern table grows with the table
+"""
+
+import heapq
+import os
+import pickle
+import shutil
+import tempfile
+
+DEFAULT_BLOCK_SIZE = 1000  # Records per pickled block (read-ahead per run during the merge)
+DEFAULT_MAX_FAN_IN = 64  # Runs merged at once
+
+
+def compact_record(record):
+    """Prepared record -> tuple ordered by (sort_key, id)"""
+    return (
+        record.get('_sort_key', ''),
+        record['id'],
+        record['_v_sig'],
+        record['_f_sig'],
+        record.get('_gender'),
+        record.get('_gender_code', 0),
+        record.get('voter_name'),
+        record.get('father_husband_mother_name')
+    )
+
+
+def expand_record(row):
+    """Compact tuple -> record dict in the shape prepare_records produces"""
+    sort_key, rec_id, v_sig, f_sig, gender, gender_code, voter_name, father_name = row
+    return {
+        'id': rec_id,
+        'voter_name': voter_name,
+        'father_husband_mother_name': father_name,
+        '_v_sig': v_sig,
+        '_f_sig': f_sig,
+        '_sort_key': sort_key,
+        '_gender': gender,
+        '_gender_code': gender_code
+    }
+
+
+class SpillRuns:
+    """
+    Sorted runs on disk; use as a context manager so the spill directory is removed
+
+    spill_dir: parent directory for the temporary files (default: system temp dir)
+    """
+
+    def __init__(self, spill_dir=None, block_size=DEFAULT_BLOCK_SIZE, max_fan_in=DEFAULT_MAX_FAN_IN):
+        self.block_size = block_size
+        self.max_fan_in = max(2, max_fan_in)
+        self.directory = tempfile.mkdtemp(prefix='dedup_spill_', dir=spill_dir)
+        self.paths = []
+        self.rows = 0
+        self.runs_written = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def close(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+        self.paths = []
+
+    def _new_path(self):
+        self.runs_written += 1
+        return os.path.join(self.directory, f"run_{self.runs_written:06d}.bin")
+
+    def _write_run(self, rows):
+        """Write already-sorted compact rows as one run"""
+        path = self._new_path()
+        with open(path, 'wb') as f:
+            block = []
+            for row in rows:
+                block.append(row)
+                if len(block) >= self.block_size:
+                    pickle.dump(block, f, protocol=pickle.HIGHEST_PROTOCOL)
+                    block = []
+            if block:
+                pickle.dump(block, f, protocol=pickle.HIGHEST_PROTOCOL)
+        return path
+
+    @staticmethod
+    def _read_run(path):
+        with open(path, 'rb') as f:
+            while True:
+                try:
+                    block = pickle.load(f)
+                except EOFError:
+                    return
+                yield from block
+
+    def add_run(self, records):
+        """Sort one chunk of prepared records and spill it"""
+        if not records:
+            return
+        rows = sorted(compact_record(record) for record in records)
+        self.paths.append(self._write_run(rows))
+        self.rows += len(rows)
+
+    def _reduce_runs(self):
+        """Merge runs in groups of max_fan_in until one final merge is enough"""
+        while len(self.paths) > self.max_fan_in:
+            group, self.paths = self.paths[:self.max_fan_in], self.paths[self.max_fan_in:]
+            merged = self._write_run(heapq.merge(*(self._read_run(path) for path in group)))
+            for path in group:
+                os.remove(path)
+            self.paths.append(merged)
+
+    def merge(self):
+        """Yield every spilled record (as a dict) in global (sort_key, id) order"""
+        self._reduce_runs()
+        for row in heapq.merge(*(self._read_run(path) for path in self.paths)):
+            yield expand_record(row)
+
+    def stats(self):
+        return {
+            "rows": self.rows,
+            "runs": len(self.paths),
+            "runs_written": self.runs_written,
+            "bytes": sum(os.path.getsize(path) for path in self.paths if os.path.exists(path))
+        }
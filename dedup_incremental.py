@@ -0,0 +1,478 @@
+"""
+Incremental deduplication against a persistent block index
+- dedup_block_index keeps one row per active record: GP, blocking key
+  (first 3 chars of the normalized voter name), row checksum and signatures
+- An incremental run only reads records that are new or changed since the index
+  was last synced and compares them against the indexed records of their blocks
+- Indexed (already kept) records are always the primary of a match; new records
+  that match nothing indexed are deduplicated among themselves with the v3 window
+- A rebuild re-indexes the whole active table (run it after a full v3 pass)
+"""
+
+import time
+
+from flask import Blueprint, request, jsonify
+from sqlalchemy import text, bindparam
+
+from config import db, Config
+from dedup_pipeline import DedupCancelled, check_cancelled
+from dedup_jobs import submit_job_response
+from dedup_runs import create_run, finish_run, checkpoint_gp
+from dedup_blocking import BLOCK_KEY_LENGTH, block_key_of
+from scoring_engine import V3_KERNEL, PairScoreCache, with_masks
+from phonetic_dedup_v3 import (
+    prepare_gp_records, compare_gp_records, calculate_enhanced_similarity,
+    genders_compatible, build_deactivation_list, deactivate_records_batch,
+    update_progress, new_progress_tracker
+)
+
+DB_NAME = Config.DB_NAME
+INDEX_TABLE = f"{DB_NAME}.dedup_block_index"
+
+dedup_incremental_bp = Blueprint('dedup_incremental', __name__)
+
+_index_ready = False
+
+
+def ensure_index_table():
+    """Create the block index table on first use"""
+    global _index_ready
+    if _index_ready:
+        return
+
+    db.session.execute(text(f"""
+        CREATE TABLE IF NOT EXISTS {INDEX_TABLE} (
+            table_name VARCHAR(128) NOT NULL,
+            record_id BIGINT NOT NULL,
+            gp_name VARCHAR(255),
+            block_key VARCHAR(16) NOT NULL DEFAULT '',
+            sort_key VARCHAR(255) NOT NULL DEFAULT '',
+            row_crc BIGINT NOT NULL,
+            gender VARCHAR(8),
+            v_lat VARCHAR(255), v_skel VARCHAR(255), v_meta VARCHAR(64), v_norm VARCHAR(255),
+            f_lat VARCHAR(255), f_skel VARCHAR(255), f_meta VARCHAR(64), f_norm VARCHAR(255),
+            PRIMARY KEY (table_name, record_id)
+        )
+    """))
+    try:
+        db.session.execute(text(f"""
+            CREATE INDEX idx_dedup_block ON {INDEX_TABLE} (table_name, gp_name, block_key)
+        """))
+    except Exception:
+        db.session.rollback()  # Index already exists
+    db.session.commit()
+    _index_ready = True
+
+
+def row_crc_sql(gp_column, alias="t"):
+    """SQL expression fingerprinting the fields the dedup decision depends on"""
+    return (f"CRC32(CONCAT_WS('|', {alias}.voter_name, {alias}.father_husband_mother_name, "
+            f"{alias}.gender, {alias}.{gp_column}))")
+
+
+def index_rows(table_name, records):
+    """Block index rows for records already passed through prepare_gp_records"""
+    rows = []
+    for rec in records:
+        v_sig, f_sig = rec['_v_sig'], rec['_f_sig']
+        rows.append({
+            "table_name": table_name,
+            "record_id": rec["id"],
+            "gp_name": rec["gp_name"],
+            "block_key": block_key_of(rec['_sort_key']),
+            "sort_key": rec['_sort_key'][:255],
+            "row_crc": rec["row_crc"],
+            "gender": rec['_gender'],
+            "v_lat": v_sig[0][:255], "v_skel": v_sig[1][:255], "v_meta": v_sig[2][:64], "v_norm": v_sig[3][:255],
+            "f_lat": f_sig[0][:255], "f_skel": f_sig[1][:255], "f_meta": f_sig[2][:64], "f_norm": f_sig[3][:255]
+        })
+    return rows
+
+
+def insert_index_rows(rows):
+    if not rows:
+        return
+    db.session.execute(text(f"""
+        INSERT INTO {INDEX_TABLE}
+            (table_name, record_id, gp_name, block_key, sort_key, row_crc, gender,
+             v_lat, v_skel, v_meta, v_norm, f_lat, f_skel, f_meta, f_norm)
+        VALUES
+            (:table_name, :record_id, :gp_name, :block_key, :sort_key, :row_crc, :gender,
+             :v_lat, :v_skel, :v_meta, :v_norm, :f_lat, :f_skel, :f_meta, :f_norm)
+    """), rows)
+
+
+def delete_index_rows(table_name, record_ids):
+    if not record_ids:
+        return
+    db.session.execute(text(f"""
+        DELETE FROM {INDEX_TABLE}
+        WHERE table_name = :table_name AND record_id IN :record_ids
+    """).bindparams(bindparam("record_ids", expanding=True)),
+        {"table_name": table_name, "record_ids": list(record_ids)})
+
+
+def index_size(table_name):
+    ensure_index_table()
+    return db.session.execute(
+        text(f"SELECT COUNT(*) FROM {INDEX_TABLE} WHERE table_name = :table_name"),
+        {"table_name": table_name}
+    ).scalar() or 0
+
+
+def active_record_sql(table_name, index_ref=INDEX_TABLE):
+    """Predicate on an index row (index_ref: the index table or its alias): its record is active"""
+    return f"""EXISTS (
+              SELECT 1 FROM {DB_NAME}.{table_name} t
+              WHERE t.id = {index_ref}.record_id
+                AND (t.status IS NULL OR t.status != 'INACTIVE')
+          )"""
+
+
+def prune_block_index(table_name):
+    """Drop index rows whose record was deleted or deactivated; returns rows removed"""
+    result = db.session.execute(text(f"""
+        DELETE FROM {INDEX_TABLE}
+        WHERE table_name = :table_name
+          AND NOT {active_record_sql(table_name)}
+    """), {"table_name": table_name})
+    db.session.commit()
+    return result.rowcount
+
+
+def count_stale_index_rows(table_name):
+    """Index rows prune_block_index would drop (read only, for dry runs)"""
+    return db.session.execute(text(f"""
+        SELECT COUNT(*) FROM {INDEX_TABLE}
+        WHERE table_name = :table_name
+          AND NOT {active_record_sql(table_name)}
+    """), {"table_name": table_name}).scalar() or 0
+
+
+def fetch_changed_records(table_name, gp_column):
+    """Active records missing from the index or whose checksum changed since indexing"""
+    sql = f"""
+        SELECT t.id, t.voter_name, t.father_husband_mother_name, t.gender, t.status,
+               t.{gp_column} AS gp_name, {row_crc_sql(gp_column)} AS row_crc,
+               i.record_id AS indexed_id
+        FROM {DB_NAME}.{table_name} t
+        LEFT JOIN {INDEX_TABLE} i
+               ON i.table_name = :table_name AND i.record_id = t.id
+        WHERE (t.status IS NULL OR t.status != 'INACTIVE')
+          AND t.{gp_column} IS NOT NULL
+          AND (i.record_id IS NULL OR i.row_crc != {row_crc_sql(gp_column)})
+        ORDER BY t.{gp_column}, t.id
+    """
+    result = db.session.execute(text(sql), {"table_name": table_name})
+    return [dict(row._mapping) for row in result]
+
+
+def load_block_candidates(table_name, gp_name, records, active_only=False):
+    """
+    Indexed records of one GP that can fall in the same window as the given records:
+    same 3-char block, shorter keys that prefix it, or (for short keys) any key they prefix
+    active_only: skip index rows of deleted / deactivated records (an unpruned index)
+    """
+    exact_keys = set()
+    prefixes = set()
+    for rec in records:
+        key = rec['_sort_key']
+        if len(key) >= BLOCK_KEY_LENGTH:
+            exact_keys.update(key[:n] for n in range(BLOCK_KEY_LENGTH + 1))
+        else:
+            exact_keys.update(key[:n] for n in range(len(key) + 1))
+            prefixes.add(key)
+
+    conditions = ["block_key IN :exact_keys"]
+    params = {"table_name": table_name, "gp_name": gp_name, "exact_keys": list(exact_keys)}
+    for n, prefix in enumerate(sorted(prefixes)):
+        conditions.append(f"block_key LIKE :prefix_{n}")
+        params[f"prefix_{n}"] = prefix + '%'
+
+    active_filter = f"AND {active_record_sql(table_name)}" if active_only else ""
+    sql = text(f"""
+        SELECT record_id, sort_key, gender, v_lat, v_skel, v_meta, v_norm,
+               f_lat, f_skel, f_meta, f_norm
+        FROM {INDEX_TABLE}
+        WHERE table_name = :table_name AND gp_name = :gp_name
+          AND ({' OR '.join(conditions)})
+          {active_filter}
+        ORDER BY sort_key, record_id
+    """).bindparams(bindparam("exact_keys", expanding=True))
+
+    candidates = []
+    for row in db.session.execute(sql, params):
+        candidates.append({
+            "id": row.record_id,
+            "_sort_key": row.sort_key or '',
+            "_gender": row.gender,
+            "_v_sig": with_masks((row.v_lat or '', row.v_skel or '', row.v_meta or '', row.v_norm or '')),
+            "_f_sig": with_masks((row.f_lat or '', row.f_skel or '', row.f_meta or '', row.f_norm or ''))
+        })
+    return candidates
+
+
+def in_same_window(key_a, key_b):
+    """Mirror of the window's early-termination rule"""
+    if key_a and key_b and len(key_a) >= BLOCK_KEY_LENGTH and len(key_b) >= BLOCK_KEY_LENGTH:
+        return key_a[:BLOCK_KEY_LENGTH] == key_b[:BLOCK_KEY_LENGTH]
+    return True
+
+
+def match_against_index(record, candidates, voter_threshold, father_threshold, use_gender, score_cache=None):
+    """Best indexed match for one new record, or None"""
+    best = None
+    for cand in candidates:
+        if cand["id"] == record["id"] or not in_same_window(record['_sort_key'], cand['_sort_key']):
+            continue
+
+        if use_gender and not genders_compatible(record['_gender'], cand['_gender']):
+            continue
+        voter_score = calculate_enhanced_similarity(record['_v_sig'], cand['_v_sig'], voter_threshold, score_cache)
+        if voter_score < voter_threshold:
+            continue
+        father_score = calculate_enhanced_similarity(record['_f_sig'], cand['_f_sig'], father_threshold, score_cache)
+        if father_score < father_threshold:
+            continue
+
+        combined_score = round((voter_score + father_score) / 2, 2)
+        if best is None or combined_score > best[3]:
+            best = (cand, voter_score, father_score, combined_score)
+    return best
+
+
+def dedup_gp_incremental(table_name, gp_name, records, voter_threshold, father_threshold, use_gender,
+                         score_cache=None, active_only=False):
+    """
+    Compare one GP's new records against its indexed blocks
+    score_cache: PairScoreCache of the run (the records are interned with it)
+    active_only: the index was not pruned, leave out rows of inactive records
+
+    Returns: (duplicate groups, records that stay active)
+    """
+    candidates = load_block_candidates(table_name, gp_name, records, active_only)
+    if score_cache is not None:
+        score_cache.intern_records(candidates)
+
+    groups_by_primary = {}
+    unmatched = []
+    for rec in sorted(records, key=lambda r: (r['_sort_key'], r['id'])):
+        best = match_against_index(rec, candidates, voter_threshold, father_threshold, use_gender, score_cache)
+        if best is None:
+            unmatched.append(rec)
+            continue
+
+        primary, voter_score, father_score, combined_score = best
+        rec['voter_score'] = voter_score
+        rec['father_score'] = father_score
+        rec['combined_score'] = combined_score
+        groups_by_primary.setdefault(primary["id"], [primary]).append(rec)
+
+    duplicate_groups = list(groups_by_primary.values())
+
+    # New records that match nothing indexed: same window pass as a full v3 run
+    new_groups = compare_gp_records(unmatched, voter_threshold, father_threshold, use_gender,
+                                    score_cache=score_cache)
+    duplicate_groups.extend(new_groups)
+
+    duplicate_ids = {rec["id"] for group in new_groups for rec in group[1:]}
+    kept = [rec for rec in unmatched if rec["id"] not in duplicate_ids]
+    return duplicate_groups, kept
+
+
+def run_incremental_dedup(table_name, gp_column="gram_panchayat", voter_threshold=85,
+                          father_threshold=80, use_gender=True, dry_run=True,
+                          tracker=None, cancel_event=None):
+    """
+    Deduplicate only records that are new or changed since the block index was synced
+
+    On a real run, records that stay active are added to the index so the next
+    top-up import is compared against them; a dry run leaves the index untouched
+    (stale index rows are counted instead of pruned and left out of the comparison).
+
+    Returns: Result payload (same shape as the /deduplicate-voters-v3 response)
+    """
+    pk_column = "id"
+
+    if index_size(table_name) == 0:
+        raise ValueError(f"Block index for {table_name} is empty; rebuild it first")
+
+    update_progress('processing', 'Syncing block index...', 0, 0, 0, tracker=tracker)
+    if dry_run:
+        stale = count_stale_index_rows(table_name)
+    else:
+        stale = prune_block_index(table_name)
+    records = fetch_changed_records(table_name, gp_column)
+    check_cancelled(cancel_event)
+
+    by_gp = {}
+    for rec in records:
+        by_gp.setdefault(rec["gp_name"], []).append(rec)
+    total_records = len(records)
+    total_gps = len(by_gp)
+
+    run_id = create_run('incremental', table_name, {
+        "table_name": table_name,
+        "gp_column": gp_column,
+        "voter_threshold": voter_threshold,
+        "father_threshold": father_threshold,
+        "use_gender": use_gender,
+        "dry_run": dry_run
+    }, dry_run, gp_column)
+
+    all_records_to_deactivate = []
+    processed = 0
+    score_cache = PairScoreCache(V3_KERNEL)
+    start = time.time()
+    try:
+        for gp_idx, (gp_name, gp_records) in enumerate(by_gp.items(), 1):
+            check_cancelled(cancel_event)
+            update_progress('processing', f'Processing GP {gp_idx}/{total_gps}: {gp_name}',
+                            processed, total_records, len(all_records_to_deactivate),
+                            gp_idx - 1, total_gps, gp_name, tracker=tracker)
+
+            score_cache.intern_records(prepare_gp_records(gp_records))
+            groups, kept = dedup_gp_incremental(
+                table_name, gp_name, gp_records, voter_threshold, father_threshold, use_gender, score_cache,
+                active_only=dry_run
+            )
+            deactivations = build_deactivation_list(groups, gp_name)
+
+            if not dry_run:
+                # Changed rows are re-indexed; duplicates leave the index
+                delete_index_rows(table_name, [rec["id"] for rec in gp_records if rec["indexed_id"] is not None])
+                if deactivations:
+                    deactivate_records_batch(table_name, pk_column, deactivations, commit=False, run_id=run_id)
+                insert_index_rows(index_rows(table_name, kept))
+            checkpoint_gp(run_id, gp_name, len(gp_records), deactivations)
+            db.session.commit()
+
+            all_records_to_deactivate.extend(deactivations)
+            processed += len(gp_records)
+    except DedupCancelled as e:
+        finish_run(run_id, 'cancelled', error=str(e))
+        raise
+    except Exception as e:
+        finish_run(run_id, 'failed', error=str(e))
+        raise
+
+    update_progress('completed', 'Incremental deduplication completed',
+                    total_records, total_records, len(all_records_to_deactivate),
+                    total_gps, total_gps, '', tracker=tracker)
+
+    summary = {
+        "success": True,
+        "run_id": run_id,
+        "mode": "incremental",
+        "dry_run": dry_run,
+        "voter_threshold": voter_threshold,
+        "father_threshold": father_threshold,
+        "use_gender_validation": use_gender,
+        "total_records_processed": processed,
+        "total_gps_processed": total_gps,
+        "index_rows_pruned": 0 if dry_run else stale,
+        "index_rows_stale": stale,
+        "duplicate_groups_found": len({rec["duplicate_of"] for rec in all_records_to_deactivate}),
+        "records_to_deactivate": len(all_records_to_deactivate),
+        "score_cache": score_cache.stats(),
+        "duration_seconds": round(time.time() - start, 2),
+        "message": "Dry run completed" if dry_run else "Duplicates marked as INACTIVE"
+    }
+    finish_run(run_id, 'completed', summary)
+
+    return {**summary, "details": all_records_to_deactivate[:100]}
+
+
+def rebuild_block_index(table_name, gp_column="gram_panchayat", batch_size=5000,
+                        tracker=None, cancel_event=None):
+    """Re-index every active record of a table (streamed, committed per chunk)"""
+    ensure_index_table()
+
+    total_records = db.session.execute(text(f"""
+        SELECT COUNT(*) FROM {DB_NAME}.{table_name}
+        WHERE (status IS NULL OR status != 'INACTIVE') AND {gp_column} IS NOT NULL
+    """)).scalar() or 0
+    update_progress('processing', 'Rebuilding block index...', 0, total_records, 0, tracker=tracker)
+
+    db.session.execute(text(f"DELETE FROM {INDEX_TABLE} WHERE table_name = :table_name"),
+                       {"table_name": table_name})
+    db.session.commit()
+
+    # Keyset pagination on id: every chunk is its own short query and commit
+    sql = f"""
+        SELECT t.id, t.voter_name, t.father_husband_mother_name, t.gender,
+               t.{gp_column} AS gp_name, {row_crc_sql(gp_column)} AS row_crc
+        FROM {DB_NAME}.{table_name} t
+        WHERE (t.status IS NULL OR t.status != 'INACTIVE') AND t.{gp_column} IS NOT NULL
+          AND t.id > :last_id
+        ORDER BY t.id
+        LIMIT {int(batch_size)}
+    """
+    indexed = 0
+    last_id = -1
+    while True:
+        check_cancelled(cancel_event)
+        records = [dict(row._mapping) for row in db.session.execute(text(sql), {"last_id": last_id})]
+        if not records:
+            break
+
+        prepare_gp_records(records)
+        insert_index_rows(index_rows(table_name, records))
+        db.session.commit()
+
+        indexed += len(records)
+        last_id = records[-1]["id"]
+        update_progress('processing', 'Rebuilding block index...', indexed, total_records, 0,
+                        tracker=tracker)
+
+    update_progress('completed', 'Block index rebuilt', indexed, total_records, 0, tracker=tracker)
+    return {"success": True, "table_name": table_name, "records_indexed": indexed}
+
+
+@dedup_incremental_bp.route("/block-index/rebuild", methods=["POST"])
+def rebuild_block_index_route():
+    """Rebuild the block index of a table as a background job"""
+    table_name = request.json.get("table_name", "gram_panchayat_voters")
+    params = {
+        "table_name": table_name,
+        "gp_column": request.json.get("gp_column", "gram_panchayat"),
+        "batch_size": request.json.get("batch_size", 5000)
+    }
+    return submit_job_response('index', table_name, rebuild_block_index, params, new_progress_tracker())
+
+
+@dedup_incremental_bp.route("/block-index/status", methods=["GET"])
+def block_index_status():
+    """Index size and how many active records are new/changed since the last sync"""
+    table_name = request.args.get("table", "gram_panchayat_voters")
+    gp_column = request.args.get("gp_column", "gram_panchayat")
+
+    try:
+        indexed = index_size(table_name)
+        pending = len(fetch_changed_records(table_name, gp_column)) if indexed else None
+        return jsonify({
+            "success": True,
+            "table_name": table_name,
+            "indexed_records": indexed,
+            "pending_records": pending
+        })
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+
+@dedup_incremental_bp.route("/deduplicate-incremental", methods=["POST"])
+def deduplicate_incremental():
+    """
+    Incremental deduplication of new/changed records against the block index
+    Runs as a background job: returns 202 with a job id, poll /api/pysearch/jobs/<job_id>
+    """
+    table_name = request.json.get("table_name", "gram_panchayat_voters")
+    params = {
+        "table_name": table_name,
+        "gp_column": request.json.get("gp_column", "gram_panchayat"),
+        "voter_threshold": request.json.get("voter_threshold", 85),
+        "father_threshold": request.json.get("father_threshold", 80),
+        "use_gender": request.json.get("use_gender", True),
+        "dry_run": request.json.get("dry_run", True)
+    }
+    return submit_job_response('incremental', table_name, run_incremental_dedup, params, new_progress_tracker())
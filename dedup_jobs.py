@@ -0,0 +1,214 @@
+"""
+Background dedup job runner
+- POST endpoints submit work here and return a job id immediately
+- Work runs on a small worker pool inside the Flask app context
+- Every job owns its progress record and a cooperative cancel flag
+- Only one queued/running job per table; a second submit is rejected
+"""
+
+import os
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import Blueprint, jsonify, current_app
+
+from config import db
+from dedup_pipeline import DedupCancelled
+
+dedup_jobs_bp = Blueprint('dedup_jobs', __name__)
+
+ACTIVE_STATUSES = ('queued', 'running')
+FINISHED_STATUSES = ('completed', 'failed', 'cancelled')
+
+
+class JobConflict(Exception):
+    """Raised when a table already has an active job"""
+
+    def __init__(self, job):
+        super().__init__(f"Job {job.id} is already {job.status} on {job.table_name}")
+        self.job = job
+
+
+class DedupJob:
+    """One background dedup run and its progress record"""
+
+    def __init__(self, kind, table_name, params, progress):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.table_name = table_name
+        self.params = params
+        self.progress = progress
+        self.status = 'queued'
+        self.result = None
+        self.error = None
+        self.traceback = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.cancel_event = threading.Event()
+
+    def to_dict(self, include_result=True):
+        data = {
+            "job_id": self.id,
+            "kind": self.kind,
+            "table_name": self.table_name,
+            "status": self.status,
+            "params": self.params,
+            "progress": self.progress,
+            "cancel_requested": self.cancel_event.is_set(),
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "error": self.error
+        }
+        if include_result:
+            data["result"] = self.result
+        if self.traceback:
+            data["traceback"] = self.traceback
+        return data
+
+
+class JobManager:
+    """In-process registry and worker pool for dedup jobs"""
+
+    def __init__(self, max_workers=2, keep_finished=50):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='dedup-job')
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._keep_finished = keep_finished
+
+    def submit(self, app, kind, table_name, fn, params, progress):
+        """
+        Queue fn(**params, tracker=progress, cancel_event=...) for background execution
+
+        Raises: JobConflict if the table already has a queued/running job
+        """
+        with self._lock:
+            for job in self._jobs.values():
+                if job.table_name == table_name and job.status in ACTIVE_STATUSES:
+                    raise JobConflict(job)
+
+            job = DedupJob(kind, table_name, params, progress)
+            self._jobs[job.id] = job
+            self._prune()
+
+        self._executor.submit(self._run, app, job, fn)
+        return job
+
+    def _run(self, app, job, fn):
+        if job.cancel_event.is_set():
+            self._finish(job, 'cancelled')
+            return
+
+        job.status = 'running'
+        job.started_at = time.time()
+        job.progress['start_time'] = job.started_at
+        job.progress['status'] = 'processing'
+
+        with app.app_context():
+            try:
+                job.result = fn(**job.params, tracker=job.progress, cancel_event=job.cancel_event)
+                self._finish(job, 'completed')
+            except DedupCancelled as e:
+                job.error = str(e)
+                job.progress['status'] = 'cancelled'
+                self._finish(job, 'cancelled')
+            except Exception as e:
+                job.error = str(e)
+                job.traceback = traceback.format_exc()
+                job.progress['status'] = 'error'
+                self._finish(job, 'failed')
+            finally:
+                db.session.remove()
+
+    @staticmethod
+    def _finish(job, status):
+        job.status = status
+        job.finished_at = time.time()
+
+    def _prune(self):
+        """Drop the oldest finished jobs beyond keep_finished (caller holds the lock)"""
+        finished = [j for j in self._jobs.values() if j.status in FINISHED_STATUSES]
+        finished.sort(key=lambda j: j.finished_at or 0)
+        for job in finished[:max(0, len(finished) - self._keep_finished)]:
+            del self._jobs[job.id]
+
+    def get(self, job_id):
+        return self._jobs.get(job_id)
+
+    def cancel(self, job_id):
+        """Request cooperative cancellation; returns the job or None"""
+        job = self._jobs.get(job_id)
+        if job is not None and job.status in ACTIVE_STATUSES:
+            job.cancel_event.set()
+        return job
+
+    def latest(self, kind, active_only=True):
+        """Most recently created job of a kind (used by the legacy progress endpoints)"""
+        with self._lock:
+            jobs = [j for j in self._jobs.values()
+                    if j.kind == kind and (not active_only or j.status in ACTIVE_STATUSES)]
+        return max(jobs, key=lambda j: j.created_at) if jobs else None
+
+    def list(self):
+        with self._lock:
+            return sorted(self._jobs.values(), key=lambda j: j.created_at, reverse=True)
+
+
+job_manager = JobManager(max_workers=int(os.getenv("DEDUP_JOB_WORKERS", 2)))
+
+
+def submit_job_response(kind, table_name, fn, params, progress):
+    """Submit a job and build the 202 (or 409 on conflict) response for a POST route"""
+    try:
+        job = job_manager.submit(current_app._get_current_object(), kind, table_name, fn, params, progress)
+    except JobConflict as e:
+        return jsonify({
+            "success": False,
+            "error": str(e),
+            "job_id": e.job.id,
+            "status": e.job.status
+        }), 409
+
+    return jsonify({
+        "success": True,
+        "job_id": job.id,
+        "status": job.status,
+        "status_url": f"/api/pysearch/jobs/{job.id}",
+        "message": "Deduplication job queued"
+    }), 202
+
+
+@dedup_jobs_bp.route("/jobs", methods=["GET"])
+def list_jobs():
+    """List known jobs, newest first (results omitted)"""
+    return jsonify({
+        "success": True,
+        "jobs": [job.to_dict(include_result=False) for job in job_manager.list()]
+    })
+
+
+@dedup_jobs_bp.route("/jobs/<job_id>", methods=["GET"])
+def get_job(job_id):
+    """Job status, progress record and (once completed) the result payload"""
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({"success": False, "error": "Job not found"}), 404
+    return jsonify(job.to_dict())
+
+
+@dedup_jobs_bp.route("/jobs/<job_id>", methods=["DELETE"])
+def cancel_job(job_id):
+    """Cooperative cancel: the job stops at its next checkpoint"""
+    job = job_manager.cancel(job_id)
+    if job is None:
+        return jsonify({"success": False, "error": "Job not found"}), 404
+    return jsonify({
+        "success": True,
+        "job_id": job.id,
+        "status": job.status,
+        "cancel_requested": job.cancel_event.is_set()
+    })
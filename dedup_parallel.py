@@ -0,0 +1,148 @@
+"""
+Parallel pair scoring for the sorted-window dedup engines
+- The sorted records are split into contiguous chunks; every chunk is extended by
+  max_window records into the next one so no neighbouring pair is lost at a border
+- A process pool runs the greedy window scan on every chunk speculatively (records
+  grouped by earlier chunks are unknown to it) and returns the scores of the pairs
+  it compared, so the total work stays close to the serial scan's
+- The serial greedy scan is then replayed over the precomputed scores; pairs the
+  replay needs that a worker did not compare (its grouping differed near a chunk
+  start) are scored inline, so the groups are identical to the serial output
+"""
+
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+from dedup_pipeline import check_cancelled
+
+CHUNKS_PER_WORKER = 4  # Smaller chunks balance uneven name blocks across the pool
+
+
+def compact_for_scoring(record):
+    """Only what the pair test reads (keeps pickling to the workers small)"""
+    return {
+        '_sort_key': record.get('_sort_key', ''),
+        '_v_sig': record['_v_sig'],
+        '_f_sig': record['_f_sig'],
+        '_gender': record.get('_gender'),
+        '_gender_code': record.get('_gender_code', 0)
+    }
+
+
+def score_chunk(records, start, end, offset, match_fn, diverge_fn, max_window, thresholds):
+    """
+    Worker: run the greedy window scan over anchors [start, end) of a chunk slice
+
+    The scan is speculative: records grouped by anchors before the chunk are not
+    known here, so it starts with an empty grouped set. Every pair it scores is
+    still correct; the replay only re-scores pairs it needs that were not scored.
+
+    records: slice of the sorted records beginning at global index offset,
+             covering end + max_window records (or the tail)
+
+    Returns: (start, reach, skipped, matches)
+        reach[k]: last global index scored for anchor start + k (itself if none)
+        skipped: {anchor: set of indices inside its reach that were not scored}
+        matches: {(i, j): scores} for matching pairs only
+    """
+    voter_threshold, father_threshold, use_gender = thresholds
+    limit = offset + len(records)
+    grouped = set()
+    reach = []
+    skipped = {}
+    matches = {}
+    for i in range(start, end):
+        if i in grouped:
+            reach.append(i)
+            continue
+
+        anchor = records[i - offset]
+        last = i
+        passed = []
+        j = i + 1
+        checked = 0
+        while j < limit and checked < max_window:
+            if j in grouped:
+                passed.append(j)
+                j += 1
+                continue
+            candidate = records[j - offset]
+            if diverge_fn(anchor['_sort_key'], candidate['_sort_key']):
+                break
+            scores = match_fn(anchor, candidate, voter_threshold, father_threshold, use_gender)
+            if scores:
+                matches[(i, j)] = scores
+                grouped.add(j)
+            last = j
+            j += 1
+            checked += 1
+
+        reach.append(last)
+        passed = [k for k in passed if k < last]
+        if passed:
+            skipped[i] = set(passed)
+    return start, reach, skipped, matches
+
+
+class PrecomputedMatches:
+    """Pair scores of a sorted record list, as computed by the pool"""
+
+    def __init__(self, total):
+        self.reach = list(range(total))
+        self.skipped = {}
+        self.matches = {}
+
+    def add(self, start, reach, skipped, matches):
+        self.reach[start:start + len(reach)] = reach
+        self.skipped.update(skipped)
+        self.matches.update(matches)
+
+    def covers(self, i, j):
+        return j <= self.reach[i] and j not in self.skipped.get(i, ())
+
+    def get(self, i, j):
+        """Scores of a covered pair (None: scored, no match)"""
+        return self.matches.get((i, j))
+
+
+def precompute_matches(records_sorted, match_fn, diverge_fn, voter_threshold=85, father_threshold=80,
+                       use_gender=True, max_window=200, workers=4, cancel_event=None, on_progress=None):
+    """
+    Run the speculative window scan of every chunk in a process pool
+
+    match_fn / diverge_fn: module-level functions (they are pickled by reference)
+    on_progress(chunks_done, chunks_total) is called as chunks complete
+
+    Returns: PrecomputedMatches
+    """
+    total = len(records_sorted)
+    result = PrecomputedMatches(total)
+    if total < 2:
+        return result
+
+    compact = [compact_for_scoring(record) for record in records_sorted]
+    chunk_size = max(max_window, -(-total // (workers * CHUNKS_PER_WORKER)))
+    thresholds = (voter_threshold, father_threshold, use_gender)
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = set()
+        for start in range(0, total, chunk_size):
+            end = min(start + chunk_size, total)
+            border = min(end + max_window, total)  # Overlap into the next chunk
+            pending.add(pool.submit(score_chunk, compact[start:border], start, end, start,
+                                    match_fn, diverge_fn, max_window, thresholds))
+
+        chunks_total = len(pending)
+        try:
+            while pending:
+                done, pending = wait(pending, timeout=1, return_when=FIRST_COMPLETED)
+                for future in done:
+                    result.add(*future.result())
+                check_cancelled(cancel_event)
+                if on_progress and done:
+                    on_progress(chunks_total - len(pending), chunks_total)
+        except BaseException:
+            for future in pending:
+                future.cancel()
+            raise
+
+    return result
@@ -0,0 +1,270 @@
+"""
+Overlapped fetch/compute pipeline for the dedup engines
+- One source thread (DB fetch) feeds the first stage
+- Every stage runs N worker threads between two bounded queues
+- The sink (batched writer) drains the last queue on the calling thread
+- A full queue blocks its producer, so a slow stage throttles the ones before it
+- Per-stage throughput counters are exposed through snapshot()
+"""
+
+import queue
+import threading
+import time
+
+_DONE = object()
+
+# How long a blocked put/get waits before re-checking for errors or cancellation
+_POLL_SECONDS = 0.2
+
+
+class DedupCancelled(Exception):
+    """Raised when a dedup run is stopped through its cancel event"""
+
+
+def check_cancelled(cancel_event):
+    """Raise DedupCancelled if the run's cancel event has been set"""
+    if cancel_event is not None and cancel_event.is_set():
+        raise DedupCancelled('Deduplication cancelled')
+
+
+class StageStats:
+    """Thread-safe throughput counters for one pipeline stage"""
+
+    def __init__(self, name, workers):
+        self.name = name
+        self.workers = workers
+        self.items = 0
+        self.records = 0
+        self.busy_seconds = 0.0
+        self.idle_seconds = 0.0
+        self.blocked_seconds = 0.0
+        self.started_at = 0
+        self.finished_at = 0
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if not self.started_at:
+                self.started_at = time.time()
+
+    def finish(self):
+        with self._lock:
+            self.finished_at = time.time()
+
+    def add(self, records=0, busy=0.0, idle=0.0, blocked=0.0, items=1):
+        with self._lock:
+            self.items += items
+            self.records += records
+            self.busy_seconds += busy
+            self.idle_seconds += idle
+            self.blocked_seconds += blocked
+
+    def to_dict(self, queue_depth=None):
+        with self._lock:
+            end = self.finished_at or time.time()
+            elapsed = end - self.started_at if self.started_at else 0
+            return {
+                'workers': self.workers,
+                'items': self.items,
+                'records': self.records,
+                'records_per_second': round(self.records / elapsed, 1) if elapsed > 0 else 0,
+                'busy_seconds': round(self.busy_seconds, 2),
+                'idle_seconds': round(self.idle_seconds, 2),
+                'blocked_seconds': round(self.blocked_seconds, 2),
+                'queue_depth': queue_depth,
+                'done': bool(self.finished_at)
+            }
+
+
+class DedupPipeline:
+    """
+    Producer/consumer pipeline connected by bounded queues
+
+    Args:
+        source: Iterable of work items, consumed on a dedicated thread
+        stages: List of (name, fn, workers); fn(item) returns the item for the next stage
+        sink: fn(item) called on the calling thread for every finished item
+        source_name / sink_name: Names used in the stage counters
+        queue_size: Capacity of every inter-stage queue (back-pressure bound)
+        size_of: fn(item) -> number of records in the item, for throughput counters
+        cancel_event: threading.Event that stops the run with DedupCancelled
+        app: Flask app whose context is pushed in every worker thread
+    """
+
+    def __init__(self, source, stages, sink, source_name='fetch', sink_name='writer',
+                 queue_size=4, size_of=None, cancel_event=None, app=None):
+        self.source = source
+        self.stages = [(name, fn, max(1, int(workers))) for name, fn, workers in stages]
+        self.sink = sink
+        self.source_name = source_name
+        self.sink_name = sink_name
+        self.size_of = size_of or (lambda item: 1)
+        self.cancel_event = cancel_event
+        self.app = app
+
+        self.queues = [queue.Queue(maxsize=max(1, int(queue_size))) for _ in range(len(self.stages) + 1)]
+        self.stats = {source_name: StageStats(source_name, 1)}
+        for name, _, workers in self.stages:
+            self.stats[name] = StageStats(name, workers)
+        self.stats[sink_name] = StageStats(sink_name, 1)
+
+        self._stop = threading.Event()
+        self._error = None
+        self._error_lock = threading.Lock()
+        self._remaining = [workers for _, _, workers in self.stages]
+        self._remaining_lock = threading.Lock()
+
+    # ------------------------------------------------------------------ #
+    # Helpers
+    # ------------------------------------------------------------------ #
+    def _cancelled(self):
+        return self.cancel_event is not None and self.cancel_event.is_set()
+
+    def _fail(self, exc):
+        with self._error_lock:
+            if self._error is None:
+                self._error = exc
+        self._stop.set()
+
+    def _put(self, q, item):
+        """Blocking put that gives up when the pipeline is stopping"""
+        start = time.perf_counter()
+        while True:
+            if self._stop.is_set():
+                return False, time.perf_counter() - start
+            if self._cancelled():
+                self._fail(DedupCancelled('Deduplication cancelled'))
+                return False, time.perf_counter() - start
+            try:
+                q.put(item, timeout=_POLL_SECONDS)
+                return True, time.perf_counter() - start
+            except queue.Full:
+                continue
+
+    def _get(self, q):
+        """Blocking get that gives up when the pipeline is stopping"""
+        start = time.perf_counter()
+        while True:
+            if self._stop.is_set():
+                return _DONE, time.perf_counter() - start, False
+            if self._cancelled():
+                self._fail(DedupCancelled('Deduplication cancelled'))
+                return _DONE, time.perf_counter() - start, False
+            try:
+                return q.get(timeout=_POLL_SECONDS), time.perf_counter() - start, True
+            except queue.Empty:
+                continue
+
+    def _with_context(self, fn):
+        def runner(*args):
+            try:
+                if self.app is not None:
+                    with self.app.app_context():
+                        fn(*args)
+                else:
+                    fn(*args)
+            except Exception as e:
+                self._fail(e)
+        return runner
+
+    def _downstream_workers(self, stage_idx):
+        """Number of consumers reading queue[stage_idx]"""
+        if stage_idx < len(self.stages):
+            return self.stages[stage_idx][2]
+        return 1
+
+    def _send_done(self, queue_idx):
+        for _ in range(self._downstream_workers(queue_idx)):
+            self._put(self.queues[queue_idx], _DONE)
+
+    # ------------------------------------------------------------------ #
+    # Threads
+    # ------------------------------------------------------------------ #
+    def _run_source(self):
+        stats = self.stats[self.source_name]
+        stats.start()
+        iterator = iter(self.source)
+        while not self._stop.is_set():
+            t0 = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                break
+            busy = time.perf_counter() - t0
+            ok, blocked = self._put(self.queues[0], item)
+            stats.add(records=self.size_of(item), busy=busy, blocked=blocked)
+            if not ok:
+                return
+        stats.finish()
+        self._send_done(0)
+
+    def _run_stage(self, stage_idx):
+        name, fn, _ = self.stages[stage_idx]
+        stats = self.stats[name]
+        stats.start()
+        in_q = self.queues[stage_idx]
+        out_q = self.queues[stage_idx + 1]
+
+        while True:
+            item, idle, _ = self._get(in_q)
+            if item is _DONE:
+                break
+            t0 = time.perf_counter()
+            result = fn(item)
+            busy = time.perf_counter() - t0
+            ok, blocked = self._put(out_q, result)
+            stats.add(records=self.size_of(result), busy=busy, idle=idle, blocked=blocked)
+            if not ok:
+                return
+
+        # Last worker of this stage forwards the end marker
+        with self._remaining_lock:
+            self._remaining[stage_idx] -= 1
+            last = self._remaining[stage_idx] == 0
+        if last and not self._stop.is_set():
+            stats.finish()
+            self._send_done(stage_idx + 1)
+
+    # ------------------------------------------------------------------ #
+    # Public API
+    # ------------------------------------------------------------------ #
+    def snapshot(self):
+        """Plain-dict copy of the per-stage counters, safe to jsonify"""
+        depths = {self.source_name: self.queues[0].qsize()}
+        for idx, (name, _, _) in enumerate(self.stages):
+            depths[name] = self.queues[idx + 1].qsize()
+        return {name: stats.to_dict(depths.get(name)) for name, stats in self.stats.items()}
+
+    def run(self):
+        """Run the pipeline to completion; re-raises the first worker error"""
+        threads = [threading.Thread(target=self._with_context(self._run_source),
+                                    name=f'dedup-{self.source_name}', daemon=True)]
+        for idx, (name, _, workers) in enumerate(self.stages):
+            for w in range(workers):
+                threads.append(threading.Thread(target=self._with_context(self._run_stage),
+                                                args=(idx,), name=f'dedup-{name}-{w}', daemon=True))
+        for t in threads:
+            t.start()
+
+        stats = self.stats[self.sink_name]
+        stats.start()
+        try:
+            while True:
+                item, idle, _ = self._get(self.queues[-1])
+                if item is _DONE:
+                    break
+                t0 = time.perf_counter()
+                self.sink(item)
+                stats.add(records=self.size_of(item), busy=time.perf_counter() - t0, idle=idle)
+        except Exception as e:
+            self._fail(e)
+        finally:
+            stats.finish()
+            if self._error is not None:
+                self._stop.set()
+            for t in threads:
+                t.join()
+
+        if self._error is not None:
+            raise self._error
+        return self.snapshot()
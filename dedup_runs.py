@@ -0,0 +1,544 @@
+"""
+Persistent dedup run records (checkpoint / resume)
+- dedup_runs: one row per run with its parameters, status and final summary
+- dedup_run_gps: one row per completed GP (the checkpoint)
+- dedup_run_decisions: every duplicate decision of the run
+A GP's checkpoint row and decisions are written in the same transaction as its
+write-back, so a resumed run can skip every GP that has a checkpoint row.
+Dry runs also store a per-GP checksum, the table's MAX(id) watermark and the
+signature version, so a reviewed dry run can later be committed as a pure
+write-back if none of its GPs changed in between.
+Every write-back logs the previous values of the rows it touches under its
+run_id (dedup_undo_log), so one run can be rolled back without a full reset.
+A commit claims its run as 'committing' before the first chunk; one that stops
+partway leaves it 'partially_committed'. Neither is committed again: roll it back.
+"""
+
+import json
+import threading
+import time
+import uuid
+
+from flask import Blueprint, request, jsonify
+from sqlalchemy import text, bindparam
+
+from config import db, Config
+from dedup_jobs import submit_job_response
+from dedup_pipeline import check_cancelled
+from dedup_writeback import ensure_undo_table, write_back_staged, restore_run
+
+DB_NAME = Config.DB_NAME
+
+RUNS_TABLE = f"{DB_NAME}.dedup_runs"
+RUN_GPS_TABLE = f"{DB_NAME}.dedup_run_gps"
+DECISIONS_TABLE = f"{DB_NAME}.dedup_run_decisions"
+
+# Bump whenever signature generation or scoring changes: stored decisions made
+# by another version are never committed
+SIGNATURE_VERSION = 1
+
+# Statuses of an interrupted run ('running' when its process died). Completed,
+# committed and rolled back runs are never resumed: that would append decisions
+# to a finished run and write back over a reviewed or undone result
+RESUMABLE_STATUSES = ('running', 'failed', 'cancelled')
+
+dedup_runs_bp = Blueprint('dedup_runs', __name__)
+
+_tables_ready = False
+_tables_lock = threading.Lock()
+
+
+def ensure_run_tables():
+    """Create the run tables on first use"""
+    global _tables_ready
+    if _tables_ready:
+        return
+
+    with _tables_lock:
+        if _tables_ready:
+            return
+
+        db.session.execute(text(f"""
+            CREATE TABLE IF NOT EXISTS {RUNS_TABLE} (
+                run_id VARCHAR(32) NOT NULL PRIMARY KEY,
+                engine VARCHAR(16) NOT NULL,
+                table_name VARCHAR(128) NOT NULL,
+                gp_column VARCHAR(128),
+                params TEXT,
+                status VARCHAR(16) NOT NULL,
+                dry_run TINYINT NOT NULL DEFAULT 1,
+                signature_version INT,
+                watermark BIGINT,
+                summary MEDIUMTEXT,
+                error TEXT,
+                created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                finished_at DATETIME NULL,
+                committed_at DATETIME NULL
+            )
+        """))
+        db.session.execute(text(f"""
+            CREATE TABLE IF NOT EXISTS {RUN_GPS_TABLE} (
+                run_id VARCHAR(32) NOT NULL,
+                gp_name VARCHAR(255) NOT NULL,
+                records INT NOT NULL DEFAULT 0,
+                duplicates INT NOT NULL DEFAULT 0,
+                checksum VARCHAR(64),
+                completed_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (run_id, gp_name)
+            )
+        """))
+        db.session.execute(text(f"""
+            CREATE TABLE IF NOT EXISTS {DECISIONS_TABLE} (
+                run_id VARCHAR(32) NOT NULL,
+                record_id BIGINT NOT NULL,
+                gp_name VARCHAR(255),
+                seq INT NOT NULL DEFAULT 0,
+                duplicate_of BIGINT NOT NULL,
+                voter_name VARCHAR(255),
+                father_name VARCHAR(255),
+                gender VARCHAR(16),
+                voter_score FLOAT,
+                father_score FLOAT,
+                combined_score FLOAT,
+                PRIMARY KEY (run_id, record_id)
+            )
+        """))
+        db.session.commit()
+
+        # Columns added after the tables first shipped
+        ensure_column(RUNS_TABLE, "signature_version", "INT")
+        ensure_column(RUNS_TABLE, "watermark", "BIGINT")
+        ensure_column(RUNS_TABLE, "committed_at", "DATETIME NULL")
+        ensure_column(RUN_GPS_TABLE, "checksum", "VARCHAR(64)")
+        ensure_undo_table()  # Before any write-back of the run opens its transaction
+        _tables_ready = True
+
+
+def ensure_column(table, column, ddl):
+    """Add a column to an existing table if it is missing"""
+    try:
+        db.session.execute(text(f"SELECT {column} FROM {table} WHERE 1 = 0"))
+    except Exception:
+        db.session.rollback()
+        db.session.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+        db.session.commit()
+
+
+def create_run(engine, table_name, params, dry_run, gp_column=None):
+    """Insert a new run row in 'running' state; returns its run_id"""
+    ensure_run_tables()
+    run_id = uuid.uuid4().hex
+
+    db.session.execute(text(f"""
+        INSERT INTO {RUNS_TABLE}
+            (run_id, engine, table_name, gp_column, params, status, dry_run, signature_version, watermark)
+        VALUES
+            (:run_id, :engine, :table_name, :gp_column, :params, 'running', :dry_run, :signature_version,
+             :watermark)
+    """), {
+        "run_id": run_id,
+        "engine": engine,
+        "table_name": table_name,
+        "gp_column": gp_column,
+        "params": json.dumps(params),
+        "dry_run": 1 if dry_run else 0,
+        "signature_version": SIGNATURE_VERSION,
+        "watermark": table_watermark(table_name)
+    })
+    db.session.commit()
+    return run_id
+
+
+def get_run(run_id):
+    """Run row as a dict (params/summary decoded), or None"""
+    ensure_run_tables()
+    row = db.session.execute(
+        text(f"SELECT * FROM {RUNS_TABLE} WHERE run_id = :run_id"), {"run_id": run_id}
+    ).fetchone()
+    if row is None:
+        return None
+
+    run = dict(row._mapping)
+    run['params'] = json.loads(run['params']) if run.get('params') else {}
+    run['summary'] = json.loads(run['summary']) if run.get('summary') else None
+    run['dry_run'] = bool(run['dry_run'])
+    for key in ('created_at', 'updated_at', 'finished_at', 'committed_at'):
+        if run.get(key) is not None:
+            run[key] = str(run[key])
+    return run
+
+
+def mark_run_status(run_id, status, error=None):
+    """Update a run's status (e.g. back to 'running' on resume)"""
+    db.session.execute(text(f"""
+        UPDATE {RUNS_TABLE}
+        SET status = :status, error = :error, updated_at = CURRENT_TIMESTAMP
+        WHERE run_id = :run_id
+    """), {"run_id": run_id, "status": status, "error": error})
+    db.session.commit()
+
+
+def finish_run(run_id, status, summary=None, error=None):
+    """Close a run with its final status and summary payload"""
+    db.session.rollback()  # Drop whatever a failed GP left in the transaction
+    db.session.execute(text(f"""
+        UPDATE {RUNS_TABLE}
+        SET status = :status, summary = :summary, error = :error,
+            updated_at = CURRENT_TIMESTAMP, finished_at = CURRENT_TIMESTAMP
+        WHERE run_id = :run_id
+    """), {
+        "run_id": run_id,
+        "status": status,
+        "summary": json.dumps(summary) if summary is not None else None,
+        "error": error
+    })
+    db.session.commit()
+
+
+def completed_gps(run_id):
+    """Checkpointed GPs of a run: {gp_name: {'records': n, 'duplicates': n}}"""
+    ensure_run_tables()
+    result = db.session.execute(text(f"""
+        SELECT gp_name, records, duplicates
+        FROM {RUN_GPS_TABLE}
+        WHERE run_id = :run_id
+    """), {"run_id": run_id})
+    return {row.gp_name: {'records': row.records, 'duplicates': row.duplicates} for row in result}
+
+
+def checkpoint_gp(run_id, gp_name, records, decisions, checksum=None):
+    """
+    Stage one GP's checkpoint row and decisions in the current transaction
+    The caller commits, together with the GP's write-back
+    checksum: gp_checksums() value taken before the GP was read (dry runs)
+    """
+    if decisions:
+        db.session.execute(text(f"""
+            INSERT INTO {DECISIONS_TABLE}
+                (run_id, record_id, gp_name, seq, duplicate_of, voter_name, father_name,
+                 gender, voter_score, father_score, combined_score)
+            VALUES
+                (:run_id, :record_id, :gp_name, :seq, :duplicate_of, :voter_name, :father_name,
+                 :gender, :voter_score, :father_score, :combined_score)
+        """), [
+            {
+                "run_id": run_id,
+                "record_id": rec["id"],
+                "gp_name": gp_name,
+                "seq": seq,
+                "duplicate_of": rec["duplicate_of"],
+                "voter_name": (rec.get("voter_name") or "")[:255],
+                "father_name": (rec.get("father_name") or "")[:255],
+                "gender": rec.get("gender"),
+                "voter_score": rec.get("voter_score", 0),
+                "father_score": rec.get("father_score", 0),
+                "combined_score": rec.get("combined_score", 0)
+            }
+            for seq, rec in enumerate(decisions)
+        ])
+
+    db.session.execute(text(f"""
+        INSERT INTO {RUN_GPS_TABLE} (run_id, gp_name, records, duplicates, checksum)
+        VALUES (:run_id, :gp_name, :records, :duplicates, :checksum)
+    """), {"run_id": run_id, "gp_name": gp_name, "records": records, "duplicates": len(decisions),
+           "checksum": checksum})
+    db.session.execute(text(f"""
+        UPDATE {RUNS_TABLE} SET updated_at = CURRENT_TIMESTAMP WHERE run_id = :run_id
+    """), {"run_id": run_id})
+
+
+def table_watermark(table_name):
+    """Highest id in the table (rows above it were inserted after the run started)"""
+    return db.session.execute(text(f"SELECT MAX(id) FROM {DB_NAME}.{table_name}")).scalar()
+
+
+def gp_checksums(table_name, gp_column, gp_names):
+    """
+    Order-independent fingerprint of the active rows of each GP: "count:sum(crc32)"
+    Any insert, deactivation or edit of a name/gender in the GP changes it
+    """
+    if not gp_names:
+        return {}
+
+    sql = text(f"""
+        SELECT {gp_column} AS gp_name, COUNT(*) AS row_count,
+               SUM(CRC32(CONCAT_WS('|', id, voter_name, father_husband_mother_name, gender))) AS crc_sum
+        FROM {DB_NAME}.{table_name}
+        WHERE (status IS NULL OR status != 'INACTIVE')
+          AND {gp_column} IN :gp_names
+        GROUP BY {gp_column}
+    """).bindparams(bindparam("gp_names", expanding=True))
+
+    result = db.session.execute(sql, {"gp_names": list(gp_names)})
+    return {row.gp_name: f"{row.row_count}:{int(row.crc_sum or 0)}" for row in result}
+
+
+def load_decisions(run_id, gp_names=None):
+    """Stored decisions of a run grouped by GP, in their original order"""
+    result = db.session.execute(text(f"""
+        SELECT record_id, gp_name, duplicate_of, voter_name, father_name, gender,
+               voter_score, father_score, combined_score
+        FROM {DECISIONS_TABLE}
+        WHERE run_id = :run_id
+        ORDER BY gp_name, seq
+    """), {"run_id": run_id})
+
+    decisions = {}
+    for row in result:
+        if gp_names is not None and row.gp_name not in gp_names:
+            continue
+        decisions.setdefault(row.gp_name, []).append({
+            "id": row.record_id,
+            "voter_name": row.voter_name,
+            "father_name": row.father_name,
+            "gender": row.gender,
+            "gram_panchayat": row.gp_name,
+            "duplicate_of": row.duplicate_of,
+            "voter_score": row.voter_score,
+            "father_score": row.father_score,
+            "combined_score": row.combined_score
+        })
+    return decisions
+
+
+@dedup_runs_bp.route("/runs", methods=["GET"])
+def list_runs():
+    """Recent dedup runs, newest first"""
+    ensure_run_tables()
+    table_name = request.args.get("table")
+    limit = int(request.args.get("limit", 50))
+
+    where = "WHERE table_name = :table_name" if table_name else ""
+    result = db.session.execute(text(f"""
+        SELECT run_id, engine, table_name, gp_column, status, dry_run, error,
+               created_at, updated_at, finished_at
+        FROM {RUNS_TABLE}
+        {where}
+        ORDER BY created_at DESC
+        LIMIT {limit}
+    """), {"table_name": table_name})
+
+    runs = []
+    for row in result:
+        run = dict(row._mapping)
+        run['dry_run'] = bool(run['dry_run'])
+        for key in ('created_at', 'updated_at', 'finished_at'):
+            if run.get(key) is not None:
+                run[key] = str(run[key])
+        runs.append(run)
+
+    return jsonify({"success": True, "runs": runs})
+
+
+@dedup_runs_bp.route("/runs/<run_id>", methods=["GET"])
+def get_run_detail(run_id):
+    """One run with its checkpoint progress"""
+    run = get_run(run_id)
+    if run is None:
+        return jsonify({"success": False, "error": "Run not found"}), 404
+
+    gps = completed_gps(run_id)
+    run['gps_completed'] = len(gps)
+    run['records_checkpointed'] = sum(gp['records'] for gp in gps.values())
+    run['duplicates_checkpointed'] = sum(gp['duplicates'] for gp in gps.values())
+    return jsonify({"success": True, "run": run})
+
+
+def new_job_progress():
+    """Progress record for run maintenance jobs (commit / rollback)"""
+    return {
+        'status': 'queued',
+        'current_step': '',
+        'records_processed': 0,
+        'total_records': 0,
+        'percentage': 0,
+        'start_time': 0
+    }
+
+
+def report_progress(tracker, step, done, total):
+    tracker.update({
+        'status': 'processing',
+        'current_step': step,
+        'records_processed': done,
+        'total_records': total,
+        'percentage': round(done / total * 100, 2) if total else 100
+    })
+
+
+class RunConflict(Exception):
+    """A stored run can no longer be committed as-is"""
+
+    def __init__(self, message, changed_gps=None):
+        super().__init__(message)
+        self.changed_gps = changed_gps or []
+
+
+def verify_run_snapshot(run):
+    """
+    Check that a completed dry run still matches the table
+
+    Raises: RunConflict if the run is not committable or any GP with decisions changed
+    Returns: Number of rows inserted since the run's watermark (informational)
+    """
+    if run['engine'] != 'v3':
+        # Incremental dry runs are cheap to repeat and also depend on the block index
+        raise RunConflict(f"Runs of engine {run['engine']} cannot be committed")
+    if not run['dry_run']:
+        raise RunConflict("Run was not a dry run; its decisions are already applied")
+    if run['status'] in ('committing', 'partially_committed'):
+        raise RunConflict(f"Run is {run['status']}; roll it back instead of committing it again")
+    if run['status'] != 'completed':
+        raise RunConflict(f"Run is {run['status']}, only completed dry runs can be committed")
+    if run.get('signature_version') != SIGNATURE_VERSION:
+        raise RunConflict(
+            f"Run used signature version {run.get('signature_version')}, current is {SIGNATURE_VERSION}"
+        )
+
+    stored = {}
+    result = db.session.execute(text(f"""
+        SELECT gp_name, checksum FROM {RUN_GPS_TABLE}
+        WHERE run_id = :run_id AND duplicates > 0
+    """), {"run_id": run['run_id']})
+    for row in result:
+        stored[row.gp_name] = row.checksum
+
+    current = gp_checksums(run['table_name'], run['gp_column'], list(stored))
+    changed = sorted(gp_name for gp_name, checksum in stored.items()
+                     if checksum is None or current.get(gp_name) != checksum)
+    if changed:
+        raise RunConflict(f"{len(changed)} GP(s) changed since the dry run", changed)
+
+    watermark = table_watermark(run['table_name']) or 0
+    return max(0, watermark - (run.get('watermark') or 0))
+
+
+def claim_commit(run_id):
+    """Move a completed run to 'committing' (RunConflict if another commit got it first)"""
+    result = db.session.execute(text(f"""
+        UPDATE {RUNS_TABLE}
+        SET status = 'committing', updated_at = CURRENT_TIMESTAMP
+        WHERE run_id = :run_id AND status = 'completed'
+    """), {"run_id": run_id})
+    db.session.commit()
+    if result.rowcount != 1:
+        raise RunConflict("Run is already being committed")
+
+
+def commit_run(run_id, chunk_size=5000, tracker=None, cancel_event=None):
+    """
+    Apply a stored dry run's decisions without recomputing anything
+    Chunks commit one by one: a cancel or error partway leaves the run 'partially_committed'
+    """
+    tracker = tracker if tracker is not None else {}
+    run = get_run(run_id)
+    if run is None:
+        raise ValueError(f"Run {run_id} not found")
+
+    rows_added = verify_run_snapshot(run)
+    check_cancelled(cancel_event)
+
+    pairs = [
+        {"id": row.record_id, "duplicate_of": row.duplicate_of}
+        for row in db.session.execute(text(f"""
+            SELECT record_id, duplicate_of FROM {DECISIONS_TABLE}
+            WHERE run_id = :run_id
+            ORDER BY record_id
+        """), {"run_id": run_id})
+    ]
+
+    def report(done, total):
+        check_cancelled(cancel_event)
+        report_progress(tracker, 'Applying stored decisions...', done, total)
+
+    start = time.time()
+    claim_commit(run_id)
+    try:
+        updated = write_back_staged(run['table_name'], pairs, chunk_size=chunk_size, on_progress=report,
+                                    run_id=run_id)
+    except Exception as e:
+        db.session.rollback()  # The chunk in progress; committed chunks stay in the undo log
+        mark_run_status(run_id, 'partially_committed', error=str(e))
+        raise
+
+    db.session.execute(text(f"""
+        UPDATE {RUNS_TABLE}
+        SET status = 'committed', committed_at = CURRENT_TIMESTAMP, updated_at = CURRENT_TIMESTAMP
+        WHERE run_id = :run_id
+    """), {"run_id": run_id})
+    db.session.commit()
+
+    tracker.update({'status': 'completed', 'current_step': 'Stored run committed', 'percentage': 100})
+    return {
+        "success": True,
+        "run_id": run_id,
+        "table_name": run['table_name'],
+        "records_deactivated": updated,
+        "rows_added_since_run": rows_added,
+        "duration_seconds": round(time.time() - start, 2),
+        "message": "Stored dry run committed"
+    }
+
+
+@dedup_runs_bp.route("/runs/<run_id>/commit", methods=["POST"])
+def commit_run_route(run_id):
+    """
+    Commit a completed dry run as a pure write-back
+    409 (with the changed GPs) if any GP with decisions changed since the dry run
+    """
+    run = get_run(run_id)
+    if run is None:
+        return jsonify({"success": False, "error": "Run not found"}), 404
+
+    try:
+        verify_run_snapshot(run)
+    except RunConflict as e:
+        return jsonify({"success": False, "error": str(e), "changed_gps": e.changed_gps}), 409
+
+    params = {"run_id": run_id, "chunk_size": (request.get_json(silent=True) or {}).get("chunk_size", 5000)}
+    return submit_job_response('commit', run['table_name'], commit_run, params, new_job_progress())
+
+
+def rollback_run(run_id, chunk_size=5000, tracker=None, cancel_event=None):
+    """Restore every row a run deactivated from its undo log"""
+    tracker = tracker if tracker is not None else {}
+    run = get_run(run_id)
+    if run is None:
+        raise ValueError(f"Run {run_id} not found")
+    if run['status'] == 'rolled_back':
+        raise RunConflict("Run is already rolled back")
+
+    def report(done, total):
+        check_cancelled(cancel_event)
+        report_progress(tracker, 'Restoring previous values...', done, total)
+
+    start = time.time()
+    restored = restore_run(run['table_name'], run_id, chunk_size=chunk_size, on_progress=report)
+    mark_run_status(run_id, 'rolled_back')
+
+    tracker.update({'status': 'completed', 'current_step': 'Run rolled back', 'percentage': 100})
+    return {
+        "success": True,
+        "run_id": run_id,
+        "table_name": run['table_name'],
+        "records_restored": restored,
+        "duration_seconds": round(time.time() - start, 2),
+        "message": "Run rolled back"
+    }
+
+
+@dedup_runs_bp.route("/runs/<run_id>/rollback", methods=["POST"])
+def rollback_run_route(run_id):
+    """
+    Undo one run's write-back (and nothing else) from its undo log
+    Rows that were re-activated since the run are left untouched
+    """
+    run = get_run(run_id)
+    if run is None:
+        return jsonify({"success": False, "error": "Run not found"}), 404
+    if run['status'] == 'rolled_back':
+        return jsonify({"success": False, "error": "Run is already rolled back"}), 409
+
+    params = {"run_id": run_id, "chunk_size": (request.get_json(silent=True) or {}).get("chunk_size", 5000)}
+    return submit_job_response('rollback', run['table_name'], rollback_run, params, new_job_progress())
@@ -0,0 +1,195 @@
+"""
+Bulk write-back of dedup decisions through a staging table
+- (id, duplicate_of) pairs are bulk-loaded with executemany into a per-connection
+  TEMPORARY table, then applied with one UPDATE ... JOIN per chunk
+- Replaces UPDATE statements carrying up to 1000 "WHEN id = x THEN y" clauses and
+  string-interpolated IN lists, which MySQL has to re-parse for every batch
+- commit=True commits every chunk (long write-backs make steady progress);
+  commit=False leaves the transaction open for callers that checkpoint in it
+- With a run_id, the previous status/similar_too/check_status of every touched row
+  goes to dedup_undo_log first (same transaction), so one run can be rolled back
+- Written tables are marked on the session: their cached responses (response_cache)
+  are invalidated when the transaction commits
+"""
+
+import threading
+
+from sqlalchemy import text
+
+from config import db, Config
+from response_cache import touch_table
+
+DB_NAME = Config.DB_NAME
+STAGING_TABLE = "dedup_writeback_staging"
+UNDO_TABLE = f"{DB_NAME}.dedup_undo_log"
+DEFAULT_CHUNK_SIZE = 5000
+
+_undo_ready = False
+_undo_lock = threading.Lock()
+
+
+def ensure_undo_table():
+    """
+    Create the undo log on first use (ensure_run_tables does it when a run starts)
+    The DDL runs on its own pooled connection: CREATE TABLE commits implicitly, and
+    must never commit the open transaction of a write_back_staged(commit=False) caller
+    """
+    global _undo_ready
+    if _undo_ready:
+        return
+
+    with _undo_lock:
+        if _undo_ready:
+            return
+        with db.engine.begin() as conn:
+            conn.execute(text(f"""
+                CREATE TABLE IF NOT EXISTS {UNDO_TABLE} (
+                    run_id VARCHAR(32) NOT NULL,
+                    record_id BIGINT NOT NULL,
+                    prev_status VARCHAR(64),
+                    prev_similar_too VARCHAR(64),
+                    prev_check_status VARCHAR(64),
+                    logged_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                    PRIMARY KEY (run_id, record_id)
+                )
+            """))
+        _undo_ready = True
+
+
+def ensure_staging_table():
+    """
+    Create (or empty) this connection's staging table
+    TEMPORARY DDL and DELETE don't commit implicitly, so this is safe mid-transaction
+    """
+    db.session.execute(text(f"""
+        CREATE TEMPORARY TABLE IF NOT EXISTS {STAGING_TABLE} (
+            id BIGINT NOT NULL PRIMARY KEY,
+            duplicate_of BIGINT NOT NULL
+        )
+    """))
+    db.session.execute(text(f"DELETE FROM {STAGING_TABLE}"))
+
+
+def join_update_sql(table_name, pk_column):
+    """Single-pass UPDATE of the target rows joined to the staged pairs"""
+    return f"""
+        UPDATE {DB_NAME}.{table_name} t
+        JOIN {STAGING_TABLE} s ON t.{pk_column} = s.id
+        SET t.status = 'INACTIVE',
+            t.similar_too = s.duplicate_of,
+            t.check_status = 'DUPLICATE_DETECTED'
+    """
+
+
+def undo_insert_sql(table_name, pk_column):
+    """Log the current values of the staged rows (rows already logged for the run are kept)"""
+    return f"""
+        INSERT INTO {UNDO_TABLE} (run_id, record_id, prev_status, prev_similar_too, prev_check_status)
+        SELECT :run_id, t.{pk_column}, t.status, t.similar_too, t.check_status
+        FROM {DB_NAME}.{table_name} t
+        JOIN {STAGING_TABLE} s ON t.{pk_column} = s.id
+        WHERE NOT EXISTS (
+            SELECT 1 FROM {UNDO_TABLE} u WHERE u.run_id = :run_id AND u.record_id = t.{pk_column}
+        )
+    """
+
+
+def restore_update_sql(table_name, pk_column):
+    """Restore one chunk (record_id range) of a run's undo log; rows re-activated since are skipped"""
+    return f"""
+        UPDATE {DB_NAME}.{table_name} t
+        JOIN {UNDO_TABLE} u ON u.record_id = t.{pk_column}
+        SET t.status = u.prev_status,
+            t.similar_too = u.prev_similar_too,
+            t.check_status = u.prev_check_status
+        WHERE u.run_id = :run_id
+          AND u.record_id > :after_id AND u.record_id <= :upto_id
+          AND t.status = 'INACTIVE'
+    """
+
+
+def write_back_staged(table_name, records_to_deactivate, pk_column="id",
+                      chunk_size=DEFAULT_CHUNK_SIZE, commit=True, on_progress=None, run_id=None):
+    """
+    Mark duplicate records as INACTIVE (similar_too = their primary)
+
+    Args:
+        records_to_deactivate: Dicts with "id" and "duplicate_of"
+        chunk_size: Pairs staged and applied per UPDATE
+        commit: Commit after every chunk (False: caller owns the transaction)
+        on_progress: fn(rows_written, total_rows) called after every chunk
+        run_id: Record the rows' previous values in the run's undo log
+
+    Returns: Number of rows updated
+    """
+    if not records_to_deactivate:
+        return 0
+
+    pairs = [{"id": rec["id"], "duplicate_of": rec["duplicate_of"]} for rec in records_to_deactivate]
+    total = len(pairs)
+    update_sql = text(join_update_sql(table_name, pk_column))
+    insert_sql = text(f"INSERT INTO {STAGING_TABLE} (id, duplicate_of) VALUES (:id, :duplicate_of)")
+    undo_sql = text(undo_insert_sql(table_name, pk_column))
+    if run_id:
+        ensure_undo_table()
+
+    updated = 0
+    for start in range(0, total, chunk_size):
+        chunk = pairs[start:start + chunk_size]
+
+        # Per chunk: a commit hands the connection back to the pool
+        ensure_staging_table()
+        db.session.execute(insert_sql, chunk)
+        if run_id:
+            db.session.execute(undo_sql, {"run_id": run_id})
+        result = db.session.execute(update_sql)
+        updated += result.rowcount
+        touch_table(db.session, table_name)
+
+        if commit:
+            db.session.commit()
+        if on_progress:
+            on_progress(min(start + chunk_size, total), total)
+
+    return updated
+
+
+def restore_run(table_name, run_id, pk_column="id", chunk_size=DEFAULT_CHUNK_SIZE, on_progress=None):
+    """
+    Restore every row a run changed from its undo log
+    Chunks walk the (run_id, record_id) primary key and commit one by one
+
+    Returns: Number of rows restored
+    """
+    ensure_undo_table()
+    total = db.session.execute(
+        text(f"SELECT COUNT(*) FROM {UNDO_TABLE} WHERE run_id = :run_id"), {"run_id": run_id}
+    ).scalar() or 0
+
+    next_ids_sql = text(f"""
+        SELECT record_id FROM {UNDO_TABLE}
+        WHERE run_id = :run_id AND record_id > :after_id
+        ORDER BY record_id
+        LIMIT {int(chunk_size)}
+    """)
+    restore_sql = text(restore_update_sql(table_name, pk_column))
+
+    restored = 0
+    done = 0
+    after_id = -1
+    while True:
+        ids = [row[0] for row in db.session.execute(next_ids_sql, {"run_id": run_id, "after_id": after_id})]
+        if not ids:
+            break
+
+        result = db.session.execute(restore_sql, {"run_id": run_id, "after_id": after_id, "upto_id": ids[-1]})
+        touch_table(db.session, table_name)
+        db.session.commit()
+
+        restored += result.rowcount
+        done += len(ids)
+        after_id = ids[-1]
+        if on_progress:
+            on_progress(done, total)
+
+    return restored
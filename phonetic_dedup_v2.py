@@ -6,24 +6,47 @@ Enhanced Voter Deduplication System v2.0
 - Robust Hindi phonetic matching
 """
 
-from flask import Blueprint, request, jsonify, Response
+from flask import Blueprint, request, jsonify, Response, current_app
 from sqlalchemy import text
 import re
 import time
 import json
-from collections import defaultdict
-from fuzzywuzzy import fuzz
+from collections import defaultdict, deque
 from metaphone import doublemetaphone
 from indic_transliteration import sanscript
 from indic_transliteration.sanscript import transliterate
 
 # Assuming these are imported from your main app
 from config import db, Config
+from dedup_pipeline import DedupPipeline, DedupCancelled, check_cancelled
+from dedup_jobs import job_manager, submit_job_response
+from dedup_writeback import write_back_staged
+from response_cache import touch_table
+from dedup_runs import create_run, finish_run
+from dedup_external_sort import SpillRuns
+from dedup_parallel import precompute_matches
+from scoring_engine import V2_KERNEL, PairScoreCache, with_masks
+from dedup_blocking import BlockStats, summarize_blocks
 DB_NAME = Config.DB_NAME  # Use the database name from config
 
 phonetic_v2_bp = Blueprint('phonetic_v2', __name__)
 
-# Global progress tracker
+def new_progress_tracker():
+    """Fresh progress record (one per background job, plus the module-global one)"""
+    return {
+        'status': 'idle',
+        'current_step': '',
+        'records_processed': 0,
+        'total_records': 0,
+        'duplicates_found': 0,
+        'start_time': 0,
+        'estimated_seconds_remaining': 0,
+        'percentage': 0,
+        'stages': {}
+    }
+
+
+# Global progress tracker (synchronous previews)
 progress_tracker = {
     'status': 'idle',
     'current_step': '',
@@ -32,10 +55,15 @@ progress_tracker = {
     'duplicates_found': 0,
     'start_time': 0,
     'estimated_seconds_remaining': 0,
-    'percentage': 0
+    'percentage': 0,
+    'stages': {}
 }
 
 
+# Integer gender codes: computed once per record, compared as ints in the scan
+GENDER_CODES = {'UNKNOWN': 0, 'MALE': 1, 'FEMALE': 2, 'OTHER': 3}
+
+
 def normalize_gender(gender_value):
     """
     Normalize messy gender data to standard format
@@ -45,6 +73,10 @@ def normalize_gender(gender_value):
     if not gender_value or gender_value == 'NULL':
         return 'UNKNOWN'
     
+    # Already normalized ('unknown' would otherwise hit the 'w' female pattern)
+    if gender_value in GENDER_CODES:
+        return gender_value
+    
     gender_str = str(gender_value).strip().lower()
     
     # Female patterns
@@ -74,13 +106,12 @@ def genders_compatible(gender1, gender2):
     - UNKNOWN matches anything
     - OTHER matches OTHER or UNKNOWN
     """
-    g1 = normalize_gender(gender1)
-    g2 = normalize_gender(gender2)
-    
-    if g1 == 'UNKNOWN' or g2 == 'UNKNOWN':
-        return True
-    
-    return g1 == g2
+    return codes_compatible(GENDER_CODES[normalize_gender(gender1)], GENDER_CODES[normalize_gender(gender2)])
+
+
+def codes_compatible(code1, code2):
+    """genders_compatible on integer codes (UNKNOWN is 0)"""
+    return code1 == code2 or not code1 or not code2
 
 
 def aggressive_normalize_for_sorting(name):
@@ -180,121 +211,59 @@ def get_enhanced_phonetic_signature(text_val):
     return lat, skel, meta_primary or "", normalized
 
 
-def calculate_enhanced_similarity(sig1, sig2):
+def calculate_enhanced_similarity(sig1, sig2, score_cutoff=0, score_cache=None):
     """
     Calculate similarity between two phonetic signatures
     
     Args:
         sig1, sig2: Tuples of (latin, skeleton, metaphone, normalized)
+        score_cutoff: Pairs that cannot reach it return 0 early (scoring_engine cascade)
+        score_cache: PairScoreCache of the run (interned signatures are scored once)
     
     Returns: Score (0-100)
     """
-    lat1, skel1, meta1, norm1 = sig1
-    lat2, skel2, meta2, norm2 = sig2
-    
-    # Handle empty strings
-    if not lat1 and not lat2:
-        return 100
-    if not lat1 or not lat2:
-        return 0
-    
-    # 1. Exact normalized match (highest weight)
-    if norm1 and norm2 and norm1 == norm2:
-        return 100
-    
-    # 2. Phonetic match (metaphone)
-    phonetic_score = 100 if (meta1 == meta2 and meta1 != "") else 0
-    
-    # 3. Skeleton match (consonants only)
-    skel_score = 0
-    if skel1 and skel2:
-        if skel1 == skel2:
-            skel_score = 100
-        elif skel1 in skel2 or skel2 in skel1:
-            skel_score = 80
-        else:
-            # Character overlap
-            common = len(set(skel1) & set(skel2))
-            total = max(len(skel1), len(skel2))
-            if total > 0:
-                overlap_ratio = common / total
-                if overlap_ratio > 0.7:
-                    skel_score = 60
-    
-    # 4. Fuzzy string matching
-    fuzzy_score = fuzz.token_sort_ratio(lat1, lat2)
-    partial_score = fuzz.partial_ratio(lat1, lat2)
-    
-    # 5. Token overlap
-    tokens1 = set(lat1.split())
-    tokens2 = set(lat2.split())
-    if tokens1 or tokens2:
-        token_overlap = len(tokens1 & tokens2) / max(len(tokens1), len(tokens2)) * 100
-    else:
-        token_overlap = 0
-    
-    # Weighted combination
-    final_score = (
-        (phonetic_score * 0.25) +
-        (skel_score * 0.25) +
-        (fuzzy_score * 0.20) +
-        (partial_score * 0.15) +
-        (token_overlap * 0.15)
-    )
-    
-    return round(final_score, 2)
+    if score_cache is not None:
+        return score_cache.score(sig1, sig2, score_cutoff)
+    return V2_KERNEL.score(sig1, sig2, score_cutoff)
 
 
-def update_progress(status, step, processed, total, duplicates):
-    """Update global progress tracker"""
-    global progress_tracker
+def update_progress(status, step, processed, total, duplicates, stages=None, tracker=None):
+    """
+    Update a progress tracker (stages: per-stage pipeline counters)
+    tracker defaults to the module-global one; background jobs pass their own record
+    """
+    if tracker is None:
+        tracker = progress_tracker
     
-    progress_tracker['status'] = status
-    progress_tracker['current_step'] = step
-    progress_tracker['records_processed'] = processed
-    progress_tracker['total_records'] = total
-    progress_tracker['duplicates_found'] = duplicates
+    tracker['status'] = status
+    tracker['current_step'] = step
+    tracker['records_processed'] = processed
+    tracker['total_records'] = total
+    tracker['duplicates_found'] = duplicates
+    if stages is not None:
+        tracker['stages'] = stages
     
     if total > 0:
-        progress_tracker['percentage'] = round((processed / total) * 100, 2)
+        tracker['percentage'] = round((processed / total) * 100, 2)
     
     # Estimate time remaining
-    if processed > 0 and progress_tracker['start_time'] > 0:
-        elapsed = time.time() - progress_tracker['start_time']
+    if processed > 0 and tracker['start_time'] > 0:
+        elapsed = time.time() - tracker['start_time']
         rate = processed / elapsed
         remaining = total - processed
         if rate > 0:
-            progress_tracker['estimated_seconds_remaining'] = int(remaining / rate)
+            tracker['estimated_seconds_remaining'] = int(remaining / rate)
 
 
-def find_duplicates_sorted_adaptive(records, voter_threshold=85, father_threshold=80, 
-                                    use_gender=True, max_window=200):
-    """
-    Find duplicates using Sorted + Adaptive Window algorithm
-    
-    Args:
-        records: List of voter records
-        voter_threshold: Minimum voter name match score (0-100)
-        father_threshold: Minimum father name match score (0-100)
-        use_gender: Whether to validate gender compatibility
-        max_window: Maximum lookahead window size
-    
-    Returns: List of duplicate groups
-    """
-    global progress_tracker
-    
-    total = len(records)
-    
-    # Phase 1: Preprocess - Generate phonetic signatures
-    update_progress('processing', 'Generating phonetic signatures...', 0, total, 0)
-    
-    for i, record in enumerate(records):
+def prepare_records(records):
+    """Generate phonetic signatures, sort keys and gender for records (in place)"""
+    for record in records:
         voter_name = (record.get('voter_name') or "").strip()
         father_name = (record.get('father_husband_mother_name') or "").strip()
         
         # Generate signatures
-        v_sig = get_enhanced_phonetic_signature(voter_name)
-        f_sig = get_enhanced_phonetic_signature(father_name)
+        v_sig = with_masks(get_enhanced_phonetic_signature(voter_name))
+        f_sig = with_masks(get_enhanced_phonetic_signature(father_name))
         
         record['_v_sig'] = v_sig
         record['_f_sig'] = f_sig
@@ -302,29 +271,70 @@ def find_duplicates_sorted_adaptive(records, voter_threshold=85, father_threshol
         
         # Normalize gender
         record['_gender'] = normalize_gender(record.get('gender'))
-        
-        if i % 1000 == 0:
-            update_progress('processing', 'Generating phonetic signatures...', i, total, 0)
+        record['_gender_code'] = GENDER_CODES[record['_gender']]
     
-    # Phase 2: Sort by normalized voter name
-    update_progress('processing', 'Sorting records...', total, total, 0)
-    records_sorted = sorted(records, key=lambda x: x.get('_sort_key', ''))
+    return records
+
+
+def names_diverge(norm_a, norm_b):
+    """Early termination test of the window: first 3 chars of the normalized names differ"""
+    if norm_a and norm_b and len(norm_a) >= 3 and len(norm_b) >= 3:
+        return norm_a[:3] != norm_b[:3]
+    return False
+
+
+def match_pair(anchor, candidate, voter_threshold, father_threshold, use_gender, score_cache=None):
+    """
+    Full phonetic comparison of two prepared records (score_cache: PairScoreCache of the run)
     
-    # Phase 3: Adaptive window comparison
-    update_progress('processing', 'Finding duplicates (adaptive window)...', 0, total, 0)
+    Returns: (voter_score, father_score, combined_score) or None if they don't match
+    """
+    # Hard filter first: an incompatible gender is never scored
+    if use_gender and not codes_compatible(anchor.get('_gender_code', 0), candidate.get('_gender_code', 0)):
+        return None
+    
+    voter_score = calculate_enhanced_similarity(anchor['_v_sig'], candidate['_v_sig'], voter_threshold, score_cache)
+    if voter_score < voter_threshold:
+        return None
     
-    duplicate_groups = []
+    father_score = calculate_enhanced_similarity(anchor['_f_sig'], candidate['_f_sig'], father_threshold, score_cache)
+    if father_score < father_threshold:
+        return None
+    
+    return voter_score, father_score, round((voter_score + father_score) / 2, 2)
+
+
+def add_to_group(group, candidate, scores):
+    candidate['voter_score'], candidate['father_score'], candidate['combined_score'] = scores
+    group.append(candidate)
+
+
+def scan_sorted_window(records_sorted, voter_threshold=85, father_threshold=80,
+                       use_gender=True, max_window=200, on_progress=None, precomputed=None,
+                       block_stats=None, score_cache=None):
+    """
+    Adaptive window scan over records sorted by '_sort_key'
+    
+    Yields duplicate groups as soon as each anchor's window is finished.
+    on_progress(processed, duplicates_found) is called every 100 anchors.
+    precomputed: PrecomputedMatches of the same list (pairs it covers are not re-scored)
+    block_stats: BlockStats collecting records / comparisons / time per sort-key block
+    score_cache: PairScoreCache of the run (records interned with it)
+    """
     processed_ids = set()
     duplicates_found = 0
     
     for i in range(len(records_sorted)):
         rec_id = records_sorted[i].get('id')
+        if block_stats is not None:
+            block_stats.add_record(records_sorted[i].get('_sort_key', ''))
         
         if rec_id in processed_ids:
             continue
         
         current_group = [records_sorted[i]]
         processed_ids.add(rec_id)
+        anchor_start = time.perf_counter()
         
         # Adaptive window
         j = i + 1
@@ -335,82 +345,433 @@ def find_duplicates_sorted_adaptive(records, voter_threshold=85, father_threshol
                 j += 1
                 continue
             
-            # Quick pre-filter: check if normalized names are too different
-            norm_i = records_sorted[i].get('_sort_key', '')
-            norm_j = records_sorted[j].get('_sort_key', '')
+            # Names too different, stop looking
+            if names_diverge(records_sorted[i].get('_sort_key', ''), records_sorted[j].get('_sort_key', '')):
+                break
+            
+            if precomputed and precomputed.covers(i, j):
+                scores = precomputed.get(i, j)
+            else:
+                scores = match_pair(records_sorted[i], records_sorted[j],
+                                    voter_threshold, father_threshold, use_gender, score_cache)
+            if scores:
+                add_to_group(current_group, records_sorted[j], scores)
+                processed_ids.add(records_sorted[j].get('id'))
+                duplicates_found += 1
             
-            # Early termination if names diverge (first 3 chars different)
-            if norm_i and norm_j and len(norm_i) >= 3 and len(norm_j) >= 3:
-                if norm_i[:3] != norm_j[:3]:
-                    # Names too different, stop looking
+            j += 1
+            checked += 1
+        
+        if block_stats is not None:
+            block_stats.add_work(records_sorted[i].get('_sort_key', ''), checked,
+                                 time.perf_counter() - anchor_start)
+        
+        if len(current_group) > 1:
+            yield current_group
+        
+        # Update progress every 100 records
+        if on_progress and i % 100 == 0:
+            on_progress(i, duplicates_found)
+
+
+def scan_sorted_stream(records, voter_threshold=85, father_threshold=80,
+                       use_gender=True, max_window=200, on_progress=None, block_stats=None,
+                       score_cache=None):
+    """
+    scan_sorted_window over a sorted stream (e.g. SpillRuns.merge())
+    
+    Yields the same groups, but only the anchor's look-ahead is held in a deque;
+    matched records are flagged instead of kept in an id set, so memory stays
+    bounded by the window whatever the stream length.
+    """
+    stream = iter(records)
+    window = deque()
+    duplicates_found = 0
+    i = -1
+    
+    while True:
+        if not window:
+            record = next(stream, None)
+            if record is None:
+                break
+            window.append(record)
+        
+        anchor = window.popleft()
+        i += 1
+        if block_stats is not None:
+            block_stats.add_record(anchor.get('_sort_key', ''))
+        if anchor.get('_matched'):
+            continue
+        
+        current_group = [anchor]
+        anchor_start = time.perf_counter()
+        pos = 0
+        checked = 0
+        
+        while checked < max_window:
+            if pos == len(window):
+                record = next(stream, None)
+                if record is None:
                     break
+                window.append(record)
             
-            # Full phonetic comparison - Voter name
-            voter_score = calculate_enhanced_similarity(
-                records_sorted[i]['_v_sig'],
-                records_sorted[j]['_v_sig']
-            )
+            candidate = window[pos]
+            if candidate.get('_matched'):
+                pos += 1
+                continue
             
-            if voter_score >= voter_threshold:
-                # Father name comparison
-                father_score = calculate_enhanced_similarity(
-                    records_sorted[i]['_f_sig'],
-                    records_sorted[j]['_f_sig']
-                )
-                
-                if father_score >= father_threshold:
-                    # Gender validation
-                    gender_match = True
-                    if use_gender:
-                        gender_match = genders_compatible(
-                            records_sorted[i].get('_gender'),
-                            records_sorted[j].get('_gender')
-                        )
-                    
-                    if gender_match:
-                        # Calculate combined score
-                        combined_score = round((voter_score + father_score) / 2, 2)
-                        
-                        records_sorted[j]['voter_score'] = voter_score
-                        records_sorted[j]['father_score'] = father_score
-                        records_sorted[j]['combined_score'] = combined_score
-                        
-                        current_group.append(records_sorted[j])
-                        processed_ids.add(records_sorted[j].get('id'))
-                        duplicates_found += 1
+            if names_diverge(anchor.get('_sort_key', ''), candidate.get('_sort_key', '')):
+                break
             
-            j += 1
+            scores = match_pair(anchor, candidate, voter_threshold, father_threshold, use_gender, score_cache)
+            if scores:
+                add_to_group(current_group, candidate, scores)
+                candidate['_matched'] = True
+                duplicates_found += 1
+            
+            pos += 1
             checked += 1
         
+        if block_stats is not None:
+            block_stats.add_work(anchor.get('_sort_key', ''), checked, time.perf_counter() - anchor_start)
+        
         if len(current_group) > 1:
-            duplicate_groups.append(current_group)
+            yield current_group
         
-        # Update progress every 100 records
-        if i % 100 == 0:
-            update_progress('processing', 'Finding duplicates (adaptive window)...', 
-                          i, total, duplicates_found)
+        if on_progress and i % 100 == 0:
+            on_progress(i, duplicates_found)
+
+
+def find_duplicates_sorted_adaptive(records, voter_threshold=85, father_threshold=80, 
+                                    use_gender=True, max_window=200):
+    """
+    Find duplicates using Sorted + Adaptive Window algorithm
+    
+    Args:
+        records: List of voter records
+        voter_threshold: Minimum voter name match score (0-100)
+        father_threshold: Minimum father name match score (0-100)
+        use_gender: Whether to validate gender compatibility
+        max_window: Maximum lookahead window size
+    
+    Returns: List of duplicate groups
+    """
+    total = len(records)
+    
+    # Phase 1: Preprocess - Generate phonetic signatures
+    update_progress('processing', 'Generating phonetic signatures...', 0, total, 0)
     
+    score_cache = PairScoreCache(V2_KERNEL)
+    for start in range(0, total, 1000):
+        score_cache.intern_records(prepare_records(records[start:start + 1000]))
+        update_progress('processing', 'Generating phonetic signatures...', start, total, 0)
+    
+    # Phase 2: Sort by normalized voter name
+    update_progress('processing', 'Sorting records...', total, total, 0)
+    records_sorted = sorted(records, key=lambda x: x.get('_sort_key', ''))
+    
+    # Phase 3: Adaptive window comparison
+    update_progress('processing', 'Finding duplicates (adaptive window)...', 0, total, 0)
+    
+    def report(processed, duplicates_found):
+        update_progress('processing', 'Finding duplicates (adaptive window)...', 
+                      processed, total, duplicates_found)
+    
+    duplicate_groups = list(scan_sorted_window(
+        records_sorted, voter_threshold, father_threshold, use_gender, max_window, report,
+        score_cache=score_cache
+    ))
+    
+    duplicates_found = sum(len(group) - 1 for group in duplicate_groups)
     update_progress('completed', 'Duplicate detection completed', total, total, duplicates_found)
     
     return duplicate_groups
 
 
+def build_deactivation_list(duplicate_groups):
+    """Flatten duplicate groups into deactivation records (primary = first in group)"""
+    records_to_deactivate = []
+    
+    for group in duplicate_groups:
+        if len(group) > 1:
+            primary_record = group[0]
+            duplicates = group[1:]
+            
+            for dup in duplicates:
+                records_to_deactivate.append({
+                    "id": dup["id"],
+                    "voter_name": dup.get("voter_name") or "(empty)",
+                    "father_name": dup.get("father_husband_mother_name") or "(empty)",
+                    "gender": dup.get("_gender", "UNKNOWN"),
+                    "duplicate_of": primary_record["id"],
+                    "voter_score": dup.get("voter_score", 0),
+                    "father_score": dup.get("father_score", 0),
+                    "combined_score": dup.get("combined_score", 0)
+                })
+    
+    return records_to_deactivate
+
+
+def run_deduplication_v2(table_name, voter_threshold=85, father_threshold=80, use_gender=True,
+                         dry_run=True, batch_size=50000, workers=2, queue_size=4,
+                         write_batch_size=5000, spill_to_disk=False, spill_dir=None,
+                         scan_workers=0, tracker=None, cancel_event=None):
+    """
+    Whole-table deduplication recorded as a dedup run (write-backs go to its undo log)
+    
+    Returns: Result payload (same shape as the /deduplicate-voters-v2 response) plus run_id
+    """
+    run_id = create_run('v2', table_name, {
+        "table_name": table_name,
+        "voter_threshold": voter_threshold,
+        "father_threshold": father_threshold,
+        "use_gender": use_gender,
+        "dry_run": dry_run,
+        "batch_size": batch_size,
+        "workers": workers,
+        "queue_size": queue_size,
+        "spill_to_disk": spill_to_disk,
+        "scan_workers": scan_workers
+    }, dry_run)
+    
+    try:
+        result = deduplicate_table_v2(
+            run_id, table_name, voter_threshold, father_threshold, use_gender, dry_run,
+            batch_size, workers, queue_size, write_batch_size, spill_to_disk, spill_dir,
+            scan_workers, tracker, cancel_event
+        )
+    except DedupCancelled as e:
+        finish_run(run_id, 'cancelled', error=str(e))
+        raise
+    except Exception as e:
+        finish_run(run_id, 'failed', error=str(e))
+        raise
+    
+    finish_run(run_id, 'completed', {key: value for key, value in result.items() if key != 'details'})
+    return {**result, "run_id": run_id}
+
+
+def deduplicate_table_v2(run_id, table_name, voter_threshold=85, father_threshold=80, use_gender=True,
+                         dry_run=True, batch_size=50000, workers=2, queue_size=4,
+                         write_batch_size=5000, spill_to_disk=False, spill_dir=None,
+                         scan_workers=0, tracker=None, cancel_event=None):
+    """
+    Whole-table deduplication as two overlapped pipelines:
+    1. streaming fetch -> signature workers -> collector (overlaps MySQL streaming with CPU)
+    2. window scan -> batched writer (overlaps comparison with write-back)
+    The global sort between them is the only full barrier.
+    
+    spill_to_disk: the collector spills every chunk as a sorted run to temporary files
+                   and the window scan runs over their k-way merge, so peak memory no
+                   longer grows with the table (same groups as the in-memory sort)
+    spill_dir: parent directory for the spill files (default: system temp dir)
+    scan_workers: > 1 scores the sorted windows in that many processes first and replays
+                  the greedy scan over the scores (same groups; in-memory mode only)
+    tracker: progress record to update (defaults to the module-global one)
+    cancel_event: threading.Event checked between chunks/anchors; raises DedupCancelled
+    
+    Returns: Result payload (same shape as the /deduplicate-voters-v2 response)
+    """
+    pk_column = "id"
+    tracker = progress_tracker if tracker is None else tracker
+    
+    # Get total count
+    count_sql = f"""
+        SELECT COUNT(*) as total
+        FROM {DB_NAME}.{table_name}
+        WHERE status IS NULL OR status != 'INACTIVE'
+    """
+    result = db.session.execute(text(count_sql))
+    total_records = result.fetchone()[0]
+    
+    update_progress('processing', f'Starting deduplication of {total_records} records...', 
+                   0, total_records, 0, tracker=tracker)
+    
+    app = current_app._get_current_object()
+    chunks = {}
+    state = {'fetched': 0}
+    spill = SpillRuns(spill_dir) if spill_to_disk else None
+    if spill:
+        # Bounded like the spilled chunks, not by the table (see dedup_external_sort)
+        score_cache = PairScoreCache(V2_KERNEL, max_size=batch_size, max_signatures=2 * batch_size)
+    else:
+        score_cache = PairScoreCache(V2_KERNEL)  # Repeated name pairs are scored once per run
+    
+    def fetch_chunks():
+        sql = f"""
+            SELECT {pk_column} as id, voter_name, father_husband_mother_name, gender, status
+            FROM {DB_NAME}.{table_name}
+            WHERE status IS NULL OR status != 'INACTIVE'
+            ORDER BY {pk_column} ASC
+        """
+        result = db.session.execute(text(sql).execution_options(stream_results=True))
+        for seq, partition in enumerate(result.partitions(batch_size)):
+            yield {'seq': seq, 'records': [dict(row._mapping) for row in partition]}
+    
+    def generate_signatures(item):
+        score_cache.intern_records(prepare_records(item['records']))
+        return item
+    
+    def collect(item):
+        if spill:
+            spill.add_run(item['records'])
+        else:
+            chunks[item['seq']] = item['records']
+        state['fetched'] += len(item['records'])
+        update_progress('processing', 'Generating phonetic signatures...', 
+                      state['fetched'], total_records, 0, stages=fetch_pipeline.snapshot(),
+                      tracker=tracker)
+    
+    try:
+        fetch_pipeline = DedupPipeline(
+            source=fetch_chunks(),
+            stages=[('signatures', generate_signatures, workers)],
+            sink=collect,
+            sink_name='collect',
+            queue_size=queue_size,
+            size_of=lambda item: len(item['records']),
+            cancel_event=cancel_event,
+            app=app
+        )
+        fetch_stages = fetch_pipeline.run()
+        
+        total = state['fetched']
+        if not total:
+            update_progress('completed', 'Deduplication completed', 0, 0, 0, stages=fetch_stages,
+                           tracker=tracker)
+            return {
+                "success": True,
+                "message": "No active records found",
+                "total_processed": 0,
+                "duplicates_found": 0
+            }
+        
+        # Only counts and the preview are kept, so memory doesn't grow with the duplicates either
+        found = {'groups': 0, 'records': 0}
+        details = []
+        pending_writes = []
+        block_stats = BlockStats()
+        
+        def report(processed, duplicates_found):
+            check_cancelled(cancel_event)
+            update_progress('processing', 'Finding duplicates (adaptive window)...', 
+                          processed, total, duplicates_found,
+                          stages={**fetch_stages, **write_pipeline.snapshot()}, tracker=tracker)
+        
+        def write_group(group):
+            deactivations = build_deactivation_list([group])
+            found['groups'] += 1
+            found['records'] += len(deactivations)
+            details.extend(deactivations[:100 - len(details)])
+            if not dry_run:
+                pending_writes.extend(deactivations)
+                if len(pending_writes) >= write_batch_size:
+                    deactivate_records_batch(table_name, pk_column, pending_writes, run_id=run_id)
+                    pending_writes.clear()
+        
+        if spill:
+            # Runs are sorted by (sort_key, id): their merge is the stable sort of the id-ordered rows
+            update_progress('processing', 'Merging sorted runs...', total, total, 0, stages=fetch_stages,
+                           tracker=tracker)
+            compare_source = scan_sorted_stream(spill.merge(), voter_threshold, father_threshold,
+                                                use_gender, on_progress=report, block_stats=block_stats,
+                                                score_cache=score_cache)
+        else:
+            # Re-assemble in id order so the stable sort matches the sequential engine
+            rows = []
+            for seq in sorted(chunks):
+                rows.extend(chunks.pop(seq))
+            
+            update_progress('processing', 'Sorting records...', total, total, 0, stages=fetch_stages,
+                           tracker=tracker)
+            records_sorted = sorted(rows, key=lambda x: x.get('_sort_key', ''))
+            
+            precomputed = None
+            if scan_workers and scan_workers > 1:
+                def report_chunks(done, chunks_total):
+                    update_progress('processing', f'Scoring windows in parallel ({done}/{chunks_total} chunks)...',
+                                   done, chunks_total, 0, stages=fetch_stages, tracker=tracker)
+                
+                precomputed = precompute_matches(records_sorted, match_pair, names_diverge, voter_threshold,
+                                                 father_threshold, use_gender, workers=scan_workers,
+                                                 cancel_event=cancel_event, on_progress=report_chunks)
+            compare_source = scan_sorted_window(records_sorted, voter_threshold, father_threshold,
+                                                use_gender, on_progress=report, precomputed=precomputed,
+                                                block_stats=block_stats, score_cache=score_cache)
+        check_cancelled(cancel_event)
+        
+        write_pipeline = DedupPipeline(
+            source=compare_source,
+            stages=[],
+            sink=write_group,
+            source_name='compare',
+            queue_size=queue_size * 256,
+            size_of=len,
+            cancel_event=cancel_event,
+            app=app
+        )
+        write_pipeline.run()
+        spill_stats = spill.stats() if spill else None
+    finally:
+        if spill:
+            spill.close()
+    
+    # Flush the last partial write batch
+    if not dry_run and pending_writes:
+        update_progress('processing', 'Marking duplicates as INACTIVE...', 
+                      total, total, found['records'], tracker=tracker)
+        deactivate_records_batch(table_name, pk_column, pending_writes, run_id=run_id)
+        pending_writes.clear()
+    
+    stages = {**fetch_stages, **write_pipeline.snapshot()}
+    update_progress('completed', 'Deduplication completed', 
+                   total_records, total_records, found['records'], stages=stages,
+                   tracker=tracker)
+    
+    result = {
+        "success": True,
+        "dry_run": dry_run,
+        "voter_threshold": voter_threshold,
+        "father_threshold": father_threshold,
+        "use_gender_validation": use_gender,
+        "total_records_processed": total,
+        "duplicate_groups_found": found['groups'],
+        "records_to_deactivate": found['records'],
+        "pipeline": stages,
+        "blocks": summarize_blocks({table_name: block_stats}),
+        "score_cache": score_cache.stats(),
+        "details": details,  # First 100 for preview
+        "message": "Dry run completed" if dry_run else "Duplicates marked as INACTIVE"
+    }
+    if spill_stats:
+        result["spill"] = spill_stats
+    return result
+
+
+def current_progress():
+    """Progress of the latest running v2 job, else the preview tracker"""
+    job = job_manager.latest('v2')
+    return job.progress if job else progress_tracker
+
+
 @phonetic_v2_bp.route("/progress", methods=["GET"])
 def get_progress():
     """Get current progress status"""
-    return jsonify(progress_tracker)
+    return jsonify(current_progress())
 
 
 @phonetic_v2_bp.route("/progress-stream", methods=["GET"])
 def progress_stream():
     """Server-Sent Events stream for real-time progress"""
+    tracker = current_progress()
+    
     def generate():
         while True:
-            data = json.dumps(progress_tracker)
+            data = json.dumps(tracker)
             yield f"data: {data}\n\n"
             time.sleep(0.5)  # Update every 500ms
             
-            if progress_tracker['status'] in ['completed', 'error', 'idle']:
+            if tracker['status'] in ['completed', 'error', 'cancelled', 'idle']:
                 break
     
     return Response(generate(), mimetype='text/event-stream')
@@ -509,144 +870,31 @@ def preview_duplicates_v2():
 def deduplicate_voters_v2():
     """
     Full deduplication with progress tracking
+    Runs as a background job: returns 202 with a job id, poll /api/pysearch/jobs/<job_id>
     """
     table_name = request.json.get("table_name", "gram_panchayat_voters")
-    voter_threshold = request.json.get("voter_threshold", 85)
-    father_threshold = request.json.get("father_threshold", 80)
-    use_gender = request.json.get("use_gender", True)
-    dry_run = request.json.get("dry_run", True)
-    batch_size = request.json.get("batch_size", 50000)  # Process in batches
-    
-    global progress_tracker
-    progress_tracker['start_time'] = time.time()
-    progress_tracker['status'] = 'processing'
-    
-    try:
-        pk_column = "id"
-        
-        # Get total count
-        count_sql = f"""
-            SELECT COUNT(*) as total
-            FROM {DB_NAME}.{table_name}
-            WHERE status IS NULL OR status != 'INACTIVE'
-        """
-        result = db.session.execute(text(count_sql))
-        total_records = result.fetchone()[0]
-        
-        update_progress('processing', f'Starting deduplication of {total_records} records...', 
-                       0, total_records, 0)
-        
-        # Fetch all active records (consider pagination for very large datasets)
-        sql = f"""
-            SELECT {pk_column} as id, voter_name, father_husband_mother_name, gender, status
-            FROM {DB_NAME}.{table_name}
-            WHERE status IS NULL OR status != 'INACTIVE'
-            ORDER BY {pk_column} ASC
-        """
-        
-        result = db.session.execute(text(sql))
-        rows = [dict(row._mapping) for row in result]
-        
-        if not rows:
-            return jsonify({
-                "success": True,
-                "message": "No active records found",
-                "total_processed": 0,
-                "duplicates_found": 0
-            })
-        
-        # Find duplicates using enhanced algorithm
-        duplicate_groups = find_duplicates_sorted_adaptive(
-            rows, voter_threshold, father_threshold, use_gender
-        )
-        
-        # Prepare deactivation list
-        records_to_deactivate = []
-        
-        for group in duplicate_groups:
-            if len(group) > 1:
-                primary_record = group[0]
-                duplicates = group[1:]
-                
-                for dup in duplicates:
-                    records_to_deactivate.append({
-                        "id": dup["id"],
-                        "voter_name": dup.get("voter_name") or "(empty)",
-                        "father_name": dup.get("father_husband_mother_name") or "(empty)",
-                        "gender": dup.get("_gender", "UNKNOWN"),
-                        "duplicate_of": primary_record["id"],
-                        "voter_score": dup.get("voter_score", 0),
-                        "father_score": dup.get("father_score", 0),
-                        "combined_score": dup.get("combined_score", 0)
-                    })
-        
-        # Execute updates (if not dry run)
-        if not dry_run and records_to_deactivate:
-            update_progress('processing', 'Marking duplicates as INACTIVE...', 
-                          total_records, total_records, len(records_to_deactivate))
-            
-            deactivate_records_batch(table_name, pk_column, records_to_deactivate)
-        
-        update_progress('completed', 'Deduplication completed', 
-                       total_records, total_records, len(records_to_deactivate))
-        
-        return jsonify({
-            "success": True,
-            "dry_run": dry_run,
-            "voter_threshold": voter_threshold,
-            "father_threshold": father_threshold,
-            "use_gender_validation": use_gender,
-            "total_records_processed": len(rows),
-            "duplicate_groups_found": len(duplicate_groups),
-            "records_to_deactivate": len(records_to_deactivate),
-            "details": records_to_deactivate[:100],  # First 100 for preview
-            "message": "Dry run completed" if dry_run else "Duplicates marked as INACTIVE"
-        })
+    params = {
+        "table_name": table_name,
+        "voter_threshold": request.json.get("voter_threshold", 85),
+        "father_threshold": request.json.get("father_threshold", 80),
+        "use_gender": request.json.get("use_gender", True),
+        "dry_run": request.json.get("dry_run", True),
+        "batch_size": request.json.get("batch_size", 50000),  # Rows per streamed fetch chunk
+        "workers": request.json.get("workers", 2),  # Signature worker threads
+        "queue_size": request.json.get("queue_size", 4),  # Chunks buffered between stages
+        "spill_to_disk": request.json.get("spill_to_disk", False),  # Sort through temp files (huge tables)
+        "scan_workers": request.json.get("scan_workers", 0)  # Processes scoring the sorted windows
+    }
     
-    except Exception as e:
-        import traceback
-        progress_tracker['status'] = 'error'
-        return jsonify({
-            "error": str(e),
-            "traceback": traceback.format_exc(),
-            "success": False
-        }), 500
+    return submit_job_response('v2', table_name, run_deduplication_v2, params, new_progress_tracker())
 
 
-def deactivate_records_batch(table_name, pk_column, records_to_deactivate):
+def deactivate_records_batch(table_name, pk_column, records_to_deactivate, run_id=None):
     """
-    Mark duplicate records as INACTIVE in batches
+    Mark duplicate records as INACTIVE (staged bulk write-back, committed per chunk)
+    run_id: log previous values to the run's undo log
     """
-    if not records_to_deactivate:
-        return
-    
-    ids_to_deactivate = [rec["id"] for rec in records_to_deactivate]
-    similar_mapping = {rec["id"]: rec["duplicate_of"] for rec in records_to_deactivate}
-    
-    batch_size = 1000
-    for i in range(0, len(ids_to_deactivate), batch_size):
-        batch = ids_to_deactivate[i:i + batch_size]
-        
-        # Build CASE statement for similar_too
-        case_statements = []
-        for rec_id in batch:
-            primary_id = similar_mapping[rec_id]
-            case_statements.append(f"WHEN {pk_column} = {rec_id} THEN {primary_id}")
-        
-        case_sql = " ".join(case_statements)
-        placeholders = ','.join([str(id) for id in batch])
-        
-        sql = f"""
-            UPDATE {DB_NAME}.{table_name}
-            SET status = 'INACTIVE',
-                similar_too = CASE {case_sql} END,
-                check_status = 'DUPLICATE_DETECTED'
-            WHERE {pk_column} IN ({placeholders})
-        """
-        
-        db.session.execute(text(sql))
-    
-    db.session.commit()
+    return write_back_staged(table_name, records_to_deactivate, pk_column, run_id=run_id)
 
 
 @phonetic_v2_bp.route("/statistics-v2", methods=["GET"])
@@ -715,6 +963,7 @@ def reset_to_active_v2():
         """
         
         db.session.execute(text(reset_sql))
+        touch_table(db.session, table_name)
         db.session.commit()
         
         return jsonify({
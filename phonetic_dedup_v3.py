@@ -7,24 +7,53 @@ Enhanced Voter Deduplication System v3.0
 - Robust Hindi phonetic matching
 """
 
-from flask import Blueprint, request, jsonify, Response
+from flask import Blueprint, request, jsonify, Response, current_app
 from sqlalchemy import text
 import re
 import time
 import json
 from collections import defaultdict
-from fuzzywuzzy import fuzz
 from metaphone import doublemetaphone
 from indic_transliteration import sanscript
 from indic_transliteration.sanscript import transliterate
 
 # Import from config to avoid circular imports
 from config import db, Config
+from dedup_pipeline import DedupPipeline, DedupCancelled, check_cancelled
+from dedup_jobs import job_manager, submit_job_response
+from dedup_runs import (
+    create_run, get_run, mark_run_status, finish_run, completed_gps, checkpoint_gp, load_decisions, gp_checksums,
+    RESUMABLE_STATUSES,
+)
+from dedup_writeback import write_back_staged
+from response_cache import touch_table
+from scoring_engine import V3_KERNEL, PairScoreCache, SignatureColumns, with_masks
+from dedup_blocking import (
+    BlockStats, summarize_blocks, partition_blocks, sub_blocks, DEFAULT_MAX_BLOCK_SIZE
+)
 DB_NAME = Config.DB_NAME  # Use the database name from config
 
 phonetic_v3_bp = Blueprint('phonetic_v3', __name__)
 
-# Global progress tracker
+def new_progress_tracker():
+    """Fresh progress record (one per background job, plus the module-global one)"""
+    return {
+        'status': 'idle',
+        'current_step': '',
+        'records_processed': 0,
+        'total_records': 0,
+        'duplicates_found': 0,
+        'gps_processed': 0,
+        'total_gps': 0,
+        'current_gp': '',
+        'start_time': 0,
+        'estimated_seconds_remaining': 0,
+        'percentage': 0,
+        'stages': {}
+    }
+
+
+# Global progress tracker (synchronous previews)
 progress_tracker = {
     'status': 'idle',
     'current_step': '',
@@ -36,10 +65,19 @@ progress_tracker = {
     'current_gp': '',
     'start_time': 0,
     'estimated_seconds_remaining': 0,
-    'percentage': 0
+    'percentage': 0,
+    'stages': {}
 }
 
 
+# Integer gender codes: computed once per record, compared as ints in the scan
+GENDER_UNKNOWN = 0
+GENDER_MALE = 1
+GENDER_FEMALE = 2
+GENDER_OTHER = 3
+GENDER_CODES = {'UNKNOWN': GENDER_UNKNOWN, 'MALE': GENDER_MALE, 'FEMALE': GENDER_FEMALE, 'OTHER': GENDER_OTHER}
+
+
 def normalize_gender(gender_value):
     """
     Normalize messy gender data to standard format
@@ -49,6 +87,10 @@ def normalize_gender(gender_value):
     if not gender_value or gender_value == 'NULL':
         return 'UNKNOWN'
     
+    # Already normalized ('unknown' would otherwise hit the 'w' female pattern)
+    if gender_value in GENDER_CODES:
+        return gender_value
+    
     gender_str = str(gender_value).strip().lower()
     
     # Female patterns
@@ -78,13 +120,28 @@ def genders_compatible(gender1, gender2):
     - UNKNOWN matches anything
     - OTHER matches OTHER or UNKNOWN
     """
-    g1 = normalize_gender(gender1)
-    g2 = normalize_gender(gender2)
-    
-    if g1 == 'UNKNOWN' or g2 == 'UNKNOWN':
-        return True
-    
-    return g1 == g2
+    return codes_compatible(gender_code(gender1), gender_code(gender2))
+
+
+def gender_code(gender_value):
+    """Integer code of a raw or normalized gender value"""
+    return GENDER_CODES[normalize_gender(gender_value)]
+
+
+def codes_compatible(code1, code2):
+    """genders_compatible on integer codes (UNKNOWN is 0)"""
+    return code1 == code2 or not code1 or not code2
+
+
+def parse_age(age_value):
+    """Age in years, or None when missing / not a number (Devanagari digits accepted)"""
+    age = str(age_value if age_value is not None else '').strip()
+    return int(age) if age.isdecimal() else None
+
+
+def ages_compatible(age1, age2, age_tolerance):
+    """Ages within age_tolerance years; a missing age matches anything"""
+    return age1 is None or age2 is None or abs(age1 - age2) <= age_tolerance
 
 
 def aggressive_normalize_for_sorting(name):
@@ -190,136 +247,109 @@ def get_enhanced_phonetic_signature(text_val):
     return lat, skel, meta_primary or "", normalized
 
 
-def calculate_enhanced_similarity(sig1, sig2):
+def calculate_enhanced_similarity(sig1, sig2, score_cutoff=0, score_cache=None):
     """
     Calculate similarity between two phonetic signatures
 
     Args:
         sig1, sig2: Tuples of (latin, skeleton, metaphone, normalized)
+        score_cutoff: Pairs that cannot reach it return 0 early (scoring_engine cascade)
+        score_cache: PairScoreCache of the run (interned signatures are scored once)
 
     Returns: Score (0-100)
     """
-    lat1, skel1, meta1, norm1 = sig1
-    lat2, skel2, meta2, norm2 = sig2
-
-    # Handle empty strings
-    if not lat1 and not lat2:
-        return 100
-    if not lat1 or not lat2:
-        return 0
-
-    # 1. Exact normalized match
-    if norm1 and norm2 and norm1 == norm2:
-        return 100
-
-    # 2. Phonetic match
-    phonetic_score = 100 if (meta1 == meta2 and meta1 != "") else 0
-
-    # 3. Skeleton match
-    skel_score = 0
-    if skel1 and skel2:
-        if skel1 == skel2:
-            skel_score = 100
-        elif skel1 in skel2 or skel2 in skel1:
-            # TIGHTENED: Only give partial credit if length difference is small
-            len_diff = abs(len(skel1) - len(skel2))
-            if len_diff <= 2:  # Maximum 2 character difference
-                skel_score = 70  # Reduced from 80
-            else:
-                skel_score = 0  # Too different, don't match
-        else:
-            common = len(set(skel1) & set(skel2))
-            total = max(len(skel1), len(skel2))
-            if total > 0:
-                overlap_ratio = common / total
-                if overlap_ratio > 0.8:  # Increased from 0.7
-                    skel_score = 50  # Reduced from 60
-
-    # 4. Fuzzy string matching
-    fuzzy_score = fuzz.token_sort_ratio(lat1, lat2)
-    partial_score = fuzz.partial_ratio(lat1, lat2)
-
-    # 5. Token overlap
-    tokens1 = set(lat1.split())
-    tokens2 = set(lat2.split())
-    if tokens1 or tokens2:
-        token_overlap = len(tokens1 & tokens2) / max(len(tokens1), len(tokens2)) * 100
-    else:
-        token_overlap = 0
-
-    # Weighted combination
-    final_score = (
-        (phonetic_score * 0.25) +
-        (skel_score * 0.25) +
-        (fuzzy_score * 0.20) +
-        (partial_score * 0.15) +
-        (token_overlap * 0.15)
-    )
-
-    return round(final_score, 2)
-
+    if score_cache is not None:
+        return score_cache.score(sig1, sig2, score_cutoff)
+    return V3_KERNEL.score(sig1, sig2, score_cutoff)
 
-def update_progress(status, step, processed, total, duplicates, gps_processed=0, total_gps=0, current_gp=''):
-    """Update global progress tracker"""
-    global progress_tracker
 
-    progress_tracker['status'] = status
-    progress_tracker['current_step'] = step
-    progress_tracker['records_processed'] = processed
-    progress_tracker['total_records'] = total
-    progress_tracker['duplicates_found'] = duplicates
-    progress_tracker['gps_processed'] = gps_processed
-    progress_tracker['total_gps'] = total_gps
-    progress_tracker['current_gp'] = current_gp
+def update_progress(status, step, processed, total, duplicates, gps_processed=0, total_gps=0, current_gp='',
+                    stages=None, tracker=None):
+    """
+    Update a progress tracker (stages: per-stage pipeline counters)
+    tracker defaults to the module-global one; background jobs pass their own record
+    """
+    if tracker is None:
+        tracker = progress_tracker
+
+    tracker['status'] = status
+    tracker['current_step'] = step
+    tracker['records_processed'] = processed
+    tracker['total_records'] = total
+    tracker['duplicates_found'] = duplicates
+    tracker['gps_processed'] = gps_processed
+    tracker['total_gps'] = total_gps
+    tracker['current_gp'] = current_gp
+    if stages is not None:
+        tracker['stages'] = stages
 
     if total > 0:
-        progress_tracker['percentage'] = round((processed / total) * 100, 2)
+        tracker['percentage'] = round((processed / total) * 100, 2)
 
     # Estimate time remaining
-    if processed > 0 and progress_tracker['start_time'] > 0:
-        elapsed = time.time() - progress_tracker['start_time']
+    if processed > 0 and tracker['start_time'] > 0:
+        elapsed = time.time() - tracker['start_time']
         rate = processed / elapsed
         remaining = total - processed
         if rate > 0:
-            progress_tracker['estimated_seconds_remaining'] = int(remaining / rate)
+            tracker['estimated_seconds_remaining'] = int(remaining / rate)
 
 
-def find_duplicates_in_gp(records, voter_threshold=85, father_threshold=80,
-                          use_gender=True, max_window=200):
-    """
-    Find duplicates within a single Gram Panchayat using Sorted + Adaptive Window
-
-    Args:
-        records: List of voter records from same GP
-        voter_threshold: Minimum voter name match score
-        father_threshold: Minimum father name match score
-        use_gender: Whether to validate gender compatibility
-        max_window: Maximum lookahead window size
-
-    Returns: List of duplicate groups
-    """
-    if not records or len(records) < 2:
-        return []
-
-    # Preprocess - Generate phonetic signatures
+def prepare_gp_records(records):
+    """Generate phonetic signatures, sort keys and gender for a GP's records (in place)"""
     for record in records:
         voter_name = (record.get('voter_name') or "").strip()
         father_name = (record.get('father_husband_mother_name') or "").strip()
 
-        v_sig = get_enhanced_phonetic_signature(voter_name)
-        f_sig = get_enhanced_phonetic_signature(father_name)
+        v_sig = with_masks(get_enhanced_phonetic_signature(voter_name))
+        f_sig = with_masks(get_enhanced_phonetic_signature(father_name))
 
         record['_v_sig'] = v_sig
         record['_f_sig'] = f_sig
         record['_sort_key'] = v_sig[3]  # normalized version
         record['_gender'] = normalize_gender(record.get('gender'))
+        record['_gender_code'] = GENDER_CODES[record['_gender']]
+        record['_age'] = parse_age(record.get('age'))
 
-    # Sort by normalized voter name
-    records_sorted = sorted(records, key=lambda x: x.get('_sort_key', ''))
+    return records
 
-    # Adaptive window comparison
+
+def scan_gp_window(records_sorted, voter_threshold, father_threshold, use_gender, max_window,
+                   processed_ids, block_stats=None, age_tolerance=None, score_cache=None,
+                   batch_workers=None):
+    """
+    Adaptive window scan over records sorted by '_sort_key'
+    processed_ids: records that can no longer join a group (grouped or already anchors)
+    age_tolerance: max age difference in years of a pair (None: ages not checked)
+    score_cache: PairScoreCache of the run
+    batch_workers: score each anchor's window of voter names as one batch
+                   (scoring_engine score_window; cdist threads with the rapidfuzz ratio
+                   backend, -1: all cores); None: pair by pair. Both give the same groups.
+
+    Gender and age are hard filters checked before any name is scored.
+
+    Returns: List of duplicate groups
+    """
     duplicate_groups = []
-    processed_ids = set()
+    columns = None
+    if batch_workers is not None:
+        columns = SignatureColumns([record['_v_sig'] for record in records_sorted])
+
+    def add_if_father_matches(group, candidate, voter_score):
+        father_score = calculate_enhanced_similarity(
+            group[0]['_f_sig'],
+            candidate['_f_sig'],
+            father_threshold,
+            score_cache
+        )
+
+        if father_score >= father_threshold:
+            candidate['voter_score'] = voter_score
+            candidate['father_score'] = father_score
+            candidate['combined_score'] = round((voter_score + father_score) / 2, 2)
+
+            group.append(candidate)
+            processed_ids.add(candidate.get('id'))
 
     for i in range(len(records_sorted)):
         rec_id = records_sorted[i].get('id')
@@ -329,6 +359,10 @@ def find_duplicates_in_gp(records, voter_threshold=85, father_threshold=80,
 
         current_group = [records_sorted[i]]
         processed_ids.add(rec_id)
+        anchor_start = time.perf_counter()
+        anchor_gender = records_sorted[i].get('_gender_code', GENDER_UNKNOWN)
+        anchor_age = records_sorted[i].get('_age')
+        window = []  # Batch mode: candidates left after the filters
 
         # Adaptive window
         j = i + 1
@@ -348,47 +382,401 @@ def find_duplicates_in_gp(records, voter_threshold=85, father_threshold=80,
                 if norm_i[:3] != norm_j[:3]:
                     break
 
-            # Full phonetic comparison - Voter name
-            voter_score = calculate_enhanced_similarity(
-                records_sorted[i]['_v_sig'],
-                records_sorted[j]['_v_sig']
-            )
+            # Hard filters: incompatible gender / age never reach the scorer
+            if use_gender and not codes_compatible(anchor_gender,
+                                                   records_sorted[j].get('_gender_code', GENDER_UNKNOWN)):
+                j += 1
+                checked += 1
+                continue
+            if age_tolerance is not None and not ages_compatible(anchor_age, records_sorted[j].get('_age'),
+                                                                 age_tolerance):
+                j += 1
+                checked += 1
+                continue
 
-            if voter_score >= voter_threshold:
-                # Father name comparison
-                father_score = calculate_enhanced_similarity(
-                    records_sorted[i]['_f_sig'],
-                    records_sorted[j]['_f_sig']
+            if columns is not None:
+                window.append(j)
+            else:
+                # Full phonetic comparison - Voter name
+                voter_score = calculate_enhanced_similarity(
+                    records_sorted[i]['_v_sig'],
+                    records_sorted[j]['_v_sig'],
+                    voter_threshold,
+                    score_cache
                 )
 
-                if father_score >= father_threshold:
-                    # Gender validation
-                    gender_match = True
-                    if use_gender:
-                        gender_match = genders_compatible(
-                            records_sorted[i].get('_gender'),
-                            records_sorted[j].get('_gender')
-                        )
-
-                    if gender_match:
-                        combined_score = round((voter_score + father_score) / 2, 2)
-
-                        records_sorted[j]['voter_score'] = voter_score
-                        records_sorted[j]['father_score'] = father_score
-                        records_sorted[j]['combined_score'] = combined_score
-
-                        current_group.append(records_sorted[j])
-                        processed_ids.add(records_sorted[j].get('id'))
+                if voter_score >= voter_threshold:
+                    add_if_father_matches(current_group, records_sorted[j], voter_score)
 
             j += 1
             checked += 1
 
+        if window:
+            # A match only adds the candidate itself to processed_ids, so the window
+            # collected up front is exactly what the pair-by-pair scan would compare
+            voter_scores = V3_KERNEL.score_window(columns, i, window, voter_threshold, batch_workers)
+            for k, voter_score in zip(window, voter_scores):
+                if voter_score >= voter_threshold:
+                    add_if_father_matches(current_group, records_sorted[k], voter_score)
+
+        if block_stats is not None:
+            block_stats.add_work(records_sorted[i].get('_sort_key', ''), checked,
+                                 time.perf_counter() - anchor_start)
+
         if len(current_group) > 1:
             duplicate_groups.append(current_group)
 
     return duplicate_groups
 
 
+def gender_partitions(records_sorted):
+    """
+    Split sorted records into gender-compatible partitions (sort order kept):
+    one per known gender present, UNKNOWN records joining every partition
+
+    Returns: list of partitions (the records unchanged if at most one gender is known)
+    """
+    by_code = {}
+    unknown = []
+    for record in records_sorted:
+        code = record.get('_gender_code', GENDER_UNKNOWN)
+        if code == GENDER_UNKNOWN:
+            unknown.append(record)
+        else:
+            by_code.setdefault(code, []).append(record)
+
+    if len(by_code) < 2:
+        return [records_sorted]
+
+    position = {id(record): n for n, record in enumerate(records_sorted)}
+    return [sorted(members + unknown, key=lambda record: position[id(record)])
+            for _, members in sorted(by_code.items())]
+
+
+def compare_gp_records(records, voter_threshold=85, father_threshold=80,
+                       use_gender=True, max_window=200, block_stats=None, max_block_size=None,
+                       age_tolerance=None, score_cache=None, batch_workers=None):
+    """
+    Sorted + Adaptive Window comparison over records already passed through prepare_gp_records
+
+    use_gender: the GP is first partitioned by gender (UNKNOWN joins every partition),
+                so the window of a record only spans records it may match
+    block_stats: BlockStats collecting records / comparisons / time per sort-key block
+    max_block_size: blocks with more records are sub-blocked by secondary keys and every
+                    part is compared all-pairs instead of within max_window (None: off)
+    age_tolerance: max age difference in years of a duplicate pair (None: ages not checked)
+    score_cache: PairScoreCache shared by the GPs of a run (records interned with it)
+    batch_workers: score windows as batches (score_window workers; None: pair by pair)
+
+    Returns: List of duplicate groups
+    """
+    # Sort by normalized voter name
+    records_sorted = sorted(records, key=lambda x: x.get('_sort_key', ''))
+    if block_stats is not None:
+        for record in records_sorted:
+            block_stats.add_record(record.get('_sort_key', ''))
+
+    # Scan units: (records, window) - a record may sit in several units (UNKNOWN gender,
+    # sub-block wildcards), so only grouped records are excluded from the later units
+    units = []
+    for partition in (gender_partitions(records_sorted) if use_gender else [records_sorted]):
+        if max_block_size:
+            regular, oversized = partition_blocks(partition, max_block_size)
+        else:
+            regular, oversized = partition, []
+        units.append((regular, max_window))
+
+        for block in oversized:
+            parts = sub_blocks(block, max_block_size)
+            if block_stats is not None:
+                block_stats.add_split(block[0].get('_sort_key', ''), len(parts))
+            for part in parts:
+                # A part that still doesn't fit keeps the bounded window
+                units.append((part, len(part) if len(part) <= max_block_size else max_window))
+
+    grouped_ids = set()
+    duplicate_groups = []
+    for unit, window in units:
+        groups = scan_gp_window(unit, voter_threshold, father_threshold, use_gender, window,
+                                set(grouped_ids), block_stats, age_tolerance, score_cache, batch_workers)
+        for group in groups:
+            grouped_ids.update(record.get('id') for record in group)
+        duplicate_groups.extend(groups)
+
+    if len(units) > 1:
+        # Same group order as a plain scan: by position of the primary in the sorted GP
+        position = {id(record): n for n, record in enumerate(records_sorted)}
+        duplicate_groups.sort(key=lambda group: position[id(group[0])])
+    return duplicate_groups
+
+
+def find_duplicates_in_gp(records, voter_threshold=85, father_threshold=80,
+                          use_gender=True, max_window=200, max_block_size=DEFAULT_MAX_BLOCK_SIZE,
+                          age_tolerance=None, score_cache=None, batch_workers=None):
+    """
+    Find duplicates within a single Gram Panchayat using Sorted + Adaptive Window
+
+    Args:
+        records: List of voter records from same GP
+        voter_threshold: Minimum voter name match score
+        father_threshold: Minimum father name match score
+        use_gender: Whether to validate gender compatibility
+        max_window: Maximum lookahead window size
+        max_block_size: Larger sort-key blocks are sub-blocked and compared all-pairs
+        age_tolerance: Max age difference in years (records need an 'age'; None: off)
+        score_cache: PairScoreCache shared across the GPs of one run (None: no cache)
+        batch_workers: Score windows as batches (score_window workers, -1: all cores; None: off)
+
+    Returns: List of duplicate groups
+    """
+    if not records or len(records) < 2:
+        return []
+
+    prepare_gp_records(records)
+    if score_cache is not None:
+        score_cache.intern_records(records)
+    return compare_gp_records(records, voter_threshold, father_threshold, use_gender, max_window,
+                              max_block_size=max_block_size, age_tolerance=age_tolerance,
+                              score_cache=score_cache, batch_workers=batch_workers)
+
+
+def build_deactivation_list(duplicate_groups, gp_name):
+    """Flatten duplicate groups of one GP into deactivation records (primary = first in group)"""
+    records_to_deactivate = []
+
+    for group in duplicate_groups:
+        if len(group) > 1:
+            primary_record = group[0]
+            duplicates = group[1:]
+
+            for dup in duplicates:
+                records_to_deactivate.append({
+                    "id": dup["id"],
+                    "voter_name": dup.get("voter_name") or "(empty)",
+                    "father_name": dup.get("father_husband_mother_name") or "(empty)",
+                    "gender": dup.get("_gender", "UNKNOWN"),
+                    "gram_panchayat": gp_name,
+                    "duplicate_of": primary_record["id"],
+                    "voter_score": dup.get("voter_score", 0),
+                    "father_score": dup.get("father_score", 0),
+                    "combined_score": dup.get("combined_score", 0)
+                })
+
+    return records_to_deactivate
+
+
+def fetch_gp_records(table_name, gp_column, pk_column, gp_name, age_column=None):
+    """Fetch the active voters of one Gram Panchayat (age_column is read as 'age')"""
+    age_select = f", {age_column} as age" if age_column else ""
+    sql = f"""
+        SELECT {pk_column} as id, voter_name, father_husband_mother_name, 
+               gender, status{age_select}
+        FROM {DB_NAME}.{table_name}
+        WHERE (status IS NULL OR status != 'INACTIVE')
+          AND {gp_column} = :gp_name
+        ORDER BY {pk_column} ASC
+    """
+
+    result = db.session.execute(text(sql), {"gp_name": gp_name})
+    return [dict(row._mapping) for row in result]
+
+
+def run_deduplication_v3(table_name, gp_column="gram_panchayat", voter_threshold=85,
+                         father_threshold=80, use_gender=True, dry_run=True,
+                         workers=2, queue_size=4, max_block_size=DEFAULT_MAX_BLOCK_SIZE,
+                         age_column=None, age_tolerance=None, batch_workers=None,
+                         tracker=None, cancel_event=None, resume_run_id=None):
+    """
+    Full GP-by-GP deduplication as an overlapped pipeline:
+    fetch thread -> signature workers -> comparison workers -> checkpointing writer
+
+    Every finished GP is checkpointed to the run tables in the same transaction as
+    its write-back, so an interrupted run can be resumed with resume_run_id and
+    only the GPs without a checkpoint are processed again.
+
+    tracker: progress record to update (defaults to the module-global one)
+    cancel_event: threading.Event checked between GPs; raises DedupCancelled
+    resume_run_id: continue an earlier run (pass the parameters stored with it)
+    max_block_size: sort-key blocks larger than this are sub-blocked by secondary keys
+                    (father skeleton, gender, age band) and compared all-pairs
+    age_column / age_tolerance: pairs whose ages differ by more than age_tolerance
+                    years are never scored (records without an age match any age)
+    batch_workers: score every window as one batch (score_window; cdist threads with the
+                    rapidfuzz ratio backend, -1: all cores) instead of pair by pair; same groups
+
+    Returns: Result payload (same shape as the /deduplicate-voters-v3 response)
+    """
+    pk_column = "id"
+    tracker = progress_tracker if tracker is None else tracker
+
+    # Get total count and GP count
+    count_sql = f"""
+        SELECT 
+            COUNT(*) as total,
+            COUNT(DISTINCT {gp_column}) as gp_count
+        FROM {DB_NAME}.{table_name}
+        WHERE status IS NULL OR status != 'INACTIVE'
+    """
+    result = db.session.execute(text(count_sql))
+    counts = dict(result.fetchone()._mapping)
+    total_records = counts['total']
+    total_gps = counts['gp_count']
+
+    update_progress('processing', f'Starting deduplication of {total_records} records across {total_gps} GPs...',
+                   0, total_records, 0, 0, total_gps, '', tracker=tracker)
+
+    # Get list of distinct GPs
+    gp_sql = f"""
+        SELECT DISTINCT {gp_column} as gp_name
+        FROM {DB_NAME}.{table_name}
+        WHERE (status IS NULL OR status != 'INACTIVE')
+          AND {gp_column} IS NOT NULL
+        ORDER BY {gp_column}
+    """
+    result = db.session.execute(text(gp_sql))
+    gp_list = [row[0] for row in result]
+    check_cancelled(cancel_event)
+
+    # Run record: a new one, or the checkpoints of the run being resumed
+    if resume_run_id:
+        run = get_run(resume_run_id)
+        if run is None:
+            raise ValueError(f"Run {resume_run_id} not found")
+        if run['status'] not in RESUMABLE_STATUSES:
+            raise ValueError(f"Run {resume_run_id} is {run['status']}, only {', '.join(RESUMABLE_STATUSES)} runs can be resumed")
+        run_id = resume_run_id
+        mark_run_status(run_id, 'running')
+        done_gps = completed_gps(run_id)
+    else:
+        run_id = create_run('v3', table_name, {
+            "table_name": table_name,
+            "gp_column": gp_column,
+            "voter_threshold": voter_threshold,
+            "father_threshold": father_threshold,
+            "use_gender": use_gender,
+            "dry_run": dry_run,
+            "workers": workers,
+            "queue_size": queue_size,
+            "max_block_size": max_block_size,
+            "age_column": age_column,
+            "age_tolerance": age_tolerance,
+            "batch_workers": batch_workers
+        }, dry_run, gp_column)
+        done_gps = {}
+
+    gp_results = load_decisions(run_id, set(done_gps)) if done_gps else {}
+    pending_gps = [gp_name for gp_name in gp_list if gp_name not in done_gps]
+    total_gps = max(total_gps, len(set(gp_list) | set(done_gps)))
+
+    app = current_app._get_current_object()
+    block_stats = {}  # gp_name -> BlockStats (GPs processed by this invocation)
+    score_cache = PairScoreCache(V3_KERNEL)  # Repeated name pairs are scored once per run
+    state = {
+        'processed': sum(gp['records'] for gp in done_gps.values()),
+        'duplicates': sum(gp['duplicates'] for gp in done_gps.values()),
+        'gps_done': len(done_gps)
+    }
+
+    def fetch_gps():
+        for gp_name in pending_gps:
+            # Checksum before the read: a concurrent edit can only make commit refuse, never slip through
+            checksum = gp_checksums(table_name, gp_column, [gp_name]).get(gp_name) if dry_run else None
+            records = fetch_gp_records(table_name, gp_column, pk_column, gp_name, age_column)
+            yield {'gp_name': gp_name, 'records': records, 'checksum': checksum}
+
+    def generate_signatures(item):
+        if len(item['records']) >= 2:
+            prepare_gp_records(item['records'])
+            score_cache.intern_records(item['records'])
+        return item
+
+    def compare_windows(item):
+        item['groups'] = []
+        item['block_stats'] = BlockStats()
+        if len(item['records']) >= 2:
+            item['groups'] = compare_gp_records(
+                item['records'], voter_threshold, father_threshold, use_gender,
+                block_stats=item['block_stats'], max_block_size=max_block_size,
+                age_tolerance=age_tolerance if age_column else None, score_cache=score_cache,
+                batch_workers=batch_workers
+            )
+        return item
+
+    def write_results(item):
+        deactivations = build_deactivation_list(item['groups'], item['gp_name'])
+
+        # Write-back and checkpoint commit together: a GP is either fully done or redone
+        if not dry_run and deactivations:
+            deactivate_records_batch(table_name, pk_column, deactivations, commit=False, run_id=run_id)
+        checkpoint_gp(run_id, item['gp_name'], len(item['records']), deactivations, item['checksum'])
+        db.session.commit()
+
+        gp_results[item['gp_name']] = deactivations
+        block_stats[item['gp_name']] = item['block_stats']
+        state['processed'] += len(item['records'])
+        state['duplicates'] += len(deactivations)
+        state['gps_done'] += 1
+
+        update_progress('processing', f'Processing GP {state["gps_done"]}/{total_gps}: {item["gp_name"]}',
+                        state['processed'], total_records, state['duplicates'],
+                        state['gps_done'], total_gps, item['gp_name'], stages=pipeline.snapshot(),
+                        tracker=tracker)
+
+    pipeline = DedupPipeline(
+        source=fetch_gps(),
+        stages=[
+            ('signatures', generate_signatures, workers),
+            ('compare', compare_windows, workers),
+        ],
+        sink=write_results,
+        queue_size=queue_size,
+        size_of=lambda item: len(item['records']),
+        cancel_event=cancel_event,
+        app=app
+    )
+    try:
+        pipeline.run()
+    except DedupCancelled as e:
+        finish_run(run_id, 'cancelled', error=str(e))
+        raise
+    except Exception as e:
+        finish_run(run_id, 'failed', error=str(e))
+        raise
+
+    # Deterministic GP order regardless of worker scheduling (resumed GPs included)
+    gp_order = gp_list + sorted(gp_name for gp_name in gp_results if gp_name not in set(gp_list))
+    all_records_to_deactivate = []
+    for gp_name in gp_order:
+        all_records_to_deactivate.extend(gp_results.get(gp_name, []))
+
+    update_progress('completed', 'Deduplication completed',
+                   total_records, total_records, len(all_records_to_deactivate),
+                   total_gps, total_gps, '', stages=pipeline.snapshot(), tracker=tracker)
+
+    summary = {
+        "success": True,
+        "run_id": run_id,
+        "resumed": bool(resume_run_id),
+        "gps_resumed": len(done_gps),
+        "dry_run": dry_run,
+        "voter_threshold": voter_threshold,
+        "father_threshold": father_threshold,
+        "use_gender_validation": use_gender,
+        "age_tolerance": age_tolerance if age_column else None,
+        "total_records_processed": state['processed'],
+        "total_gps_processed": state['gps_done'],
+        "duplicate_groups_found": len([g for r in all_records_to_deactivate for g in [r] if r]),
+        "records_to_deactivate": len(all_records_to_deactivate),
+        "pipeline": pipeline.snapshot(),
+        "blocks": summarize_blocks(block_stats),
+        "score_cache": score_cache.stats(),
+        "message": "Dry run completed" if dry_run else "Duplicates marked as INACTIVE"
+    }
+    finish_run(run_id, 'completed', summary)
+
+    return {**summary, "details": all_records_to_deactivate[:100]}
+
+
 @phonetic_v3_bp.route("/get-gram-panchayats", methods=["GET"])
 def get_gram_panchayats():
     """
@@ -480,6 +868,7 @@ def preview_duplicates_v3():
         # Process each GP
         all_duplicate_groups = []
         total_processed = 0
+        score_cache = PairScoreCache(V3_KERNEL)
 
         update_progress('processing', 'Processing Gram Panchayats...', 0, len(rows), 0,
                        0, len(gp_groups), '')
@@ -491,7 +880,7 @@ def preview_duplicates_v3():
 
             # Find duplicates within this GP
             gp_duplicates = find_duplicates_in_gp(
-                gp_records, voter_threshold, father_threshold, use_gender
+                gp_records, voter_threshold, father_threshold, use_gender, score_cache=score_cache
             )
 
             # Add GP info to each group
@@ -559,172 +948,55 @@ def preview_duplicates_v3():
 def deduplicate_voters_v3():
     """
     Full deduplication with GP-based grouping
+    Runs as a background job: returns 202 with a job id, poll /api/pysearch/jobs/<job_id>
+    Pass resume_run_id to continue an interrupted run from its last checkpointed GP
     """
-    table_name = request.json.get("table_name", "gram_panchayat_voters")
-    gp_column = request.json.get("gp_column", "gram_panchayat")
-    voter_threshold = request.json.get("voter_threshold", 85)
-    father_threshold = request.json.get("father_threshold", 80)
-    use_gender = request.json.get("use_gender", True)
-    dry_run = request.json.get("dry_run", True)
-
-    global progress_tracker
-    progress_tracker['start_time'] = time.time()
-    progress_tracker['status'] = 'processing'
-
-    try:
-        pk_column = "id"
-
-        # Get total count and GP count
-        count_sql = f"""
-            SELECT 
-                COUNT(*) as total,
-                COUNT(DISTINCT {gp_column}) as gp_count
-            FROM {DB_NAME}.{table_name}
-            WHERE status IS NULL OR status != 'INACTIVE'
-        """
-        result = db.session.execute(text(count_sql))
-        counts = dict(result.fetchone()._mapping)
-        total_records = counts['total']
-        total_gps = counts['gp_count']
-
-        update_progress('processing', f'Starting deduplication of {total_records} records across {total_gps} GPs...',
-                       0, total_records, 0, 0, total_gps, '')
-
-        # Get list of distinct GPs
-        gp_sql = f"""
-            SELECT DISTINCT {gp_column} as gp_name
-            FROM {DB_NAME}.{table_name}
-            WHERE (status IS NULL OR status != 'INACTIVE')
-              AND {gp_column} IS NOT NULL
-            ORDER BY {gp_column}
-        """
-        result = db.session.execute(text(gp_sql))
-        gp_list = [row[0] for row in result]
-
-        # Process each GP
-        all_records_to_deactivate = []
-        total_processed = 0
-
-        for gp_idx, gp_name in enumerate(gp_list, 1):
-            update_progress('processing', f'Processing GP {gp_idx}/{total_gps}: {gp_name}',
-                          total_processed, total_records, len(all_records_to_deactivate),
-                          gp_idx, total_gps, gp_name)
-
-            # Fetch voters in this GP
-            sql = f"""
-                SELECT {pk_column} as id, voter_name, father_husband_mother_name, 
-                       gender, status
-                FROM {DB_NAME}.{table_name}
-                WHERE (status IS NULL OR status != 'INACTIVE')
-                  AND {gp_column} = :gp_name
-                ORDER BY {pk_column} ASC
-            """
-
-            result = db.session.execute(text(sql), {"gp_name": gp_name})
-            gp_records = [dict(row._mapping) for row in result]
-
-            if not gp_records:
-                continue
-
-            # Find duplicates in this GP
-            duplicate_groups = find_duplicates_in_gp(
-                gp_records, voter_threshold, father_threshold, use_gender
-            )
-
-            # Prepare deactivation list
-            for group in duplicate_groups:
-                if len(group) > 1:
-                    primary_record = group[0]
-                    duplicates = group[1:]
-
-                    for dup in duplicates:
-                        all_records_to_deactivate.append({
-                            "id": dup["id"],
-                            "voter_name": dup.get("voter_name") or "(empty)",
-                            "father_name": dup.get("father_husband_mother_name") or "(empty)",
-                            "gender": dup.get("_gender", "UNKNOWN"),
-                            "gram_panchayat": gp_name,
-                            "duplicate_of": primary_record["id"],
-                            "voter_score": dup.get("voter_score", 0),
-                            "father_score": dup.get("father_score", 0),
-                            "combined_score": dup.get("combined_score", 0)
-                        })
-
-            total_processed += len(gp_records)
-
-        # Execute updates (if not dry run)
-        if not dry_run and all_records_to_deactivate:
-            update_progress('processing', 'Marking duplicates as INACTIVE...',
-                          total_records, total_records, len(all_records_to_deactivate),
-                          total_gps, total_gps, '')
-
-            deactivate_records_batch(table_name, pk_column, all_records_to_deactivate)
-
-        update_progress('completed', 'Deduplication completed',
-                       total_records, total_records, len(all_records_to_deactivate),
-                       total_gps, total_gps, '')
-
-        return jsonify({
-            "success": True,
-            "dry_run": dry_run,
-            "voter_threshold": voter_threshold,
-            "father_threshold": father_threshold,
-            "use_gender_validation": use_gender,
-            "total_records_processed": total_processed,
-            "total_gps_processed": len(gp_list),
-            "duplicate_groups_found": len([g for r in all_records_to_deactivate for g in [r] if r]),
-            "records_to_deactivate": len(all_records_to_deactivate),
-            "details": all_records_to_deactivate[:100],
-            "message": "Dry run completed" if dry_run else "Duplicates marked as INACTIVE"
-        })
-
-    except Exception as e:
-        import traceback
-        progress_tracker['status'] = 'error'
-        return jsonify({
-            "error": str(e),
-            "traceback": traceback.format_exc(),
-            "success": False
-        }), 500
-
-
-def deactivate_records_batch(table_name, pk_column, records_to_deactivate):
-    """Mark duplicate records as INACTIVE in batches"""
-    if not records_to_deactivate:
-        return
-
-    ids_to_deactivate = [rec["id"] for rec in records_to_deactivate]
-    similar_mapping = {rec["id"]: rec["duplicate_of"] for rec in records_to_deactivate}
-
-    batch_size = 1000
-    for i in range(0, len(ids_to_deactivate), batch_size):
-        batch = ids_to_deactivate[i:i + batch_size]
-
-        case_statements = []
-        for rec_id in batch:
-            primary_id = similar_mapping[rec_id]
-            case_statements.append(f"WHEN {pk_column} = {rec_id} THEN {primary_id}")
+    resume_run_id = request.json.get("resume_run_id")
+    if resume_run_id:
+        # Resume with the parameters the run was started with
+        run = get_run(resume_run_id)
+        if run is None:
+            return jsonify({"success": False, "error": "Run not found"}), 404
+        if run['engine'] != 'v3' or run['status'] not in RESUMABLE_STATUSES:
+            return jsonify({
+                "success": False,
+                "error": f"Run {resume_run_id} cannot be resumed (engine {run['engine']}, status {run['status']})"
+            }), 409
+        params = {**run['params'], "resume_run_id": resume_run_id}
+        return submit_job_response('v3', run['table_name'], run_deduplication_v3, params, new_progress_tracker())
 
-        case_sql = " ".join(case_statements)
-        placeholders = ','.join([str(id) for id in batch])
+    table_name = request.json.get("table_name", "gram_panchayat_voters")
+    params = {
+        "table_name": table_name,
+        "gp_column": request.json.get("gp_column", "gram_panchayat"),
+        "voter_threshold": request.json.get("voter_threshold", 85),
+        "father_threshold": request.json.get("father_threshold", 80),
+        "use_gender": request.json.get("use_gender", True),
+        "dry_run": request.json.get("dry_run", True),
+        "workers": request.json.get("workers", 2),  # Threads per pipeline stage
+        "queue_size": request.json.get("queue_size", 4),  # GPs buffered between stages
+        "max_block_size": request.json.get("max_block_size", DEFAULT_MAX_BLOCK_SIZE),  # Sub-block larger blocks
+        "age_column": request.json.get("age_column"),  # e.g. "age": enables the age filter
+        "age_tolerance": request.json.get("age_tolerance", 5),  # Max age difference (years)
+        "batch_workers": request.json.get("batch_workers")  # e.g. -1: score windows as cdist batches
+    }
 
-        sql = f"""
-            UPDATE {DB_NAME}.{table_name}
-            SET status = 'INACTIVE',
-                similar_too = CASE {case_sql} END,
-                check_status = 'DUPLICATE_DETECTED'
-            WHERE {pk_column} IN ({placeholders})
-        """
+    return submit_job_response('v3', table_name, run_deduplication_v3, params, new_progress_tracker())
 
-        db.session.execute(text(sql))
 
-    db.session.commit()
+def deactivate_records_batch(table_name, pk_column, records_to_deactivate, commit=True, run_id=None):
+    """
+    Mark duplicate records as INACTIVE (commit=False leaves the transaction to the caller)
+    run_id: log previous values to the run's undo log
+    """
+    return write_back_staged(table_name, records_to_deactivate, pk_column, commit=commit, run_id=run_id)
 
 
 @phonetic_v3_bp.route("/progress-v3", methods=["GET"])
 def get_progress_v3():
-    """Get current progress status with GP info"""
-    return jsonify(progress_tracker)
+    """Get current progress status with GP info (latest running v3 job, else the preview tracker)"""
+    job = job_manager.latest('v3')
+    return jsonify(job.progress if job else progress_tracker)
 
 
 @phonetic_v3_bp.route("/statistics-v3", methods=["GET"])
@@ -811,6 +1083,7 @@ def reset_to_active_v3():
         """
 
         db.session.execute(text(reset_sql))
+        touch_table(db.session, table_name)
         db.session.commit()
 
         return jsonify({
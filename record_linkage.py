@@ -0,0 +1,461 @@
+"""
+Cross-table record linkage with MinHash/LSH candidate generation
+- Links the same person across voters_pdf_extract, gram_panchayat_voters,
+  nagar_nigam and voter_data (voter_data names its columns e_name / rel_name)
+- Every row gets a MinHash signature over character 3-gram shingles of its
+  transliterated voter + father name (get_universal_skeleton latin form)
+- Signatures are cut into LSH bands; rows of the two tables that share a band
+  bucket become candidate pairs, found per band by sorting the bucket keys of
+  one side and binary-searching the other (numpy, no pairwise loop)
+- Candidates are scored with calculate_name_similarity on voter and father name
+  and matching pairs are written to record_links, tagged with the run id
+"""
+
+import time
+import zlib
+
+import numpy as np
+from flask import Blueprint, request, jsonify
+from sqlalchemy import text, bindparam
+
+from config import db, Config
+from dedup_pipeline import DedupCancelled, check_cancelled
+from dedup_jobs import submit_job_response
+from dedup_runs import create_run, finish_run
+from phonetic_dedup_v3 import normalize_gender, genders_compatible, update_progress, new_progress_tracker
+from Controller.PhoneticPythonController import get_universal_skeleton, calculate_name_similarity
+
+DB_NAME = Config.DB_NAME
+LINKS_TABLE = f"{DB_NAME}.record_links"
+
+record_linkage_bp = Blueprint('record_linkage', __name__)
+
+# Per table: (voter name column, father/relative name column, gender column, has status column)
+TABLE_COLUMNS = {
+    "voters_pdf_extract": ("voter_name", "father_husband_mother_name", "gender", True),
+    "gram_panchayat_voters": ("voter_name", "father_husband_mother_name", "gender", True),
+    "nagar_nigam": ("voter_name", "father_husband_mother_name", "gender", True),
+    "voter_data": ("e_name", "rel_name", "sex", False),
+}
+
+SHINGLE_SIZE = 3
+MERSENNE_PRIME = (1 << 31) - 1
+SCORE_CHUNK = 5000  # Candidate pairs scored (and rows fetched) per step
+
+_links_ready = False
+
+
+def ensure_links_table():
+    """Create the link table on first use"""
+    global _links_ready
+    if _links_ready:
+        return
+
+    db.session.execute(text(f"""
+        CREATE TABLE IF NOT EXISTS {LINKS_TABLE} (
+            source_table VARCHAR(64) NOT NULL,
+            source_id BIGINT NOT NULL,
+            target_table VARCHAR(64) NOT NULL,
+            target_id BIGINT NOT NULL,
+            voter_score FLOAT,
+            father_score FLOAT,
+            combined_score FLOAT,
+            run_id VARCHAR(32),
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (source_table, source_id, target_table, target_id)
+        )
+    """))
+    db.session.commit()
+    _links_ready = True
+
+
+def table_spec(table_name):
+    """Column spec of a linkable table; ValueError for anything else"""
+    if table_name not in TABLE_COLUMNS:
+        raise ValueError(f"Table {table_name} cannot be linked (known: {', '.join(TABLE_COLUMNS)})")
+    return TABLE_COLUMNS[table_name]
+
+
+def hash_functions(num_perm, seed=1):
+    """(a, b) coefficients of the num_perm universal hashes (a*x + b) mod p"""
+    rng = np.random.RandomState(seed)
+    a = rng.randint(1, MERSENNE_PRIME, size=num_perm).astype(np.uint64)
+    b = rng.randint(0, MERSENNE_PRIME, size=num_perm).astype(np.uint64)
+    return a, b
+
+
+def shingles_of(name_text):
+    """CRC32 of every character 3-gram of a name (padded so short names still shingle)"""
+    padded = f" {name_text} "
+    if len(padded) < SHINGLE_SIZE:
+        return set()
+    return {zlib.crc32(padded[i:i + SHINGLE_SIZE].encode('utf-8'))
+            for i in range(len(padded) - SHINGLE_SIZE + 1)}
+
+
+def minhash_signatures(shingle_sets, a, b):
+    """
+    MinHash signatures of a batch of shingle sets (all non-empty)
+
+    All shingles of the batch are hashed in one (num_perm x total_shingles) array
+    and reduced per row with minimum.reduceat
+
+    Returns: uint64 array (rows x num_perm)
+    """
+    lengths = np.fromiter((len(s) for s in shingle_sets), dtype=np.int64, count=len(shingle_sets))
+    values = np.fromiter((x for s in shingle_sets for x in s), dtype=np.uint64, count=int(lengths.sum()))
+    values %= np.uint64(MERSENNE_PRIME)
+
+    hashed = (a[:, None] * values[None, :] + b[:, None]) % np.uint64(MERSENNE_PRIME)
+    offsets = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+    return np.minimum.reduceat(hashed, offsets, axis=1).T
+
+
+def band_keys(signatures, bands):
+    """One uint64 bucket key per (row, band); rows must be a multiple of bands"""
+    rows_per_band = signatures.shape[1] // bands
+    banded = signatures[:, :bands * rows_per_band].reshape(len(signatures), bands, rows_per_band)
+
+    keys = np.zeros((len(signatures), bands), dtype=np.uint64)
+    multiplier = np.uint64(1099511628211)  # FNV-1a 64-bit prime; overflow wraps by design
+    with np.errstate(over='ignore'):
+        for r in range(rows_per_band):
+            keys = keys * multiplier + banded[:, :, r]
+    return keys
+
+
+def link_text(voter_name, father_name):
+    """Transliterated latin text of a row's names (what gets shingled)"""
+    v_lat = get_universal_skeleton(voter_name or "")[0]
+    f_lat = get_universal_skeleton(father_name or "")[0]
+    return f"{v_lat}|{f_lat}" if v_lat or f_lat else ""
+
+
+def sign_table(table_name, a, b, bands, batch_size=5000, cancel_event=None, on_batch=None):
+    """
+    Stream a table (keyset pagination on id) and compute its band keys
+
+    Returns: (ids int64 array, band key array rows x bands)
+    """
+    voter_col, father_col, _, has_status = table_spec(table_name)
+    active = "(status IS NULL OR status != 'INACTIVE') AND " if has_status else ""
+    sql = text(f"""
+        SELECT id, {voter_col} AS voter_name, {father_col} AS father_name
+        FROM {DB_NAME}.{table_name}
+        WHERE {active}id > :last_id
+        ORDER BY id
+        LIMIT {int(batch_size)}
+    """)
+
+    id_chunks = []
+    key_chunks = []
+    last_id = -1
+    while True:
+        check_cancelled(cancel_event)
+        rows = db.session.execute(sql, {"last_id": last_id}).fetchall()
+        if not rows:
+            break
+        last_id = rows[-1].id
+        db.session.commit()  # Hand the connection back between chunks
+
+        ids = []
+        shingle_sets = []
+        for row in rows:
+            shingles = shingles_of(link_text(row.voter_name, row.father_name))
+            if shingles:
+                ids.append(row.id)
+                shingle_sets.append(shingles)
+
+        if ids:
+            id_chunks.append(np.asarray(ids, dtype=np.int64))
+            key_chunks.append(band_keys(minhash_signatures(shingle_sets, a, b), bands))
+        if on_batch:
+            on_batch(len(rows))
+
+    if not id_chunks:
+        return np.empty(0, dtype=np.int64), np.empty((0, bands), dtype=np.uint64)
+    return np.concatenate(id_chunks), np.concatenate(key_chunks)
+
+
+def candidate_pairs(source_keys, target_keys, max_bucket_size=200):
+    """
+    Cross-table candidate pairs: (source row, target row) index pairs sharing a band bucket
+
+    Per band the target keys are sorted once and every source key is located with
+    searchsorted; bucket sizes per source row give the pairs without a Python loop.
+    Buckets holding more than max_bucket_size target rows are skipped (very common
+    names would otherwise explode the candidate set).
+
+    Returns: (unique int64 pair codes source_idx * n_target + target_idx, buckets skipped)
+    """
+    n_target = len(target_keys)
+    codes = []
+    skipped = 0
+    for band in range(source_keys.shape[1]):
+        order = np.argsort(target_keys[:, band], kind='stable')
+        sorted_keys = target_keys[order, band]
+
+        left = np.searchsorted(sorted_keys, source_keys[:, band], side='left')
+        right = np.searchsorted(sorted_keys, source_keys[:, band], side='right')
+        counts = right - left
+
+        hot = counts > max_bucket_size
+        skipped += int(np.count_nonzero(hot))
+        counts[hot] = 0
+        total = int(counts.sum())
+        if total == 0:
+            continue
+
+        source_idx = np.repeat(np.arange(len(source_keys), dtype=np.int64), counts)
+        starts = np.repeat(left - (np.cumsum(counts) - counts), counts)
+        target_idx = order[starts + np.arange(total)]
+        codes.append(np.unique(source_idx * n_target + target_idx))
+
+    if not codes:
+        return np.empty(0, dtype=np.int64), skipped
+    return np.unique(np.concatenate(codes)), skipped
+
+
+def fetch_link_rows(table_name, ids):
+    """Names/gender of a set of rows, as linkage signatures: {id: (v_data, f_data, gender)}"""
+    voter_col, father_col, gender_col, _ = table_spec(table_name)
+    rows = {}
+    for start in range(0, len(ids), 1000):
+        chunk = ids[start:start + 1000]
+        result = db.session.execute(text(f"""
+            SELECT id, {voter_col} AS voter_name, {father_col} AS father_name, {gender_col} AS gender
+            FROM {DB_NAME}.{table_name}
+            WHERE id IN :ids
+        """).bindparams(bindparam("ids", expanding=True)), {"ids": chunk})
+        for row in result:
+            rows[row.id] = (get_universal_skeleton(row.voter_name or ""),
+                            get_universal_skeleton(row.father_name or ""),
+                            normalize_gender(row.gender))
+    return rows
+
+
+def score_candidates(source_table, target_table, source_ids, target_ids, pair_codes,
+                     voter_threshold, father_threshold, use_gender, cancel_event=None, on_chunk=None):
+    """
+    Score candidate pairs chunk by chunk (codes are sorted, so each chunk covers a
+    narrow range of source rows)
+
+    Returns: [(source_id, target_id, voter, father, combined)]
+    """
+    n_target = len(target_ids)
+    links = []
+    for start in range(0, len(pair_codes), SCORE_CHUNK):
+        check_cancelled(cancel_event)
+        chunk = pair_codes[start:start + SCORE_CHUNK]
+        chunk_source = source_ids[chunk // n_target]
+        chunk_target = target_ids[chunk % n_target]
+
+        sources = fetch_link_rows(source_table, sorted({int(x) for x in chunk_source}))
+        targets = fetch_link_rows(target_table, sorted({int(x) for x in chunk_target}))
+
+        for s_id, t_id in zip(chunk_source.tolist(), chunk_target.tolist()):
+            src, tgt = sources.get(s_id), targets.get(t_id)
+            if src is None or tgt is None:
+                continue
+
+            voter_score = calculate_name_similarity(src[0], tgt[0])
+            if voter_score < voter_threshold:
+                continue
+            father_score = calculate_name_similarity(src[1], tgt[1])
+            if father_score < father_threshold:
+                continue
+            if use_gender and not genders_compatible(src[2], tgt[2]):
+                continue
+
+            links.append((s_id, t_id, voter_score, father_score,
+                          round((voter_score + father_score) / 2, 2)))
+
+        if on_chunk:
+            on_chunk(min(start + SCORE_CHUNK, len(pair_codes)), len(links))
+    return links
+
+
+def write_links(source_table, target_table, links, run_id):
+    """Replace the table pair's links with the new ones (one transaction)"""
+    ensure_links_table()
+    db.session.execute(text(f"""
+        DELETE FROM {LINKS_TABLE}
+        WHERE source_table = :source_table AND target_table = :target_table
+    """), {"source_table": source_table, "target_table": target_table})
+
+    insert_sql = text(f"""
+        INSERT INTO {LINKS_TABLE}
+            (source_table, source_id, target_table, target_id, voter_score, father_score, combined_score, run_id)
+        VALUES
+            (:source_table, :source_id, :target_table, :target_id, :voter_score, :father_score,
+             :combined_score, :run_id)
+    """)
+    for start in range(0, len(links), SCORE_CHUNK):
+        db.session.execute(insert_sql, [{
+            "source_table": source_table,
+            "source_id": s_id,
+            "target_table": target_table,
+            "target_id": t_id,
+            "voter_score": voter_score,
+            "father_score": father_score,
+            "combined_score": combined_score,
+            "run_id": run_id
+        } for s_id, t_id, voter_score, father_score, combined_score in links[start:start + SCORE_CHUNK]])
+    db.session.commit()
+
+
+def run_record_linkage(source_table, target_table, voter_threshold=85, father_threshold=80, use_gender=True,
+                       dry_run=True, num_perm=64, bands=16, max_bucket_size=200, batch_size=5000,
+                       tracker=None, cancel_event=None):
+    """
+    Link the rows of source_table to the same people in target_table
+
+    num_perm / bands: signature length and LSH bands (num_perm // bands rows per band);
+                      the default 64/16 catches name pairs with shingle Jaccard ~0.5 and up
+    max_bucket_size: band buckets with more target rows than this generate no candidates
+    dry_run: score and report only, record_links is left untouched
+    """
+    table_spec(source_table)
+    table_spec(target_table)
+    if source_table == target_table:
+        raise ValueError("Source and target table must differ (use deduplication within a table)")
+    if num_perm % bands:
+        raise ValueError("num_perm must be a multiple of bands")
+
+    run_id = create_run('linkage', source_table, {
+        "source_table": source_table,
+        "target_table": target_table,
+        "voter_threshold": voter_threshold,
+        "father_threshold": father_threshold,
+        "use_gender": use_gender,
+        "dry_run": dry_run,
+        "num_perm": num_perm,
+        "bands": bands,
+        "max_bucket_size": max_bucket_size
+    }, dry_run)
+
+    start = time.time()
+    a, b = hash_functions(num_perm)
+    try:
+        signed = {}
+        for table in (source_table, target_table):
+            counter = {"rows": 0}
+
+            def on_batch(rows, table=table, counter=counter):
+                counter["rows"] += rows
+                update_progress('processing', f'Computing MinHash signatures for {table}...',
+                                counter["rows"], 0, 0, tracker=tracker)
+
+            signed[table] = sign_table(table, a, b, bands, batch_size, cancel_event, on_batch)
+
+        source_ids, source_keys = signed[source_table]
+        target_ids, target_keys = signed[target_table]
+
+        check_cancelled(cancel_event)
+        update_progress('processing', 'Generating LSH candidate pairs...', 0, 0, 0, tracker=tracker)
+        pair_codes, hot_buckets = candidate_pairs(source_keys, target_keys, max_bucket_size)
+
+        def on_chunk(done, found):
+            update_progress('processing', 'Scoring candidate pairs...', done, len(pair_codes), found,
+                            tracker=tracker)
+
+        links = score_candidates(source_table, target_table, source_ids, target_ids, pair_codes,
+                                 voter_threshold, father_threshold, use_gender, cancel_event, on_chunk)
+
+        if not dry_run:
+            update_progress('processing', 'Writing record links...', len(pair_codes), len(pair_codes),
+                            len(links), tracker=tracker)
+            write_links(source_table, target_table, links, run_id)
+    except DedupCancelled as e:
+        finish_run(run_id, 'cancelled', error=str(e))
+        raise
+    except Exception as e:
+        finish_run(run_id, 'failed', error=str(e))
+        raise
+
+    update_progress('completed', 'Record linkage completed', len(pair_codes), len(pair_codes), len(links),
+                    tracker=tracker)
+
+    summary = {
+        "success": True,
+        "run_id": run_id,
+        "mode": "linkage",
+        "dry_run": dry_run,
+        "source_table": source_table,
+        "target_table": target_table,
+        "voter_threshold": voter_threshold,
+        "father_threshold": father_threshold,
+        "use_gender_validation": use_gender,
+        "source_records": len(source_ids),
+        "target_records": len(target_ids),
+        "candidate_pairs": len(pair_codes),
+        "hot_buckets_skipped": hot_buckets,
+        "links_found": len(links),
+        "source_records_linked": len({link[0] for link in links}),
+        "duration_seconds": round(time.time() - start, 2),
+        "message": "Dry run completed" if dry_run else "Record links written"
+    }
+    finish_run(run_id, 'completed', summary)
+
+    details = [{
+        "source_id": s_id,
+        "target_id": t_id,
+        "voter_score": voter_score,
+        "father_score": father_score,
+        "combined_score": combined_score
+    } for s_id, t_id, voter_score, father_score, combined_score in links[:100]]
+    return {**summary, "details": details}
+
+
+@record_linkage_bp.route("/link-records", methods=["POST"])
+def link_records():
+    """
+    Link a source table to a target table (MinHash/LSH candidates, phonetic scoring)
+    Runs as a background job: returns 202 with a job id, poll /api/pysearch/jobs/<job_id>
+    """
+    source_table = request.json.get("source_table", "voters_pdf_extract")
+    target_table = request.json.get("target_table", "voter_data")
+    if source_table not in TABLE_COLUMNS or target_table not in TABLE_COLUMNS or source_table == target_table:
+        return jsonify({
+            "success": False,
+            "error": f"source_table and target_table must be two different tables of: {', '.join(TABLE_COLUMNS)}"
+        }), 400
+
+    params = {
+        "source_table": source_table,
+        "target_table": target_table,
+        "voter_threshold": request.json.get("voter_threshold", 85),
+        "father_threshold": request.json.get("father_threshold", 80),
+        "use_gender": request.json.get("use_gender", True),
+        "dry_run": request.json.get("dry_run", True),
+        "num_perm": request.json.get("num_perm", 64),
+        "bands": request.json.get("bands", 16),
+        "max_bucket_size": request.json.get("max_bucket_size", 200)
+    }
+    return submit_job_response('linkage', source_table, run_record_linkage, params, new_progress_tracker())
+
+
+@record_linkage_bp.route("/record-links", methods=["GET"])
+def list_record_links():
+    """Stored links of a table pair, best first"""
+    source_table = request.args.get("source_table", "voters_pdf_extract")
+    target_table = request.args.get("target_table", "voter_data")
+    limit = min(int(request.args.get("limit", 100)), 1000)
+
+    try:
+        ensure_links_table()
+        result = db.session.execute(text(f"""
+            SELECT source_id, target_id, voter_score, father_score, combined_score, run_id
+            FROM {LINKS_TABLE}
+            WHERE source_table = :source_table AND target_table = :target_table
+            ORDER BY combined_score DESC
+            LIMIT {limit}
+        """), {"source_table": source_table, "target_table": target_table})
+        return jsonify({
+            "success": True,
+            "source_table": source_table,
+            "target_table": target_table,
+            "links": [dict(row._mapping) for row in result]
+        })
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
@@ -0,0 +1,128 @@
+"""
+Response cache with ETags for the dashboard and table endpoints of app.py
+- Entries are keyed on the endpoint, the normalized filter set (build_where_clause
+  where + params, so equivalent query strings share an entry), the endpoint's own
+  arguments (paging, sorting) and the generation of the table they read
+- Every table has a generation token in the cache; bump_generation replaces it, so
+  all entries of the table become unreachable at once and expire with their TTL.
+  /api/update_row bumps it once the row and the cube are updated, dedup write-backs /
+  restores / resets mark the table on their db.session (touch_table) and the bump
+  happens after their commit (a rolled back write-back bumps nothing)
+- Responses carry an ETag (hash of the body); If-None-Match answers 304 without
+  the body, a cache hit skips MySQL entirely
+- Backend from CACHE_TYPE (create_app). SimpleCache is per process: with several
+  workers use a shared backend (RedisCache, CACHE_REDIS_URL) so a bump reaches all
+"""
+
+import hashlib
+import json
+import os
+import uuid
+from functools import wraps
+
+from flask import current_app, has_app_context, request
+from flask_caching import Cache
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+cache = Cache()
+
+# Seconds an entry lives (a bump invalidates it earlier)
+RESPONSE_TTLS = {
+    "charts": int(os.getenv("CACHE_TTL_CHARTS", 300)),
+    "table": int(os.getenv("CACHE_TTL_TABLE", 60)),
+}
+MAX_CACHED_BYTES = int(os.getenv("CACHE_MAX_RESPONSE_BYTES", 2 * 1024 * 1024))
+
+TOUCHED_KEY = "response_cache_tables"
+
+
+def cache_ready():
+    return has_app_context() and cache in current_app.extensions.get("cache", {})
+
+
+def generation(table):
+    """Current generation token of the table (a new one when missing or evicted)"""
+    token = cache.get(f"generation:{table}")
+    if token is None:
+        token = bump_generation(table)
+    return token
+
+
+def bump_generation(table):
+    """Invalidate every cached response of the table"""
+    if not cache_ready():
+        return None
+    token = uuid.uuid4().hex
+    cache.set(f"generation:{table}", token, timeout=0)
+    return token
+
+
+def touch_table(session, table):
+    """Bump the table's generation once the session's transaction commits"""
+    session.info.setdefault(TOUCHED_KEY, set()).add(table)
+
+
+@event.listens_for(Session, "after_commit")
+def _bump_touched(session):
+    for table in session.info.pop(TOUCHED_KEY, ()):
+        bump_generation(table)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_touched(session):
+    session.info.pop(TOUCHED_KEY, None)
+
+
+def etag_of(body):
+    return hashlib.sha1(body).hexdigest()
+
+
+def conditional_response(body, etag, mimetype="application/json"):
+    """200 with the body, or 304 when the client already has this ETag"""
+    if request.if_none_match.contains(etag):
+        response = current_app.response_class(status=304)
+    else:
+        response = current_app.response_class(body, mimetype=mimetype)
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "no-cache"  # Revalidate, the ETag keeps it cheap
+    return response
+
+
+def cached_response(kind, table, filters, extra_args=()):
+    """
+    Cache a read endpoint's JSON response
+
+    kind: key of RESPONSE_TTLS
+    table: fn() -> the table the endpoint reads (its generation is part of the key)
+    filters: fn(args) -> (where, params), the normalized filter set
+    extra_args: request arguments that also shape the response (paging, sorting)
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if not cache_ready():
+                return view(*args, **kwargs)
+
+            where, params = filters(request.args)
+            material = json.dumps([request.endpoint, " ".join(where.split()), params,
+                                   [request.args.get(name) for name in extra_args]],
+                                  default=str, ensure_ascii=False)
+            key = (f"response:{request.endpoint}:{generation(table())}:"
+                   + hashlib.sha1(material.encode("utf-8")).hexdigest())
+
+            entry = cache.get(key)
+            if entry is not None:
+                etag, body = entry
+                return conditional_response(body, etag)
+
+            response = view(*args, **kwargs)
+            if isinstance(response, tuple) or response.status_code != 200 or response.mimetype != "application/json":
+                return response
+            body = response.get_data()
+            etag = etag_of(body)
+            if len(body) <= MAX_CACHED_BYTES:
+                cache.set(key, (etag, body), timeout=RESPONSE_TTLS[kind])
+            return conditional_response(body, etag)
+        return wrapper
+    return decorator
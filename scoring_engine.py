@@ -0,0 +1,704 @@
+"""
+Cascading similarity kernel for phonetic signatures (latin, skeleton, metaphone, normalized)
+- The weighted formula (metaphone, skeleton, token overlap, token_sort ratio,
+  partial ratio) is evaluated cheapest signal first; after each signal the best
+  score still reachable (every remaining signal at 100) is compared with the
+  score_cutoff and the pair is dropped as soon as it cannot reach it
+- The dedup kernels keep the ratio semantics they were tuned on: fuzzywuzzy's
+  token_sort_ratio / partial_ratio (ratio_backend='fuzzywuzzy'), so a pair gets the
+  score the v2 / v3 formulas always gave it; with ratio_backend='rapidfuzz' the
+  ratios come from rapidfuzz, which also gets the cutoff left for its own signal
+- A pair that reaches the cutoff gets exactly the score of the full formula:
+  the final sum is always computed in the formula's own order
+- score_cutoff=0 evaluates every signal (the plain formula)
+- Overlap signals come from per-record bitmasks (with_masks): the skeleton's
+  character set as a 64-bit mask and the name's tokens hashed into a 64-bit mask,
+  so overlaps are an integer AND + popcount; window_overlaps does the same for a
+  whole comparison window with NumPy. Shared token bits are confirmed on the
+  token sets (a hash collision never changes a score)
+- score_window scores one anchor against a whole window: equality signals on
+  integer-coded columns (SignatureColumns), ratios (rapidfuzz cdist, or the
+  fuzzywuzzy functions pair by pair) only for the pairs the cheap signals leave
+  alive, the weighted sum in NumPy - same scores
+- PairScoreCache memoizes pair scores for one run: signatures are interned to
+  integer ids and scores are kept per (id, id, cutoff), so a name pair repeated
+  across a GP ("रामपाल" son of "रामदीन") is scored once
+- Every scoring formula of the service is a named profile (PROFILES): the dedup
+  kernels, the controller's name similarity and the four search ranking formulas
+  (SearchProfile). All profiles have score (one pair) and score_many (one
+  signature against a list, vectorized); tests/test_scoring_profiles.py pins
+  them to golden scores of the formulas they replaced
+"""
+
+import itertools
+import os
+import threading
+import zlib
+
+import numpy as np
+from fuzzywuzzy import fuzz as fuzzywuzzy_fuzz
+from rapidfuzz import fuzz, process, utils
+
+ROUNDING_SLACK = 0.005  # Scores are rounded to 2 decimals: a raw score this far below the cutoff can still pass
+
+# Skeleton characters with a bit in the skeleton mask: printable ASCII without
+# uppercase (latin is lowercased) and vowels (removed from skeletons) - 63 characters
+MASK_ALPHABET = ''.join(c for c in map(chr, range(32, 127)) if not c.isupper() and c not in 'aeiouy')
+SKELETON_BITS = {c: 1 << n for n, c in enumerate(MASK_ALPHABET)}
+NO_MASK = -1  # Skeleton with a character outside MASK_ALPHABET: overlap from sets
+SIG_ID = 7  # Index of the interned id in a signature passed through PairScoreCache.intern
+DEFAULT_CACHE_SIZE = 200000  # Pair scores kept per run
+
+# The ratios of the original v2 / v3 formulas (integers, full_process on token_sort)
+FUZZYWUZZY_RATIOS = {'token_sort': fuzzywuzzy_fuzz.token_sort_ratio, 'partial': fuzzywuzzy_fuzz.partial_ratio}
+RAPIDFUZZ_RATIOS = {'token_sort': fuzz.token_sort_ratio, 'partial': fuzz.partial_ratio}
+
+
+def popcount(value):
+    return bin(value).count('1')
+
+
+if hasattr(int, 'bit_count'):
+    popcount = int.bit_count  # noqa: F811 (Python 3.10+)
+
+
+def skeleton_mask(skel):
+    """64-bit mask of the skeleton's character set, NO_MASK if a character has no bit"""
+    mask = 0
+    for c in skel:
+        bit = SKELETON_BITS.get(c)
+        if bit is None:
+            return NO_MASK
+        mask |= bit
+    return mask
+
+
+def token_mask(tokens):
+    """64-bit mask of the tokens, one crc32-hashed bit per token"""
+    mask = 0
+    for token in tokens:
+        mask |= 1 << (zlib.crc32(token.encode('utf-8')) & 63)
+    return mask
+
+
+def with_masks(sig):
+    """
+    Signature extended with its overlap masks (computed once per record):
+    (latin, skeleton, metaphone, normalized, skeleton mask, token set, token mask)
+    """
+    if len(sig) > 4:
+        return sig
+    if len(sig) == 3:
+        sig = (*sig, '')  # get_universal_skeleton signature: no normalized form
+    tokens = frozenset(sig[0].split())
+    return (*sig, skeleton_mask(sig[1]), tokens, token_mask(tokens))
+
+
+def token_overlap_of(sig1, sig2):
+    """Shared tokens / larger token set * 100"""
+    if len(sig1) > 4 and len(sig2) > 4:
+        tokens1, tokens2 = sig1[5], sig2[5]
+        if not tokens1 and not tokens2:
+            return 0
+        # No shared bit: no shared token; otherwise confirm on the sets (hash collisions)
+        common = len(tokens1 & tokens2) if sig1[6] & sig2[6] else 0
+        return common / max(len(tokens1), len(tokens2)) * 100
+
+    tokens1 = set(sig1[0].split())
+    tokens2 = set(sig2[0].split())
+    if tokens1 or tokens2:
+        return len(tokens1 & tokens2) / max(len(tokens1), len(tokens2)) * 100
+    return 0
+
+
+_M1 = np.uint64(0x5555555555555555)
+_M2 = np.uint64(0x3333333333333333)
+_M4 = np.uint64(0x0f0f0f0f0f0f0f0f)
+_H01 = np.uint64(0x0101010101010101)
+
+
+def popcount64(values):
+    """Popcount of every element of a uint64 array (SWAR, NumPy < 2 has no bitwise_count)"""
+    values = values - ((values >> np.uint64(1)) & _M1)
+    values = (values & _M2) + ((values >> np.uint64(2)) & _M2)
+    values = (values + (values >> np.uint64(4))) & _M4
+    return (values * _H01) >> np.uint64(56)
+
+
+class SignatureColumns:
+    """
+    Column arrays of a list of masked signatures, so that a window (an index array)
+    is scored with vector operations; the string columns are integer-coded for the
+    equality signals ('' is always code 0)
+    """
+
+    def __init__(self, sigs):
+        self.sigs = sigs
+        self.lat = [sig[0] for sig in sigs]
+        self.skel = [sig[1] for sig in sigs]
+        self.lat_code = self._codes(self.lat)
+        self.skel_code = self._codes(self.skel)
+        self.meta_code = self._codes([sig[2] for sig in sigs])
+        self.norm_code = self._codes([sig[3] for sig in sigs])
+        self.skel_len = np.array([len(skel) for skel in self.skel], dtype=np.int64)
+        self.skel_mask = np.array([sig[4] for sig in sigs], dtype=np.int64)
+        self.token_mask = np.array([sig[6] for sig in sigs], dtype=np.uint64)
+        self.token_count = np.array([len(sig[5]) for sig in sigs], dtype=np.int64)
+
+    @staticmethod
+    def _codes(values):
+        codes = {'': 0}
+        return np.array([codes.setdefault(value, len(codes)) for value in values], dtype=np.int64)
+
+    def overlaps(self, anchor, idx):
+        """
+        Shared skeleton characters and token overlap (0-100) of signature anchor
+        against the signatures idx (AND + popcount; sets only where masks can't decide)
+        """
+        count = len(idx)
+        anchor_mask = self.skel_mask[anchor]
+        masks = self.skel_mask[idx]
+        valid = (masks != NO_MASK) & (anchor_mask != NO_MASK)
+        common = np.zeros(count, dtype=np.int64)
+        if valid.any():
+            shared = masks[valid].astype(np.uint64) & np.uint64(max(anchor_mask, 0))
+            common[valid] = popcount64(shared).astype(np.int64)
+        if not valid.all():
+            anchor_chars = set(self.skel[anchor])
+            for k in np.flatnonzero(~valid).tolist():
+                common[k] = len(anchor_chars & set(self.skel[idx[k]]))
+
+        # Shared token bits flag the candidates whose sets are intersected
+        anchor_tokens = self.sigs[anchor][5]
+        token_common = np.zeros(count, dtype=np.int64)
+        shared_bits = np.flatnonzero(self.token_mask[idx] & self.token_mask[anchor])
+        if len(shared_bits):
+            token_common[shared_bits] = [len(anchor_tokens & self.sigs[j][5]) for j in idx[shared_bits].tolist()]
+        larger = np.maximum(self.token_count[idx], self.token_count[anchor])
+        token_overlap = np.divide(token_common, larger, out=np.zeros(count), where=larger > 0) * 100
+        return common, token_overlap
+
+
+def window_overlaps(anchor_sig, sigs):
+    """
+    Skeleton overlap ratios and token overlaps of one masked signature against a
+    window of masked signatures, as NumPy arrays
+
+    Returns: (shared skeleton characters / longer skeleton, token overlap 0-100)
+    """
+    columns = SignatureColumns([anchor_sig, *sigs])
+    common, token_overlap = columns.overlaps(0, np.arange(1, len(sigs) + 1))
+    total = np.maximum(columns.skel_len[1:], columns.skel_len[0])
+    return np.divide(common, total, out=np.zeros(len(sigs)), where=total > 0), token_overlap
+
+
+class SimilarityKernel:
+    """
+    One weighted similarity formula over plain or masked (with_masks) signatures
+
+    weights: {'phonetic', 'skeleton', 'token_sort', 'partial', 'token_overlap'} -> weight
+    skeleton_*: partial credit of the skeleton signal
+        substring: one skeleton contains the other (max_gap: largest length difference, None: any)
+        overlap: shared consonants / longer skeleton above overlap_ratio
+    ratio_backend: 'fuzzywuzzy' (the functions the dedup formulas were written against,
+                   scores identical to them) or 'rapidfuzz'
+    integer_ratios: round the rapidfuzz ratios to ints (rapidfuzz backend)
+    token_sort_processor: string processor of the rapidfuzz token_sort ratio
+    """
+
+    def __init__(self, weights, skeleton_substring_score, skeleton_substring_max_gap,
+                 skeleton_overlap_ratio, skeleton_overlap_score, ratio_backend='fuzzywuzzy',
+                 integer_ratios=True, token_sort_processor=utils.default_process):
+        if ratio_backend not in ('fuzzywuzzy', 'rapidfuzz'):
+            raise ValueError(f"Unknown ratio backend {ratio_backend!r}")
+        self.weights = weights
+        self.skeleton_substring_score = skeleton_substring_score
+        self.skeleton_substring_max_gap = skeleton_substring_max_gap
+        self.skeleton_overlap_ratio = skeleton_overlap_ratio
+        self.skeleton_overlap_score = skeleton_overlap_score
+        self.ratio_backend = ratio_backend
+        self.integer_ratios = integer_ratios
+        self.token_sort_processor = token_sort_processor
+
+    def skeleton_score(self, skel1, skel2, mask1=NO_MASK, mask2=NO_MASK):
+        if not skel1 or not skel2:
+            return 0
+        if skel1 == skel2:
+            return 100
+        if skel1 in skel2 or skel2 in skel1:
+            gap = self.skeleton_substring_max_gap
+            if gap is None or abs(len(skel1) - len(skel2)) <= gap:
+                return self.skeleton_substring_score
+            return 0
+        if mask1 != NO_MASK and mask2 != NO_MASK:
+            common = popcount(mask1 & mask2)
+        else:
+            common = len(set(skel1) & set(skel2))
+        total = max(len(skel1), len(skel2))
+        if total > 0 and common / total > self.skeleton_overlap_ratio:
+            return self.skeleton_overlap_score
+        return 0
+
+    def _processor(self, signal):
+        return self.token_sort_processor if signal == 'token_sort' else None
+
+    def _ratio(self, signal, lat1, lat2, needed):
+        """
+        The signal's ratio ('token_sort' / 'partial'), or None when it cannot reach needed
+        (needed <= 0: always computed in full)
+        """
+        if self.ratio_backend == 'fuzzywuzzy':
+            value = FUZZYWUZZY_RATIOS[signal](lat1, lat2)
+            if needed > 0 and value < needed:
+                return None
+            return value
+
+        cutoff = 0
+        if needed > 0:
+            # An integer ratio rounds up from needed - 0.5
+            cutoff = needed - 0.5 if self.integer_ratios else needed
+            if cutoff > 100:
+                return None
+        value = RAPIDFUZZ_RATIOS[signal](lat1, lat2, processor=self._processor(signal), score_cutoff=max(cutoff, 0))
+        if self.integer_ratios:
+            value = int(round(value))
+        if needed > 0 and value < needed:
+            return None
+        return value
+
+    def score(self, sig1, sig2, score_cutoff=0):
+        """
+        Similarity 0-100 of two signatures (3-tuple signatures have no normalized form)
+
+        score_cutoff: pairs that cannot reach it return 0 as soon as that is known
+        """
+        lat1, skel1, meta1 = sig1[0], sig1[1], sig1[2]
+        lat2, skel2, meta2 = sig2[0], sig2[1], sig2[2]
+        norm1 = sig1[3] if len(sig1) > 3 else ''
+        norm2 = sig2[3] if len(sig2) > 3 else ''
+
+        # Handle empty strings
+        if not lat1 and not lat2:
+            return 100
+        if not lat1 or not lat2:
+            return 0
+
+        # Exact normalized match
+        if norm1 and norm2 and norm1 == norm2:
+            return 100
+
+        w = self.weights
+        floor = score_cutoff - ROUNDING_SLACK
+        remaining = w['skeleton'] + w['token_overlap'] + w['token_sort'] + w['partial']
+
+        # 1. Phonetic match
+        phonetic = 100 if (meta1 == meta2 and meta1 != "") else 0
+        reached = phonetic * w['phonetic']
+        if reached + 100 * remaining < floor:
+            return 0
+
+        # 2. Skeleton match
+        if len(sig1) > 4 and len(sig2) > 4:
+            skeleton = self.skeleton_score(skel1, skel2, sig1[4], sig2[4])
+        else:
+            skeleton = self.skeleton_score(skel1, skel2)
+        reached += skeleton * w['skeleton']
+        remaining -= w['skeleton']
+        if reached + 100 * remaining < floor:
+            return 0
+
+        # 3. Token overlap
+        token_overlap = token_overlap_of(sig1, sig2)
+        reached += token_overlap * w['token_overlap']
+        remaining -= w['token_overlap']
+        if reached + 100 * remaining < floor:
+            return 0
+
+        # 4. Fuzzy string matching (rapidfuzz stops below the cutoff left for it)
+        fuzzy = 0
+        remaining -= w['token_sort']
+        if w['token_sort']:
+            fuzzy = self._ratio('token_sort', lat1, lat2, (floor - reached - 100 * remaining) / w['token_sort'])
+            if fuzzy is None:
+                return 0
+            reached += fuzzy * w['token_sort']
+
+        partial = 0
+        if w['partial']:
+            partial = self._ratio('partial', lat1, lat2, (floor - reached) / w['partial'])
+            if partial is None:
+                return 0
+
+        # Weighted combination (formula order, so cascaded and full scores are identical)
+        final_score = (
+            (phonetic * w['phonetic']) +
+            (skeleton * w['skeleton']) +
+            (fuzzy * w['token_sort']) +
+            (partial * w['partial']) +
+            (token_overlap * w['token_overlap'])
+        )
+
+        return round(final_score, 2)
+
+    def _window_ratio(self, signal, lat, choices, needed, workers):
+        """
+        Vector of _ratio over a window: one cdist call with the lowest cutoff of the
+        window (fuzzywuzzy: pair by pair), then each pair is held to its own needed score
+
+        Returns: (values, reached mask)
+        """
+        if self.ratio_backend == 'fuzzywuzzy':
+            ratio = FUZZYWUZZY_RATIOS[signal]
+            values = np.array([ratio(lat, choice) for choice in choices], dtype=np.float64)
+            return values, (needed <= 0) | (values >= needed)
+
+        cutoffs = needed - 0.5 if self.integer_ratios else needed
+        cutoff = max(float(cutoffs.min()), 0)
+        values = process.cdist([lat], choices, scorer=RAPIDFUZZ_RATIOS[signal], processor=self._processor(signal),
+                               score_cutoff=cutoff, dtype=np.float64, workers=workers)[0]
+        if self.integer_ratios:
+            values = np.rint(values)
+        return values, (needed <= 0) | ((cutoffs <= 100) & (values >= needed))
+
+    def score_window(self, columns, anchor, indices, score_cutoff=0, workers=-1):
+        """
+        Scores of signature anchor of a SignatureColumns against its signatures
+        indices: pair by pair equal to score(..., score_cutoff), 0 for pairs that
+        cannot reach the cutoff
+
+        The cheap signals are vector operations over integer-coded columns; only the
+        pairs that can still reach the cutoff get their ratios (rapidfuzz cdist with
+        workers threads, -1: all cores; fuzzywuzzy pair by pair) and the weighted
+        sum is taken in NumPy.
+
+        Returns: list of scores in the order of indices
+        """
+        idx = np.asarray(indices, dtype=np.int64)
+        count = len(idx)
+        if not count:
+            return []
+
+        c = columns
+        w = self.weights
+        floor = score_cutoff - ROUNDING_SLACK
+
+        # Empty strings and exact normalized matches are decided up front
+        fixed = np.full(count, np.nan)
+        lat_b = c.lat_code[idx]
+        if c.lat_code[anchor] == 0:
+            fixed[:] = np.where(lat_b == 0, 100, 0)
+        else:
+            fixed[lat_b == 0] = 0
+        norm_a = c.norm_code[anchor]
+        if norm_a:
+            fixed[np.isnan(fixed) & (c.norm_code[idx] == norm_a)] = 100
+        alive = np.isnan(fixed)
+
+        # 1. Phonetic match
+        meta_a = c.meta_code[anchor]
+        phonetic = np.where((c.meta_code[idx] == meta_a) & (meta_a != 0), 100, 0)
+
+        # 2. Skeleton match
+        common, token_overlap = c.overlaps(anchor, idx)
+        skeleton = np.zeros(count, dtype=np.int64)
+        skel_a = c.skel_code[anchor]
+        if skel_a:
+            skel_b = c.skel_code[idx]
+            skeleton[skel_b == skel_a] = 100
+            partial_credit = np.zeros(count, dtype=bool)
+            partial_credit[(skel_b != skel_a) & (skel_b != 0)] = True
+            anchor_skel = c.skel[anchor]
+            substring = np.zeros(count, dtype=bool)
+            candidates = np.flatnonzero(partial_credit)
+            if len(candidates):
+                substring[candidates] = [anchor_skel in other or other in anchor_skel
+                                         for other in (c.skel[j] for j in idx[candidates].tolist())]
+            lengths = c.skel_len[idx]
+            if self.skeleton_substring_max_gap is None:
+                gap_ok = np.ones(count, dtype=bool)
+            else:
+                gap_ok = np.abs(lengths - c.skel_len[anchor]) <= self.skeleton_substring_max_gap
+            total = np.maximum(lengths, c.skel_len[anchor])
+            ratio = np.divide(common, total, out=np.zeros(count), where=total > 0)
+            skeleton[partial_credit & substring & gap_ok] = self.skeleton_substring_score
+            skeleton[partial_credit & ~substring & (ratio > self.skeleton_overlap_ratio)] = \
+                self.skeleton_overlap_score
+
+        # 3. Bound with the cheap signals
+        reached = phonetic * w['phonetic'] + skeleton * w['skeleton'] + token_overlap * w['token_overlap']
+        alive &= reached + 100 * (w['token_sort'] + w['partial']) >= floor
+
+        # 4. Fuzzy string matching on the pairs still alive
+        fuzzy = np.zeros(count)
+        partial = np.zeros(count)
+        if w['token_sort'] and alive.any():
+            live = np.flatnonzero(alive)
+            needed = (floor - reached[live] - 100 * w['partial']) / w['token_sort']
+            values, ok = self._window_ratio('token_sort', c.lat[anchor],
+                                            [c.lat[j] for j in idx[live].tolist()], needed, workers)
+            fuzzy[live] = values
+            alive[live[~ok]] = False
+            reached = reached + fuzzy * w['token_sort']
+        if w['partial'] and alive.any():
+            live = np.flatnonzero(alive)
+            needed = (floor - reached[live]) / w['partial']
+            values, ok = self._window_ratio('partial', c.lat[anchor],
+                                            [c.lat[j] for j in idx[live].tolist()], needed, workers)
+            partial[live] = values
+            alive[live[~ok]] = False
+
+        # Weighted combination (formula order, as in score)
+        final_score = (
+            (phonetic * w['phonetic']) +
+            (skeleton * w['skeleton']) +
+            (fuzzy * w['token_sort']) +
+            (partial * w['partial']) +
+            (token_overlap * w['token_overlap'])
+        )
+
+        scores = [0] * count
+        decided = np.flatnonzero(~np.isnan(fixed))
+        for k, value in zip(decided.tolist(), fixed[decided].astype(np.int64).tolist()):
+            scores[k] = value
+        live = np.flatnonzero(alive)
+        for k, value in zip(live.tolist(), final_score[live].tolist()):
+            scores[k] = round(value, 2)
+        return scores
+
+    def score_many(self, sig, sigs, score_cutoff=0, workers=1):
+        """Scores of one signature against a list of signatures (score_window on fresh columns)"""
+        columns = SignatureColumns([with_masks(sig), *(with_masks(other) for other in sigs)])
+        return self.score_window(columns, 0, range(1, len(sigs) + 1), score_cutoff, workers)
+
+
+class SearchProfile:
+    """
+    Search ranking formula of a query signature against a target signature
+    (latin, skeleton, metaphone as returned by get_universal_skeleton)
+
+    steps: ordered (signal, amount) pairs added to the score in this order;
+           amount is a weight (score += value * weight) or tiers
+           ((threshold, points), ...): the points of the first threshold the value reaches
+        'skeleton' / 'phonetic': 100 on an exact non-empty match, else 0
+        'skeleton_match' / 'phonetic_match': the same as 1 / 0 (bonus points as weight)
+        'ratio' / 'partial' / 'token_sort': rapidfuzz ratios (floats, no processor)
+        'token_match': 1 when a query token occurs inside the target's latin form
+        'token_share': share of the query tokens that are target tokens (0-1)
+    empty_target_score: score of a target with an empty latin form (None: scored normally)
+    """
+
+    SCORERS = {'ratio': fuzz.ratio, 'partial': fuzz.partial_ratio, 'token_sort': fuzz.token_sort_ratio}
+
+    def __init__(self, steps, empty_target_score=None):
+        self.steps = tuple(steps)
+        self.empty_target_score = empty_target_score
+
+    @staticmethod
+    def _signal(signal, query, target):
+        q_lat, q_skel, q_meta = query[0], query[1], query[2]
+        t_lat, t_skel, t_meta = target[0], target[1], target[2]
+        if signal in ('skeleton', 'skeleton_match'):
+            hit = q_skel == t_skel and q_skel != ""
+            return (100 if hit else 0) if signal == 'skeleton' else int(hit)
+        if signal in ('phonetic', 'phonetic_match'):
+            hit = q_meta == t_meta and q_meta != ""
+            return (100 if hit else 0) if signal == 'phonetic' else int(hit)
+        if signal == 'token_match':
+            return int(any(token in t_lat for token in q_lat.split()))
+        if signal == 'token_share':
+            query_tokens, target_tokens = q_lat.split(), t_lat.split()
+            matched = sum(1 for token in query_tokens if token in target_tokens)
+            return matched / len(query_tokens) if query_tokens else 0
+        return SearchProfile.SCORERS[signal](q_lat, t_lat)
+
+    def raw_score(self, query, target):
+        """Unrounded score of one pair"""
+        if self.empty_target_score is not None and not target[0]:
+            return self.empty_target_score
+
+        score = 0
+        for signal, amount in self.steps:
+            value = self._signal(signal, query, target)
+            if isinstance(amount, tuple):
+                score += next((points for threshold, points in amount if value >= threshold), 0)
+            else:
+                score += value * amount
+        return score
+
+    def score(self, query, target):
+        return round(self.raw_score(query, target), 2)
+
+    def raw_scores(self, query, targets, workers=1):
+        """
+        Unrounded scores of one query against many targets as a NumPy array
+        (each ratio is one rapidfuzz cdist call; pair by pair equal to raw_score)
+        """
+        lats = [target[0] for target in targets]
+        score = np.zeros(len(targets))
+        for signal, amount in self.steps:
+            if signal in self.SCORERS:
+                value = process.cdist([query[0]], lats, scorer=self.SCORERS[signal], dtype=np.float64,
+                                      workers=workers)[0]
+            else:
+                value = np.array([self._signal(signal, query, target) for target in targets], dtype=np.float64)
+            if isinstance(amount, tuple):
+                points = np.zeros(len(targets))
+                undecided = np.ones(len(targets), dtype=bool)
+                for threshold, tier_points in amount:
+                    reached = undecided & (value >= threshold)
+                    points[reached] = tier_points
+                    undecided &= ~reached
+                score = score + points
+            else:
+                score = score + value * amount
+        if self.empty_target_score is not None:
+            score[np.array([not lat for lat in lats], dtype=bool)] = self.empty_target_score
+        return score
+
+    def score_many(self, query, targets, workers=1):
+        return [round(value, 2) for value in self.raw_scores(query, targets, workers).tolist()]
+
+
+# Ratio backend of the dedup kernels. 'rapidfuzz' is faster (cdist batches) but rescores
+# pairs: on a 450-name corpus it turns 14 v2 non-duplicates into duplicates at threshold 85
+# and 4 / 6 (v2 and v3) at 70 / 75, and never drops a duplicate
+DEDUP_RATIO_BACKEND = os.getenv("DEDUP_RATIO_BACKEND", "fuzzywuzzy")
+
+DEDUP_WEIGHTS = {'phonetic': 0.25, 'skeleton': 0.25, 'token_sort': 0.20, 'partial': 0.15, 'token_overlap': 0.15}
+
+# phonetic_dedup_v2: generous skeleton credit
+V2_KERNEL = SimilarityKernel(DEDUP_WEIGHTS, skeleton_substring_score=80, skeleton_substring_max_gap=None,
+                             skeleton_overlap_ratio=0.7, skeleton_overlap_score=60,
+                             ratio_backend=DEDUP_RATIO_BACKEND)
+
+# phonetic_dedup_v3: tightened skeleton credit
+V3_KERNEL = SimilarityKernel(DEDUP_WEIGHTS, skeleton_substring_score=70, skeleton_substring_max_gap=2,
+                             skeleton_overlap_ratio=0.8, skeleton_overlap_score=50,
+                             ratio_backend=DEDUP_RATIO_BACKEND)
+
+# Controller calculate_name_similarity: v2 skeleton credit on raw rapidfuzz ratios
+NAME_KERNEL = SimilarityKernel(DEDUP_WEIGHTS, skeleton_substring_score=80, skeleton_substring_max_gap=None,
+                               skeleton_overlap_ratio=0.7, skeleton_overlap_score=60,
+                               ratio_backend='rapidfuzz', integer_ratios=False, token_sort_processor=None)
+
+# Controller calculate_best_score: best field of a row
+SEARCH_BEST_PROFILE = SearchProfile([('skeleton', 0.4), ('partial', 0.4), ('ratio', 0.1), ('phonetic_match', 10)])
+
+# Controller calculate_phonetic_score: sound over spelling
+SEARCH_PHONETIC_PROFILE = SearchProfile([('phonetic', 0.45), ('skeleton', 0.35), ('token_sort', 0.20)],
+                                        empty_target_score=0)
+
+# Controller execute_phonetic_search: broad LIKE results ranked with a token bonus
+SEARCH_QUERY_PROFILE = SearchProfile([('skeleton', 0.3), ('partial', 0.5), ('ratio', 0.1),
+                                      ('phonetic_match', 10), ('token_match', 20)])
+
+# Controller execute_sequential_search: father name ranked on full and majority token matches
+SEARCH_SEQUENTIAL_PROFILE = SearchProfile([('skeleton_match', 60), ('token_share', ((0.7, 30), (0.4, 15))),
+                                           ('partial', 0.3), ('ratio', 0.1), ('phonetic_match', 10)])
+
+PROFILES = {
+    'dedup_v2': V2_KERNEL,
+    'dedup_v3': V3_KERNEL,
+    'name_similarity': NAME_KERNEL,
+    'search_best': SEARCH_BEST_PROFILE,
+    'search_phonetic': SEARCH_PHONETIC_PROFILE,
+    'search_query': SEARCH_QUERY_PROFILE,
+    'search_sequential': SEARCH_SEQUENTIAL_PROFILE,
+}
+
+
+def get_profile(name):
+    """Scoring profile by name (ValueError for an unknown name)"""
+    try:
+        return PROFILES[name]
+    except KeyError:
+        raise ValueError(f"Unknown scoring profile {name!r}; expected one of {', '.join(PROFILES)}")
+
+
+class PairScoreCache:
+    """
+    Bounded pair-score cache of one run and one kernel (thread-safe)
+    - intern() gives every distinct signature an id, appended to the masked signature
+    - Scores are keyed on the ordered (id1, id2, score_cutoff): fuzzywuzzy's partial_ratio
+      and token_sort_ratio depend on the argument order, so (b, a) is its own entry;
+      a pair below its cutoff is stored as the 0 the cascade returned
+    - When full, the oldest entries go first (the windows move forward through the sort order)
+    - max_signatures bounds the intern table too (spilling runs): when it is reached, the
+      interned signatures and scores are dropped; ids are never reused, so records
+      interned before still score correctly, they just miss the cache
+    """
+
+    def __init__(self, kernel, max_size=DEFAULT_CACHE_SIZE, max_signatures=None):
+        self.kernel = kernel
+        self.max_size = max_size
+        self.max_signatures = max_signatures
+        self._ids = {}
+        self._next_id = itertools.count()
+        self._scores = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.resets = 0
+
+    def reset(self):
+        """Drop the interned signatures and the scores (the id counter carries on)"""
+        with self._lock:
+            self._ids.clear()
+            self._scores.clear()
+            self.resets += 1
+
+    def intern(self, sig):
+        """Masked signature with its id at SIG_ID"""
+        sig = with_masks(sig)
+        if len(sig) > SIG_ID:
+            return sig
+        key = sig[:4]
+        sig_id = self._ids.get(key)
+        if sig_id is None:
+            if self.max_signatures and len(self._ids) >= self.max_signatures:
+                self.reset()
+            sig_id = self._ids.setdefault(key, next(self._next_id))
+        return (*sig, sig_id)
+
+    def intern_records(self, records):
+        """Intern the voter / father signatures of prepared records (in place)"""
+        for record in records:
+            record['_v_sig'] = self.intern(record['_v_sig'])
+            record['_f_sig'] = self.intern(record['_f_sig'])
+        return records
+
+    def score(self, sig1, sig2, score_cutoff=0):
+        """kernel.score, from the cache when both signatures are interned"""
+        if len(sig1) <= SIG_ID or len(sig2) <= SIG_ID:
+            return self.kernel.score(sig1, sig2, score_cutoff)
+
+        key = (sig1[SIG_ID], sig2[SIG_ID], score_cutoff)
+        value = self._scores.get(key)
+        if value is not None:
+            with self._lock:
+                self.hits += 1
+            return value
+
+        value = self.kernel.score(sig1, sig2, score_cutoff)
+        with self._lock:
+            self.misses += 1
+            if key not in self._scores and len(self._scores) >= self.max_size:
+                del self._scores[next(iter(self._scores))]
+                self.evictions += 1
+            self._scores[key] = value
+        return value
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "signatures": len(self._ids),
+            "entries": len(self._scores),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "max_signatures": self.max_signatures,
+            "resets": self.resets,
+            "hit_rate": round(self.hits / lookups * 100, 2) if lookups else 0
+        }
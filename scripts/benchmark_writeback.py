@@ -0,0 +1,117 @@
+"""
+Benchmark dedup write-back: CASE-statement batches vs staging-table join UPDATE
+
+Copies N active rows of a voter table into a scratch table, marks a fraction of
+them as duplicates with each strategy and prints rows/second.
+
+Usage:
+    python -m scripts.benchmark_writeback --table gram_panchayat_voters --rows 200000
+"""
+
+import argparse
+import time
+
+from sqlalchemy import text
+
+from config import create_app, db, Config
+from dedup_writeback import write_back_staged
+
+DB_NAME = Config.DB_NAME
+SCRATCH_TABLE = "dedup_writeback_bench"
+
+
+def write_back_case(table_name, records_to_deactivate, pk_column="id", batch_size=1000):
+    """The previous write-back: one UPDATE with a CASE clause per 1000 ids, single commit"""
+    ids_to_deactivate = [rec["id"] for rec in records_to_deactivate]
+    similar_mapping = {rec["id"]: rec["duplicate_of"] for rec in records_to_deactivate}
+
+    for i in range(0, len(ids_to_deactivate), batch_size):
+        batch = ids_to_deactivate[i:i + batch_size]
+        case_sql = " ".join(f"WHEN {pk_column} = {rec_id} THEN {similar_mapping[rec_id]}" for rec_id in batch)
+        placeholders = ','.join(str(rec_id) for rec_id in batch)
+
+        db.session.execute(text(f"""
+            UPDATE {DB_NAME}.{table_name}
+            SET status = 'INACTIVE',
+                similar_too = CASE {case_sql} END,
+                check_status = 'DUPLICATE_DETECTED'
+            WHERE {pk_column} IN ({placeholders})
+        """))
+
+    db.session.commit()
+
+
+def prepare_scratch_table(source_table, rows):
+    db.session.execute(text(f"DROP TABLE IF EXISTS {DB_NAME}.{SCRATCH_TABLE}"))
+    db.session.execute(text(f"CREATE TABLE {DB_NAME}.{SCRATCH_TABLE} LIKE {DB_NAME}.{source_table}"))
+    db.session.execute(text(f"""
+        INSERT INTO {DB_NAME}.{SCRATCH_TABLE}
+        SELECT * FROM {DB_NAME}.{source_table}
+        WHERE status IS NULL OR status != 'INACTIVE'
+        ORDER BY id
+        LIMIT {int(rows)}
+    """))
+    db.session.commit()
+
+
+def reset_scratch_table():
+    db.session.execute(text(f"""
+        UPDATE {DB_NAME}.{SCRATCH_TABLE}
+        SET status = NULL, similar_too = NULL, check_status = NULL
+    """))
+    db.session.commit()
+
+
+def build_decisions(duplicate_ratio):
+    """Every k-th row becomes a duplicate of its predecessor"""
+    ids = [row[0] for row in db.session.execute(text(f"SELECT id FROM {DB_NAME}.{SCRATCH_TABLE} ORDER BY id"))]
+    step = max(2, int(round(1 / duplicate_ratio)))
+    return [{"id": ids[i], "duplicate_of": ids[i - 1]} for i in range(1, len(ids), step)]
+
+
+def time_strategy(name, fn, decisions, repeats):
+    best = None
+    for _ in range(repeats):
+        reset_scratch_table()
+        start = time.perf_counter()
+        fn(SCRATCH_TABLE, decisions)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    rate = len(decisions) / best if best else 0
+    print(f"{name:<28} {len(decisions):>10,} rows  {best:8.2f}s  {rate:12,.0f} rows/s")
+    return rate
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--table", default="gram_panchayat_voters")
+    parser.add_argument("--rows", type=int, default=200000)
+    parser.add_argument("--duplicate-ratio", type=float, default=0.1)
+    parser.add_argument("--chunk-size", type=int, default=5000)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--keep", action="store_true", help="Keep the scratch table afterwards")
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        print(f"Copying {args.rows:,} rows of {args.table} into {SCRATCH_TABLE}...")
+        prepare_scratch_table(args.table, args.rows)
+        decisions = build_decisions(args.duplicate_ratio)
+
+        case_rate = time_strategy("CASE batches (1000 ids)", write_back_case, decisions, args.repeats)
+        staged_rate = time_strategy(
+            f"staging join ({args.chunk_size} rows)",
+            lambda table, recs: write_back_staged(table, recs, chunk_size=args.chunk_size),
+            decisions, args.repeats
+        )
+        if case_rate:
+            print(f"Speed-up: {staged_rate / case_rate:.1f}x")
+
+        if not args.keep:
+            db.session.execute(text(f"DROP TABLE IF EXISTS {DB_NAME}.{SCRATCH_TABLE}"))
+            db.session.commit()
+
+
+if __name__ == "__main__":
+    main()
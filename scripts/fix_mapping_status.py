@@ -1,17 +1,8 @@
-import pymysql
-from config import Config
+from config import Config, create_app
+from data_access import get_conn
 
 def fix_mapping_status():
-    conn = pymysql.connect(
-        host=Config.DB_HOST,
-        port=Config.DB_PORT,
-        user=Config.DB_USER,
-        password=Config.DB_PASSWORD,
-        database=Config.DB_NAME,
-        charset="utf8mb4",
-        cursorclass=pymysql.cursors.DictCursor,
-        autocommit=True,
-    )
+    conn = get_conn()
 
     with conn.cursor() as cur:
         sql = f"""
@@ -25,4 +16,5 @@ def fix_mapping_status():
     conn.close()
 
 if __name__ == "__main__":
-    fix_mapping_status()
+    with create_app().app_context():
+        fix_mapping_status()
@@ -0,0 +1,112 @@
+"""
+Add the derived filter columns of voter_derived (gender_norm, caste_norm, age_num)
+to the voter table as generated columns and index them
+
+- The columns are GENERATED ALWAYS AS their voter_derived expressions, so MySQL
+  fills them and keeps them in sync on every write; there is nothing to backfill
+- STORED (default) computes every row while the table is rebuilt (writes wait for
+  the copy). --virtual adds VIRTUAL columns instead: no rebuild, and the indexes
+  (ALGORITHM=INPLACE, LOCK=NONE) materialize the values online
+- Plain columns of the same name (copies an earlier version of this script
+  backfilled) are dropped and re-added as generated columns, and the caste_bucket
+  copy it added is dropped: it shadowed the caste_bucket alias the dashboard
+  queries group on
+- Safe to re-run: columns and indexes already in place are left alone
+- build_where_clause switches to the derived columns once all three are generated
+
+Usage:
+    python -m scripts.migrate_voter_derived_columns [--virtual]
+"""
+
+import argparse
+import os
+
+from config import create_app
+from data_access import get_conn
+from voter_derived import DERIVED_COLUMNS, generated_column_sql
+
+LEGACY_COLUMNS = [("caste_bucket", "idx_caste_bucket")]  # (column, the index this script gave it)
+
+INDEXES = [
+    ("idx_gender_norm", "gender_norm"),
+    ("idx_caste_norm", "caste_norm"),
+    ("idx_age_num", "age_num"),
+]
+
+
+def existing_columns(cur, table):
+    """Column name -> True if it is a generated column"""
+    cur.execute("""
+        SELECT COLUMN_NAME AS name, EXTRA AS extra FROM INFORMATION_SCHEMA.COLUMNS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s
+    """, [table])
+    return {row["name"]: "GENERATED" in (row["extra"] or "").upper() for row in cur.fetchall()}
+
+
+def existing_indexes(cur, table):
+    cur.execute("""
+        SELECT DISTINCT INDEX_NAME AS name FROM INFORMATION_SCHEMA.STATISTICS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s
+    """, [table])
+    return {row["name"] for row in cur.fetchall()}
+
+
+def drop_legacy_columns(cur, table):
+    present = existing_columns(cur, table)
+    indexes = existing_indexes(cur, table)
+    for column, index in LEGACY_COLUMNS:
+        # Only a column this script created (it carries our index), never a source column
+        if column not in present or index not in indexes:
+            continue
+        print(f"ALTER TABLE {table} DROP INDEX {index}, DROP COLUMN {column}")
+        cur.execute(f"ALTER TABLE {table} DROP INDEX {index}, DROP COLUMN {column}")
+
+
+def add_columns(cur, table, storage):
+    """One ALTER for every derived column not yet generated (plain copies are replaced)"""
+    present = existing_columns(cur, table)
+    changes = []
+    for column, column_type, expression in DERIVED_COLUMNS:
+        if present.get(column):
+            continue
+        if column in present:
+            changes.append(f"DROP COLUMN {column}")  # Its index goes with it, add_indexes rebuilds it
+        changes.append(f"ADD COLUMN {generated_column_sql(column, column_type, expression, storage)}")
+    if not changes:
+        return
+    print(f"ALTER TABLE {table}\n  " + ",\n  ".join(changes))
+    cur.execute(f"ALTER TABLE {table} " + ", ".join(changes))
+
+
+def add_indexes(cur, table):
+    present = existing_indexes(cur, table)
+    for name, column in INDEXES:
+        if name in present:
+            continue
+        print(f"CREATE INDEX {name} ON {table} ({column})")
+        cur.execute(f"CREATE INDEX {name} ON {table} ({column}) ALGORITHM=INPLACE LOCK=NONE")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--table", default=os.getenv("DB_TABLE", "voter_data"))
+    parser.add_argument("--virtual", action="store_true",
+                        help="VIRTUAL generated columns (no table rebuild; values live in the indexes)")
+    parser.add_argument("--skip-indexes", action="store_true", help="Columns only")
+    args = parser.parse_args()
+
+    with create_app().app_context():
+        conn = get_conn()
+        try:
+            with conn.cursor() as cur:
+                drop_legacy_columns(cur, args.table)
+                add_columns(cur, args.table, "VIRTUAL" if args.virtual else "STORED")
+                if not args.skip_indexes:
+                    add_indexes(cur, args.table)
+        finally:
+            conn.close()
+    print("Done")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,17 @@
 import os
 import re
-import pymysql
 from typing import Optional, Tuple, Dict, List
 
+from config import create_app, db
+from data_access import get_conn
+
 # ---------------------------
 # CONFIG (edit or use env vars)
 # ---------------------------
-DB_HOST = os.getenv("DB_HOST", "127.0.0.1")
-DB_PORT = int(os.getenv("DB_PORT", "3306"))
-DB_USER = os.getenv("DB_USER", "root")
-DB_PASSWORD = os.getenv("DB_PASSWORD", "root3306")
-DB_NAME = os.getenv("DB_NAME", "voting_db_2")
+# Connection: the app's pooled engine (DB_HOST, DB_PORT, DB_USER, DB_PASS, DB_NAME).
+# The script's own variables from before still work: DB_PASSWORD stands in for an
+# unset DB_PASS, and unset variables fall back to the script's old defaults
+LEGACY_DB_DEFAULTS = {"DB_HOST": "127.0.0.1", "DB_PORT": "3306", "DB_USER": "root", "DB_NAME": "voting_db_2"}
 DB_TABLE = os.getenv("DB_TABLE", "voter_data")
 
 BATCH_SIZE = int(os.getenv("BATCH_SIZE", "5000"))
@@ -229,20 +230,8 @@ def classify(hindi_name: str, eng_name: str) -> Tuple[str, str]:
 # ---------------------------
 # DB WORK
 # ---------------------------
-def get_conn():
-    return pymysql.connect(
-        host=DB_HOST,
-        port=DB_PORT,
-        user=DB_USER,
-        password=DB_PASSWORD,
-        database=DB_NAME,
-        charset="utf8mb4",
-        cursorclass=pymysql.cursors.DictCursor,
-        autocommit=True,
-    )
-
 def main():
-    print(f"DB: {DB_USER}@{DB_HOST}:{DB_PORT}/{DB_NAME}  TABLE: {DB_TABLE}")
+    print(f"DB: {db.engine.url.render_as_string(hide_password=True)}  TABLE: {DB_TABLE}")
     print(f"DRY_RUN={DRY_RUN}  BATCH_SIZE={BATCH_SIZE}")
 
     stats: Dict[str, int] = {"GENERAL": 0, "OBC": 0, "SC / ST": 0, "MUSLIM": 0, "YADAV": 0, "OTHER": 0}
@@ -303,5 +292,13 @@ def flush_updates(conn, updates: List[Tuple[str, int]]) -> int:
         cur.executemany(f"UPDATE {DB_TABLE} SET caste=%s WHERE id=%s AND (caste IS NULL OR TRIM(caste)='')", updates)
         return cur.rowcount
 
+def apply_legacy_db_env():
+    """Fill the app's DB variables the environment leaves unset from the script's old ones"""
+    for name, default in LEGACY_DB_DEFAULTS.items():
+        os.environ.setdefault(name, default)
+    os.environ.setdefault("DB_PASS", os.getenv("DB_PASSWORD", "root3306"))
+
 if __name__ == "__main__":
-    main()
+    apply_legacy_db_env()
+    with create_app().app_context():
+        main()
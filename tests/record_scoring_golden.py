@@ -0,0 +1,139 @@
+"""
+Record tests/scoring_golden.json from the scoring formulas before scoring_engine
+
+The golden scores pin every scoring profile to the formulas it replaced, so they
+are recorded by running those formulas themselves - a checkout of the tree before
+scoring_engine (commit f90bc7c) - never the current code:
+
+    git worktree add /tmp/scoring-baseline f90bc7c
+    python tests/record_scoring_golden.py --baseline /tmp/scoring-baseline
+
+Scores per profile are a names x names matrix (query / first signature = row).
+The search endpoints only return rows scoring 35 or more: their cells are the
+match_score of the returned row, null when the row was not returned.
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import warnings
+
+GOLDEN_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "scoring_golden.json")
+
+# Name parts the corpus is built from (Devanagari and Latin spellings, common variants)
+GIVEN = ["राम", "रामपाल", "रामदीन", "श्याम", "सुनील", "सुनिल", "अनिल", "विकास", "बिकास", "मोहन",
+         "सोहन", "राजेश", "राजेस", "सीता", "गीता", "कमला", "सरोज", "रमेश", "महेश", "दिनेश",
+         "ram", "rampal", "shyam", "sunil", "anil", "vikas", "bikas", "mohan", "rajesh", "geeta"]
+SURNAMES = ["सिंह", "सिहं", "सिंग", "कुमार", "यादव", "वर्मा", "शर्मा", "देवी", "प्रसाद", "",
+            "singh", "kumar", "yadav", "verma", "devi", ""]
+
+
+def build_corpus(count, seed):
+    """Random given name + surname combinations, with empty and swapped names mixed in"""
+    rng = random.Random(seed)
+    names = ["", " "]
+    while len(names) < count:
+        parts = [rng.choice(GIVEN), rng.choice(SURNAMES)]
+        if rng.random() < 0.2:
+            parts.reverse()
+        if rng.random() < 0.1:
+            parts.insert(1, rng.choice(GIVEN))
+        names.append(" ".join(part for part in parts if part))
+    return names
+
+
+class FakeRow:
+    def __init__(self, mapping):
+        self._mapping = mapping
+
+
+class FakeSession:
+    """db.session of the search endpoints: every query returns the given rows"""
+
+    def __init__(self, rows):
+        self.rows = rows
+
+    def execute(self, *args, **kwargs):
+        return [FakeRow(dict(row)) for row in self.rows]
+
+
+class FakeDb:
+    def __init__(self, rows):
+        self.session = FakeSession(rows)
+
+
+def search_matrix(controller, names, search):
+    """match_score of every row per query (None when the row was not returned)"""
+    matrix = []
+    for name in names:
+        scores = {row["id"]: row["match_score"] for row in search(controller, name)}
+        matrix.append([scores.get(j + 1) for j in range(len(names))])
+    return matrix
+
+
+def phonetic_search(controller, name):
+    return controller.execute_phonetic_search("voter_data", name, ["e_name"])
+
+
+def sequential_search(controller, name):
+    return controller.execute_sequential_search("voter_data", f"x, {name}", ["e_name"], ["rel_name"])
+
+
+def score_profiles(names, v2, v3, controller):
+    """Golden matrices of every profile from the modules' own scoring functions"""
+    v2_sigs = [v2.get_enhanced_phonetic_signature(name) for name in names]
+    v3_sigs = [v3.get_enhanced_phonetic_signature(name) for name in names]
+    skeletons = [controller.get_universal_skeleton(name) for name in names]
+
+    profiles = {
+        "dedup_v2": [[v2.calculate_enhanced_similarity(a, b) for b in v2_sigs] for a in v2_sigs],
+        "dedup_v3": [[v3.calculate_enhanced_similarity(a, b) for b in v3_sigs] for a in v3_sigs],
+        "name_similarity": [[controller.calculate_name_similarity(q, t) for t in skeletons] for q in skeletons],
+        "search_best": [[controller.calculate_best_score({"voter_name": name, "father_husband_mother_name": ""}, *q)
+                         for name in names] for q in skeletons],
+        "search_phonetic": [[controller.calculate_phonetic_score(q, name) for name in names] for q in skeletons],
+    }
+
+    real_db = controller.db
+    try:
+        controller.db = FakeDb([{"id": j + 1, "e_name": name} for j, name in enumerate(names)])
+        profiles["search_query"] = search_matrix(controller, names, phonetic_search)
+        controller.db = FakeDb([{"id": j + 1, "e_name": "x", "rel_name": name} for j, name in enumerate(names)])
+        profiles["search_sequential"] = search_matrix(controller, names, sequential_search)
+    finally:
+        controller.db = real_db
+    return profiles
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--baseline", required=True, help="Checkout of the tree before scoring_engine")
+    parser.add_argument("--names", type=int, default=60, help="Corpus size (names^2 pairs per profile)")
+    parser.add_argument("--seed", type=int, default=45)
+    args = parser.parse_args()
+
+    if os.path.exists(os.path.join(args.baseline, "scoring_engine.py")):
+        sys.exit(f"{args.baseline} already has scoring_engine.py: record from the tree before it")
+    sys.path.insert(0, os.path.abspath(args.baseline))
+    warnings.filterwarnings("ignore")  # fuzzywuzzy's pure-python SequenceMatcher warning
+    import phonetic_dedup_v2
+    import phonetic_dedup_v3
+    from Controller import PhoneticPythonController
+
+    names = build_corpus(args.names, args.seed)
+    profiles = score_profiles(names, phonetic_dedup_v2, phonetic_dedup_v3, PhoneticPythonController)
+
+    # One matrix row per line keeps the file diffable
+    with open(GOLDEN_PATH, "w", encoding="utf-8") as f:
+        f.write('{\n  "names": ' + json.dumps(names, ensure_ascii=False) + ',\n  "profiles": {\n')
+        for n, (profile, matrix) in enumerate(profiles.items()):
+            rows = ",\n      ".join(json.dumps(row) for row in matrix)
+            f.write(f'    "{profile}": [\n      {rows}\n    ]' + (",\n" if n < len(profiles) - 1 else "\n"))
+        f.write("  }\n}\n")
+    print(f"{GOLDEN_PATH}: {len(names)} names, {len(profiles)} profiles")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+PairScoreCache against the uncached kernels
+
+fuzzywuzzy's partial_ratio and token_sort_ratio depend on the argument order, so a
+pair's cached score must be the score of the order it is looked up in, and scans
+with and without the cache must find the same groups.
+
+Run from the repository root:
+    python -m pytest tests
+"""
+
+import warnings
+
+import pytest
+
+warnings.filterwarnings("ignore", message="Using slow pure-python SequenceMatcher")
+
+import phonetic_dedup_v2
+import phonetic_dedup_v3
+from scoring_engine import V2_KERNEL, V3_KERNEL, PairScoreCache
+
+# (module, kernel, name, the same name in an order that scores differently)
+ASYMMETRIC = {
+    "dedup_v2": (phonetic_dedup_v2, V2_KERNEL, "रामदीन सिहं", "सिहं रामदीन"),
+    "dedup_v3": (phonetic_dedup_v3, V3_KERNEL, "महेश यादव", "दिनेश यादव"),
+}
+
+
+@pytest.mark.parametrize("profile", ASYMMETRIC)
+def test_cached_score_keeps_argument_order(profile):
+    module, kernel, name_a, name_b = ASYMMETRIC[profile]
+    cache = PairScoreCache(kernel)
+    a = cache.intern(module.get_enhanced_phonetic_signature(name_a))
+    b = cache.intern(module.get_enhanced_phonetic_signature(name_b))
+    forward, backward = kernel.score(a, b), kernel.score(b, a)
+    assert forward != backward, "the pair no longer scores differently by order"
+
+    assert cache.score(b, a) == backward
+    assert cache.score(a, b) == forward
+    assert cache.score(b, a) == backward
+    assert cache.hits == 1 and cache.misses == 2
+
+
+def test_v2_scan_groups_match_uncached():
+    # Records 1 / 2 score the pair in the low order first; 3 / 4 (other gender) in the high one
+    _, _, name_a, name_b = ASYMMETRIC["dedup_v2"]
+    records = [
+        {"id": 1, "voter_name": "राम", "father_husband_mother_name": name_b, "gender": "M"},
+        {"id": 2, "voter_name": "राम", "father_husband_mother_name": name_a, "gender": "M"},
+        {"id": 3, "voter_name": "राम", "father_husband_mother_name": name_a, "gender": "F"},
+        {"id": 4, "voter_name": "राम", "father_husband_mother_name": name_b, "gender": "F"},
+    ]
+
+    def groups(score_cache):
+        prepared = phonetic_dedup_v2.prepare_records([dict(record) for record in records])
+        if score_cache is not None:
+            score_cache.intern_records(prepared)
+        return [[record["id"] for record in group] for group in phonetic_dedup_v2.scan_sorted_window(
+            prepared, voter_threshold=85, father_threshold=60, score_cache=score_cache)]
+
+    assert groups(None) == [[3, 4]]
+    assert groups(PairScoreCache(V2_KERNEL)) == [[3, 4]]
+
+
+def test_bounded_cache_scores_like_the_kernel():
+    # Signatures interned before a reset keep their ids: they miss the cache, never alias
+    names = ["राम सिंह", "राम सिहं", "श्याम यादव", "सुनील कुमार", "सुनिल कुमार", "रामदीन सिहं", "सिहं रामदीन"]
+    cache = PairScoreCache(V2_KERNEL, max_size=5, max_signatures=3)
+    sigs = [cache.intern(phonetic_dedup_v2.get_enhanced_phonetic_signature(name)) for name in names]
+    assert cache.resets > 0
+
+    for _ in range(2):
+        for a in sigs:
+            for b in sigs:
+                assert cache.score(a, b, 60) == V2_KERNEL.score(a, b, 60)
+    assert cache.stats()["entries"] <= 5
@@ -0,0 +1,156 @@
+"""
+Scoring profiles of scoring_engine against golden scores of the formulas they replaced
+
+tests/scoring_golden.json was recorded by tests/record_scoring_golden.py from the
+tree before scoring_engine (the v2 / v3 calculate_enhanced_similarity on fuzzywuzzy
+ratios, the controller's search formulas on rapidfuzz ratios), so these tests fail
+on any change of a score, however small - re-record only from that baseline.
+
+- Every pair scores exactly its golden score through the module functions
+- The dedup kernels' cutoff paths (score, score_window, score_many) return the
+  golden score for every pair that reaches the cutoff and 0 or the golden score
+  (never more) for the others
+- The search endpoints return exactly the rows and match_scores they returned
+
+Run from the repository root:
+    python -m pytest tests
+"""
+
+import json
+import os
+import warnings
+
+import pytest
+
+warnings.filterwarnings("ignore", message="Using slow pure-python SequenceMatcher")
+
+import phonetic_dedup_v2
+import phonetic_dedup_v3
+from Controller import PhoneticPythonController as controller
+from scoring_engine import V2_KERNEL, V3_KERNEL, SignatureColumns, with_masks
+
+GOLDEN_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "scoring_golden.json")
+CUTOFFS = [60, 70, 85]
+MAX_REPORTED = 10
+
+with open(GOLDEN_PATH, encoding="utf-8") as f:
+    GOLDEN = json.load(f)
+NAMES = GOLDEN["names"]
+
+DEDUP = {
+    "dedup_v2": (phonetic_dedup_v2, V2_KERNEL),
+    "dedup_v3": (phonetic_dedup_v3, V3_KERNEL),
+}
+
+
+class FakeRow:
+    def __init__(self, mapping):
+        self._mapping = mapping
+
+
+class FakeSession:
+    """db.session of the search endpoints: every query returns the given rows"""
+
+    def __init__(self, rows):
+        self.rows = rows
+
+    def execute(self, *args, **kwargs):
+        return [FakeRow(dict(row)) for row in self.rows]
+
+
+class FakeDb:
+    def __init__(self, rows):
+        self.session = FakeSession(rows)
+
+
+def mismatches(profile, score):
+    """(query, target, got, golden) of every pair whose score differs from the golden one"""
+    found = []
+    for i, row in enumerate(GOLDEN["profiles"][profile]):
+        for j, want in enumerate(row):
+            got = score(i, j)
+            if got != want:
+                found.append((NAMES[i], NAMES[j], got, want))
+    return found
+
+
+def assert_no_mismatches(profile, found):
+    assert not found, f"{len(found)} {profile} scores differ from the golden scores, e.g. " + "; ".join(
+        f"{query!r} / {target!r}: {got} (golden {want})" for query, target, got, want in found[:MAX_REPORTED]
+    )
+
+
+def cutoff_mismatches(profile, scores_at):
+    """Pairs whose cutoff score is wrong: golden when it reaches the cutoff, else 0 or golden"""
+    found = []
+    for cutoff in CUTOFFS:
+        for i, row in enumerate(GOLDEN["profiles"][profile]):
+            for j, (want, got) in enumerate(zip(row, scores_at(i, cutoff))):
+                if got != want and (want >= cutoff or got != 0):
+                    found.append((NAMES[i], f"{NAMES[j]} at cutoff {cutoff}", got, want))
+    return found
+
+
+@pytest.mark.parametrize("profile", DEDUP)
+def test_dedup_similarity_matches_golden(profile):
+    module, _ = DEDUP[profile]
+    sigs = [module.get_enhanced_phonetic_signature(name) for name in NAMES]
+    found = mismatches(profile, lambda i, j: module.calculate_enhanced_similarity(sigs[i], sigs[j]))
+    assert_no_mismatches(profile, found)
+
+
+@pytest.mark.parametrize("profile", DEDUP)
+def test_dedup_kernel_cutoffs_match_golden(profile):
+    module, kernel = DEDUP[profile]
+    sigs = [with_masks(module.get_enhanced_phonetic_signature(name)) for name in NAMES]
+    columns = SignatureColumns(sigs)
+
+    found = cutoff_mismatches(profile, lambda i, cutoff: [kernel.score(sigs[i], sig, cutoff) for sig in sigs])
+    found += cutoff_mismatches(profile, lambda i, cutoff: kernel.score_window(columns, i, range(len(sigs)), cutoff))
+    found += cutoff_mismatches(profile, lambda i, cutoff: kernel.score_many(sigs[i], sigs, score_cutoff=cutoff))
+    assert_no_mismatches(profile, found)
+
+
+def test_name_similarity_matches_golden():
+    skeletons = [controller.get_universal_skeleton(name) for name in NAMES]
+    found = mismatches("name_similarity",
+                       lambda i, j: controller.calculate_name_similarity(skeletons[i], skeletons[j]))
+    assert_no_mismatches("name_similarity", found)
+
+
+def test_search_best_matches_golden():
+    skeletons = [controller.get_universal_skeleton(name) for name in NAMES]
+    found = mismatches("search_best", lambda i, j: controller.calculate_best_score(
+        {"voter_name": NAMES[j], "father_husband_mother_name": ""}, *skeletons[i]))
+    assert_no_mismatches("search_best", found)
+
+
+def test_search_phonetic_matches_golden():
+    skeletons = [controller.get_universal_skeleton(name) for name in NAMES]
+    found = mismatches("search_phonetic", lambda i, j: controller.calculate_phonetic_score(skeletons[i], NAMES[j]))
+    assert_no_mismatches("search_phonetic", found)
+
+
+def search_scores(rows, search):
+    """match_score of every row per query name (None when the row was not returned)"""
+    results = []
+    for name in NAMES:
+        scores = {row["id"]: row["match_score"] for row in search(name)}
+        results.append([scores.get(j + 1) for j in range(len(rows))])
+    return results
+
+
+@pytest.mark.parametrize("profile", ["search_query", "search_sequential"])
+def test_search_endpoints_match_golden(profile, monkeypatch):
+    if profile == "search_query":
+        rows = [{"id": j + 1, "e_name": name} for j, name in enumerate(NAMES)]
+        search = lambda name: controller.execute_phonetic_search("voter_data", name, ["e_name"])
+    else:
+        rows = [{"id": j + 1, "e_name": "x", "rel_name": name} for j, name in enumerate(NAMES)]
+        search = lambda name: controller.execute_sequential_search("voter_data", f"x, {name}", ["e_name"],
+                                                                   ["rel_name"])
+    monkeypatch.setattr(controller, "db", FakeDb(rows))
+
+    results = search_scores(rows, search)
+    found = mismatches(profile, lambda i, j: results[i][j])
+    assert_no_mismatches(profile, found)
@@ -0,0 +1,62 @@
+"""
+Normalized, indexed generated columns of voter_data the dashboard filters on
+- gender_norm: the gender filter key (Male, Female, Third, Third Gender, Unknown)
+- caste_norm: the caste chart bucket (General, OBC, SC / ST, Muslim, Yadav, Others, Unknown)
+- age_num: the numeric age, NULL when age is not a plain number
+- They are GENERATED ALWAYS AS the source expressions: MySQL derives them on every
+  write (api_update_row, imports, scripts), so they can never drift from sex /
+  caste / age; scripts/migrate_voter_derived_columns.py adds and indexes them
+- build_where_clause filters on them (index-friendly) once they exist as generated
+  columns; plain copies left by an older migration are not trusted
+- Named apart from the query aliases (caste_bucket is the alias the dashboard queries
+  group on; a column of the same name makes MySQL resolve GROUP BY to the column and
+  reject the select list under ONLY_FULL_GROUP_BY)
+"""
+
+import time
+
+from dashboard_sql import CASTE_BUCKET_SQL
+from dashboard_cube import GENDER_KEY_SQL
+
+# At most 18 digits: a longer number would overflow the cast, which fails the whole
+# INSERT / UPDATE in strict mode when it happens in a generated column
+AGE_NUM_SQL = "CASE WHEN age REGEXP '^[0-9]{1,18}$' THEN CAST(age AS UNSIGNED) END"
+
+# (column, type, expression over the source columns)
+DERIVED_COLUMNS = [
+    ("gender_norm", "VARCHAR(16)", GENDER_KEY_SQL),
+    ("caste_norm", "VARCHAR(16)", CASTE_BUCKET_SQL),
+    ("age_num", "BIGINT UNSIGNED", AGE_NUM_SQL),
+]
+
+READY_TTL = 60  # Seconds a readiness check is trusted
+
+_ready = {}  # table -> (ready, checked at)
+
+
+def generated_column_sql(column, column_type, expression, storage="STORED"):
+    """Column definition of a derived column (storage: STORED or VIRTUAL)"""
+    return f"{column} {column_type} GENERATED ALWAYS AS ({expression.strip()}) {storage}"
+
+
+def cached_readiness(table):
+    """Last readiness of the table, None when unknown or older than READY_TTL"""
+    ready, checked_at = _ready.get(table, (None, 0))
+    if ready is None or time.monotonic() - checked_at >= READY_TTL:
+        return None
+    return ready
+
+
+def derived_columns_ready(cur, table):
+    """Every derived column exists as a generated column; cached for READY_TTL"""
+    ready = cached_readiness(table)
+    if ready is not None:
+        return ready
+    cur.execute("""
+        SELECT COUNT(*) AS cnt FROM INFORMATION_SCHEMA.COLUMNS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND COLUMN_NAME IN %s
+          AND EXTRA LIKE '%%GENERATED%%'
+    """, [table, tuple(column for column, _, _ in DERIVED_COLUMNS)])
+    ready = cur.fetchone()["cnt"] == len(DERIVED_COLUMNS)
+    _ready[table] = (ready, time.monotonic())
+    return ready